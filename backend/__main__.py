@@ -0,0 +1,70 @@
+"""
+Database maintenance commands.
+
+    python -m backend rebuild --start 2024-01-01 --end 2024-12-31
+    python -m backend maintain [--convert]
+    python -m backend export --format ndjson > history.ndjson
+    python -m backend import history.ndjson
+    python -m backend merge [other/screen_time.db | export.csv ...]
+"""
+import argparse, sys
+from datetime import date
+from backend.database import init_db, rebuild, close_db
+from backend.maintenance import run_maintenance
+from backend import transfer, merge
+from st_tracker.helper import read_retention
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("rebuild", help="recompute daily_usage from the session log")
+    cmd.add_argument("--start", default="0001-01-01", help="first ISO date (default: everything)")
+    cmd.add_argument("--end", default=date.today().isoformat(), help="last ISO date (default: today)")
+
+    cmd = commands.add_parser("maintain", help="prune, downsample and archive old history now")
+    cmd.add_argument("--convert", action="store_true",
+                     help="switch an older database to incremental vacuum (one full VACUUM)")
+
+    cmd = commands.add_parser("export", help="write every daily total of a range to stdout")
+    cmd.add_argument("--start", default="1970-01-01", help="first ISO date (default: everything)")
+    cmd.add_argument("--end", default=date.today().isoformat(), help="last ISO date (default: today)")
+    cmd.add_argument("--format", choices=transfer.FORMATS, default="csv")
+
+    cmd = commands.add_parser("import", help="load an export, replacing the totals it contains")
+    cmd.add_argument("path")
+    cmd.add_argument("--format", choices=transfer.FORMATS, help="default: from the file extension")
+
+    cmd = commands.add_parser("merge", help="merge other machines' databases or exports into the combined view")
+    cmd.add_argument("paths", nargs="*", help="default: every source merged before")
+
+    args = parser.parse_args(argv)
+    # the journal belongs to the tracker, which may be running right now
+    init_db(recover=False)
+
+    if args.command == "rebuild":
+        rebuild(args.start, args.end)
+        print(f"Rebuilt daily_usage for {args.start} .. {args.end}")
+    elif args.command == "maintain":
+        print(run_maintenance(read_retention(), convert=args.convert))
+    elif args.command == "export":
+        for chunk in transfer.export_chunks(args.start, args.end, args.format):
+            sys.stdout.buffer.write(chunk)
+    elif args.command == "merge":
+        for path, days in merge.merge_sources(args.paths).items():
+            print(f"{path}: {days}")
+    elif args.command == "import":
+        fmt = args.format or ("ndjson" if args.path.endswith(".ndjson") else "csv")
+        with open(args.path, newline="", encoding="utf-8") as f:
+            try:
+                count = transfer.import_lines(f, fmt)
+                print(f"Imported {count} rows")
+            except ValueError as e:
+                print(f"[IMPORT ERROR] {e}")
+
+    close_db()
+
+
+if __name__ == "__main__":
+    main()
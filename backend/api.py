@@ -1,11 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn, sys, requests, json
-from shared.memory import stats_data, stats_lock
-from backend.database import get_weekly_usage, get_monthly_usage
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+import uvicorn, sys, json, time, threading, asyncio, functools
+from shared import memory, metrics
+from shared.control import ControlClient
+from shared.memory import Snapshot
+from backend.database import get_range_usage, get_app_history, get_generation, merge_version, read_pool, GRANULARITIES, GROUPS, ROLLING, IMPORT_BATCH
+from backend import database
+from backend.cache import ResponseCache, cached_json_on
+from backend.assets import AssetManifest
+from backend import transfer, merge, categories
+from backend.update import UpdateChecker
+from backend.live import LiveHub
+from shared.snapshot import SnapshotReader
+from st_tracker import helper
+from fastapi.responses import StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
+from datetime import date, timedelta
 from shared.status import *
 
 
@@ -28,18 +39,46 @@ def get_local_version():
         return "0.0.0"
 
 APP_VERSION = get_local_version()
+update_checker = UpdateChecker(APP_VERSION)
 
-url = "https://raw.githubusercontent.com/sr1k7nth/WinTrack/main/remote_version.json"
+API_SECONDS = metrics.histogram("wintrack_api_seconds", "Time until the response starts, per route.", ["route"])
+
+
+class RouteTimer:
+    """ASGI middleware timing each request up to its response headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                # the router has put the matched route in the scope by now
+                # (mounts only leave their prefix in root_path)
+                route = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "unmatched"
+                API_SECONDS.labels(route).observe(time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
 
-def version_tuple(v):
-    return tuple(map(int, v.split(".")))
 
 app = FastAPI()
-app.mount("/assets", StaticFiles(directory=DIST_DIR / "assets"), name="assets")
+history_cache = ResponseCache(maxsize=32)
+# the built dashboard, read and compressed once right after startup
+spa = AssetManifest(DIST_DIR)
 
+# the dashboard as served from here and from the Vite dev server, the only
+# pages that may call the API from a browser
+DASHBOARD_ORIGINS = [f"http://{host}:{port}" for port in (7777, 7070) for host in ("localhost", "127.0.0.1")]
+
+app.add_middleware(RouteTimer)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=DASHBOARD_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -61,146 +100,394 @@ def format_top_apps(raw_data_dict):
 
     return dict(top_apps)
 
-@app.get("/api/status")
-def get_api_stats():
-    return worker_status
+# set by run_api() when the tracker lives in another process
+live_reader = None
+# (shared-memory version, Snapshot built from it)
+remote_snapshot = (None, memory.current)
+
+def read_live():
+    """The current memory.Snapshot, from wherever the tracker runs."""
+    global remote_snapshot
+    if live_reader is None:
+        return memory.current
+
+    version = live_reader.version()
+    if remote_snapshot[0] != version:
+        remote_snapshot = (version, Snapshot.from_dict(live_reader.read() or {}))
+    return remote_snapshot[1]
+
+def write_generation():
+    if live_reader is not None:
+        return live_reader.generation()
+    return get_generation()
+
+# control connection to the tracker process, for its metrics and to
+# have it reload the category rules
+tracker_control = None
+tracker_lock = threading.Lock()
+
+def tracker_call(command, default=None):
+    global tracker_control
+    with tracker_lock:
+        for _ in range(2):
+            if tracker_control is None:
+                tracker_control = ControlClient.connect()
+                if tracker_control is None:
+                    return default
+            try:
+                return tracker_control.call(command)
+            except (OSError, EOFError):
+                # tracker restarted, try a fresh connection once
+                tracker_control.close()
+                tracker_control = None
+    return default
+
+def tracker_metrics():
+    return tracker_call("metrics", [])
+
+def reload_categories():
+    """
+    Has whoever owns the category rules apply the saved ones: the tracker
+    process, or this one when the tracker runs here (or not at all). Apps
+    a merge or import added are classified by the same call.
+    """
+    if live_reader is not None:
+        tracker_call("categories")
+        return
+    try:
+        database.apply_categories(helper.read_categories())
+    except ValueError as e:
+        print(f"[CATEGORIES ERROR] {e}")
 
-@app.get("/api/daily")
-def get_stats():
-    with stats_lock:
-        data = stats_data.copy()
-    return format_top_apps(data)
+def metrics_body():
+    if live_reader is None:
+        # tracker and API share this process
+        return metrics.render(metrics.collect())
+    return metrics.render(metrics.collect(process="api"), tracker_metrics())
 
-@app.get("/api/weekly")
-def weekly_stats():
-    raw_weekly = get_weekly_usage()
+@app.get("/api/metrics")
+async def metrics_endpoint():
+    # psutil probes and the tracker's control socket block, keep them off the loop
+    return Response(await run_read(metrics_body), media_type=metrics.CONTENT_TYPE)
 
-    total_weekly = {}
+@app.get("/api/status")
+async def get_api_stats():
+    return read_live().status
 
-    for day, apps in raw_weekly.items():
-        for app, duration in apps.items():
-            if app not in total_weekly:
-                total_weekly[app] = 0
-            total_weekly[app] += duration
+def daily_snapshot():
+    snapshot = read_live()
 
-    sorted_apps = sorted(
-        total_weekly.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )
+    # the worker only publishes on changes, the running session ticks here
+    now = time.time()
+    live = {"app": snapshot.app, "at": now} if snapshot.running else None
 
-    top_apps = [app for app, _ in sorted_apps[:6]]
+    return {
+        "daily": snapshot.top(now),
+        "live": live,
+        "status": snapshot.status,
+        "version": snapshot.version,
+    }
 
-    formatted_daily = {}
+live_hub = LiveHub(daily_snapshot)
+memory.listeners.append(live_hub.notify)
 
-    for day, apps in raw_weekly.items():
-        day_data = {}
-        others_time = 0
+# /api/daily and /api/status only read memory, so they answer on the event
+# loop and never wait behind history queries in the read pool
+@app.get("/api/daily")
+async def get_stats():
+    snapshot = read_live()
+    # without a running session the body was already encoded at publish time
+    body = snapshot.daily_body or json.dumps(snapshot.top(time.time())).encode()
+    # the version only moves when the tracker publishes, so clients can
+    # tell a ticking running session from an actual change
+    return Response(body, media_type="application/json",
+                    headers={"X-Stats-Version": str(snapshot.version)})
+
+@app.get("/api/live")
+async def live_stream(request: Request):
+    """
+    Server-sent events with the daily stats and the tracker status, pushed
+    only when the worker publishes a change. "live" names the app that is
+    still running and when the snapshot was taken, the client keeps adding
+    seconds to it on its own.
+    """
+    return StreamingResponse(
+        live_hub.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        for app, duration in apps.items():
-            if app in top_apps:
-                day_data[app] = duration
-            else:
-                others_time += duration
+# "local" is this machine, "merged" adds what /api/merge brought in
+VIEWS = ("local", "merged")
 
-        for app in top_apps:
-            if app not in day_data:
-                day_data[app] = 0
+def range_stats(start, end, granularity="day", top=6, view="local", group="app"):
+    series, totals, top_apps = get_range_usage(start, end, granularity, top, view == "merged", group)
 
+    formatted = {}
+    for bucket, apps in series.items():
+        # every top app shows up in every bucket, so the chart lines are continuous
+        bucket_data = {app: apps.get(app, 0) for app in top_apps}
+        others_time = apps.get("Others", 0)
         if others_time > 0:
-            day_data["Others"] = others_time
-
-        formatted_daily[day] = day_data
+            bucket_data["Others"] = others_time
+        formatted[bucket] = bucket_data
 
-    formatted_totals = format_top_apps(total_weekly)
+    if "Others" in totals and totals["Others"] <= 0:
+        del totals["Others"]
 
     return {
-        "daily": formatted_daily,
-        "totals": formatted_totals
+        "series": formatted,
+        "totals": totals
     }
 
-@app.get("/api/monthly")
-def monthly_stats():
-    raw_monthly = get_monthly_usage()
-    total_weekly = {}
-
-    for day, apps in raw_monthly.items():
-        for app, duration in apps.items():
-            if app not in total_weekly:
-                total_weekly[app] = 0
-            total_weekly[app] += duration
-
-    sorted_apps = sorted(
-        total_weekly.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )
-
-    top_apps = [app for app, _ in sorted_apps[:6]]
-
-    formatted_daily = {}
-
-    for day, apps in raw_monthly.items():
-        day_data = {}
-        others_time = 0
-
-        for app, duration in apps.items():
-            if app in top_apps:
-                day_data[app] = duration
-            else:
-                others_time += duration
-
-        for app in top_apps:
-            if app not in day_data:
-                day_data[app] = 0
-
-        if others_time > 0:
-            day_data["Others"] = others_time
-
-        formatted_daily[day] = day_data
+def parse_day(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO date (YYYY-MM-DD)")
+
+async def run_read(fn, *args):
+    """Runs a database read on the bounded read pool instead of the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(read_pool(), functools.partial(fn, *args))
+
+async def view_key(view):
+    """Cache key part for a view, merged data only changes with a merge."""
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {', '.join(VIEWS)}")
+    return (view, write_generation(), await run_read(merge_version) if view == "merged" else None)
+
+def check_group(group):
+    if group not in GROUPS:
+        raise HTTPException(status_code=400, detail=f"group must be one of {', '.join(GROUPS)}")
+
+# history only changes when the tracker writes, so the serialized response
+# is reused until the write generation moves on
+@app.get("/api/range")
+async def range_endpoint(request: Request, start: str, end: str | None = None, granularity: str = "day", top: int = 6,
+                         view: str = "local", group: str = "app"):
+    first = parse_day(start, "start")
+    last = parse_day(end, "end") if end else date.today()
+    if first > last:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if not 1 <= top <= 50:
+        raise HTTPException(status_code=400, detail="top must be between 1 and 50")
+    check_group(group)
+
+    start, end = first.isoformat(), last.isoformat()
+    key = ("range", start, end, granularity, top, group, await view_key(view))
+    return await cached_json_on(read_pool(), history_cache, request, key,
+                                lambda: range_stats(start, end, granularity, top, view, group))
+
+def history_data(start, end, view="local", group="app"):
+    # the dashboard charts expect the per-day series under "daily"
+    data = range_stats(start, end, view=view, group=group)
+    return {
+        "daily": data["series"],
+        "totals": data["totals"]
+    }
 
-    formatted_totals = format_top_apps(total_weekly)
+@app.get("/api/weekly")
+async def weekly_stats(request: Request, view: str = "local", group: str = "app"):
+    check_group(group)
+    today = date.today()
+    start, end = (today - timedelta(days=6)).isoformat(), today.isoformat()
+    key = ("weekly", start, end, group, await view_key(view))
+    return await cached_json_on(read_pool(), history_cache, request, key, lambda: history_data(start, end, view, group))
 
+@app.get("/api/monthly")
+async def monthly_stats(request: Request, view: str = "local", group: str = "app"):
+    check_group(group)
+    today = date.today()
+    start, end = today.replace(day=1).isoformat(), today.isoformat()
+    key = ("monthly", start, end, group, await view_key(view))
+    return await cached_json_on(read_pool(), history_cache, request, key, lambda: history_data(start, end, view, group))
+
+def app_history(name, start, end, granularity, view):
+    history = get_app_history(name, start, end, granularity, view == "merged")
+    if history is None:
+        # not cached, raised before the response is encoded
+        raise HTTPException(status_code=404, detail=f"no usage recorded for {name}")
+    series, rolling, total = history
     return {
-        "daily": formatted_daily,
-        "totals": formatted_totals
+        "app": name,
+        "granularity": granularity,
+        "series": series,
+        # each bucket plus the ones before it, see database.ROLLING
+        "rolling": rolling,
+        "window": ROLLING[granularity][0],
+        "total": total,
     }
 
-@app.get("/api/update")
-def get_version():
+# the name may contain slashes (UWP apps are named after their window)
+@app.get("/api/app/{name:path}/history")
+async def app_history_endpoint(request: Request, name: str, start: str | None = None, end: str | None = None,
+                               granularity: str = "day", view: str = "local"):
+    """One app's usage over time with rolling totals, the last year by default."""
+    last = parse_day(end, "end") if end else date.today()
+    first = parse_day(start, "start") if start else last - timedelta(days=364)
+    if first > last:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    start, end = first.isoformat(), last.isoformat()
+    key = ("app", name, start, end, granularity, await view_key(view))
+    return await cached_json_on(read_pool(), history_cache, request, key,
+                                lambda: app_history(name, start, end, granularity, view))
+
+@app.get("/api/merge")
+async def merge_sources_endpoint():
+    return {"sources": await run_read(merge.list_sources)}
+
+def check_origin(request):
+    # CORS only hides the response, a simple POST from any page still runs;
+    # curl and the CLI send no Origin at all
+    origin = request.headers.get("origin")
+    if origin is not None and origin not in DASHBOARD_ORIGINS:
+        raise HTTPException(status_code=403, detail=f"requests from {origin} may not change data")
+
+@app.post("/api/merge")
+async def merge_endpoint(request: Request, body: dict | None = None):
+    """
+    Merges other machines' databases or exports, {"paths": [...]}. Without
+    paths every source merged before is brought up to date.
+    """
+    check_origin(request)
+    paths = (body or {}).get("paths") or []
+    if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+        raise HTTPException(status_code=400, detail="paths must be a list of file paths")
+    # a write on a connection of its own, offloaded like the import batches
+    merged = await run_in_threadpool(merge.merge_sources, paths)
+    await run_in_threadpool(reload_categories)
+    return {"merged": merged}
+
+def store_categories(rules):
+    helper.write_categories(rules)
+    reload_categories()
+
+@app.get("/api/categories")
+async def categories_endpoint():
+    """The category rules and how many apps each category has."""
+    return {"rules": helper.read_categories(), "apps": await run_read(database.get_categories)}
+
+@app.put("/api/categories")
+async def save_categories(request: Request, body: dict):
+    """
+    Replaces the category rules, {"rules": [...]} (see backend.categories
+    for the format). All history is reclassified in the background.
+    """
+    check_origin(request)
+    rules = body.get("rules")
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-
-        version_data = response.json()
-        current_version = get_local_version()
-        latest_version = version_data.get("latest_version", current_version)
-        update_available = version_tuple(latest_version) > version_tuple(current_version)
+        categories.RuleSet(rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # reclassifying waits on the writer (or the tracker's socket)
+    await run_in_threadpool(store_categories, rules)
+    history_cache.clear()
+    return {"rules": rules}
+
+def check_format(format):
+    if format not in transfer.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(transfer.FORMATS)}")
+
+async def read_chunks(chunks):
+    # each chunk is pulled on the read pool, so a long export holds at most
+    # one of its threads at a time
+    while True:
+        chunk = await run_read(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+@app.get("/api/export")
+async def export_endpoint(start: str = "1970-01-01", end: str | None = None, format: str = "csv"):
+    """Every daily total of the range, streamed from the database cursor."""
+    first = parse_day(start, "start")
+    last = parse_day(end, "end") if end else date.today()
+    check_format(format)
+    start, end = first.isoformat(), last.isoformat()
+    return StreamingResponse(
+        read_chunks(transfer.export_chunks(start, end, format)),
+        media_type=transfer.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="wintrack-{start}-{end}.{format}"'},
+    )
 
-        return {
-            "update_available": update_available,
-            "current_version": current_version,
-            "latest_version": latest_version,
-        }
+async def body_lines(request):
+    rest = b""
+    async for chunk in request.stream():
+        rest += chunk
+        *lines, rest = rest.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if rest:
+        yield rest.decode("utf-8")
+
+@app.post("/api/import")
+async def import_endpoint(request: Request, format: str = "csv"):
+    """
+    Loads an export back in, replacing the totals of the days and apps it
+    contains. The body is read as it arrives and stored in batches, so any
+    size works; rows before a bad line stay imported. The Content-Type has
+    to name the format, which also means a browser has to ask first.
+    """
+    check_origin(request)
+    check_format(format)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type != transfer.FORMATS[format]:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be {transfer.FORMATS[format]} for format={format}")
+    imported = 0
+    line = 1
+    batch = []
+
+    async def store(lines, first_line):
+        return await run_in_threadpool(transfer.import_lines, lines, format, first_line)
 
-    except Exception:
-        return {
-            "update_available": False,
-            "current_version": APP_VERSION,
-            "latest_version": APP_VERSION
-        }
-
-@app.get("/{full_path:path}")
-def serve_spa(full_path: str):
-    file_path = DIST_DIR / full_path
-    
-    if file_path.exists() and file_path.is_file():
-        return FileResponse(file_path)
-    
-    return FileResponse(DIST_DIR / "index.html")
+    try:
+        async for text in body_lines(request):
+            batch.append(text)
+            if len(batch) >= IMPORT_BATCH:
+                imported += await store(batch, line)
+                line += len(batch)
+                batch = []
+        if batch:
+            imported += await store(batch, line)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"{e} ({imported} rows imported before it)")
+    await run_in_threadpool(reload_categories)
+    history_cache.clear()
+    return {"imported": imported}
 
+@app.get("/api/update")
+async def get_version():
+    # answered from memory, the check itself runs on its own thread
+    update_checker.start()
+    return update_checker.result
+
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+async def serve_spa(request: Request, full_path: str):
+    if spa.files is None:
+        # too early: wait for the background load (or do it) off the event
+        # loop, reading and gzipping the dist takes a while
+        await run_in_threadpool(spa.load)
+    return spa.respond(request, full_path)
+
+
+def run_api(snapshot_name=None):
+    """
+    Serves the dashboard. With snapshot_name the live stats come from the
+    tracker process' shared-memory snapshot instead of shared.memory.
+    """
+    global live_reader
+    if snapshot_name is not None:
+        live_reader = SnapshotReader(snapshot_name)
+        live_hub.watch(live_reader.version)
+    update_checker.start()
+    # compressing the dashboard overlaps with uvicorn starting up
+    threading.Thread(target=spa.load, name="assets", daemon=True).start()
 
-def run_api():
     uvicorn.run(
         app,
         host="127.0.0.1",
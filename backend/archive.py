@@ -0,0 +1,48 @@
+import gzip, json, os
+from shared.paths import APPDATA_DIR
+
+ARCHIVE_DIR = APPDATA_DIR / "archive"
+
+
+def year_path(year):
+    return ARCHIVE_DIR / f"usage-{year}.json.gz"
+
+def write_days(days, merge=False):
+    """
+    Stores {iso_date: {app: seconds}} in the gzipped file of each year.
+    Days already in a file are replaced, not added to, so archiving the
+    same range twice is harmless. With merge only the given apps of a day
+    are replaced. Files are swapped in whole.
+    """
+    by_year = {}
+    for day, usage in days.items():
+        by_year.setdefault(day[:4], {})[day] = usage
+
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    for year, new_days in by_year.items():
+        path = year_path(year)
+        stored = read_year(path)
+        if merge:
+            for day, usage in new_days.items():
+                stored.setdefault(day, {}).update(usage)
+        else:
+            stored.update(new_days)
+        tmp = path.with_suffix(".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(stored, f, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp, path)
+
+def read_year(path):
+    if not path.exists():
+        return {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def read_days(directory=ARCHIVE_DIR):
+    """Yields (iso_date, app, seconds) from every archive file (of another machine's directory)."""
+    if not directory.exists():
+        return
+    for path in sorted(directory.glob("usage-*.json.gz")):
+        for day, usage in read_year(path).items():
+            for app, seconds in usage.items():
+                yield day, app, seconds
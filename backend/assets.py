@@ -0,0 +1,134 @@
+"""
+The built dashboard (frontend/dist) held in memory. Everything is read,
+hashed and gzipped once when the manifest is built, requests are answered
+from the dict without touching the filesystem. Building it (mostly gzip)
+is left until after the API has started, see run_api().
+
+Vite puts content-hashed names under assets/, those never change and are
+cached for a year. Everything else (index.html, files from public/) is
+revalidated with its ETag on every load.
+"""
+import gzip, hashlib, mimetypes, re, threading
+from pathlib import Path
+from fastapi import Response
+from backend.cache import etag_matches
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# index-4f3a9c1b.js, vendor-Bx8_kD2q.css
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_]{6,}\.[A-Za-z0-9]+$")
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml",
+                "application/xml", "application/wasm", "application/manifest+json")
+# below this gzip costs more than it saves
+MIN_GZIP = 256
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("image/svg+xml", ".svg")
+mimetypes.add_type("application/wasm", ".wasm")
+
+
+class Asset:
+    __slots__ = ("body", "gzip", "etag", "gzip_etag", "media_type", "cache_control")
+
+    def __init__(self, path, body):
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        # the two encodings are different representations, so different tags
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        self.media_type = media_type
+
+        self.gzip = None
+        if len(body) >= MIN_GZIP and media_type.startswith(COMPRESSIBLE):
+            packed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(packed) < len(body):
+                self.gzip = packed
+
+        hashed = path.startswith("assets/") and HASHED_NAME.search(path)
+        self.cache_control = IMMUTABLE if hashed else REVALIDATE
+
+
+def accepts_gzip(accept_encoding):
+    """Whether the Accept-Encoding header allows gzip (q=0 turns it off)."""
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class AssetManifest:
+    """
+    files maps the URL path below the root ("index.html", "assets/x.js")
+    to its Asset. Paths that are not files get index.html, so client-side
+    routes work, except under assets/ where a miss is a real 404.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        # None until loaded, by load() or the first request
+        self.files = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.files is None:
+                self.files = self._read()
+        return self.files
+
+    def _read(self):
+        files = {}
+        if self.root.is_dir():
+            for path in sorted(self.root.rglob("*")):
+                if path.is_file():
+                    name = path.relative_to(self.root).as_posix()
+                    files[name] = Asset(name, path.read_bytes())
+        else:
+            print(f"[API] {self.root} not found, the dashboard is not built")
+        return files
+
+    def size(self):
+        """Bytes held: (plain, gzip variants)."""
+        files = self.load()
+        return (sum(len(a.body) for a in files.values()),
+                sum(len(a.gzip) for a in files.values() if a.gzip))
+
+    def lookup(self, path):
+        # an empty dict is a loaded manifest too (no dashboard built)
+        files = self.files if self.files is not None else self.load()
+        asset = files.get(path.lstrip("/"))
+        if asset is None and not path.lstrip("/").startswith("assets/"):
+            asset = files.get("index.html")
+        return asset
+
+    def respond(self, request, path):
+        asset = self.lookup(path)
+        if asset is None:
+            return Response(status_code=404)
+
+        use_gzip = asset.gzip is not None and accepts_gzip(request.headers.get("accept-encoding"))
+        headers = {
+            "ETag": asset.gzip_etag if use_gzip else asset.etag,
+            "Cache-Control": asset.cache_control,
+        }
+        if asset.gzip is not None:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if etag_matches(if_none_match, asset.etag) or etag_matches(if_none_match, asset.gzip_etag):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(asset.gzip, media_type=asset.media_type, headers=headers)
+        return Response(asset.body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,82 @@
+import asyncio, hashlib, json, threading
+from collections import OrderedDict
+from fastapi import Response
+
+
+class ResponseCache:
+    """
+    Serialized JSON responses keyed by (endpoint, range, generation).
+    A new write generation simply makes new keys, old ones fall out of the
+    LRU, so nothing has to be invalidated explicitly.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def encode_entry(build):
+    body = json.dumps(build(), separators=(",", ":")).encode()
+    # hash of the bytes, so the tag stays valid across restarts
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    return etag, body
+
+def respond(request, entry):
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def cached_json(cache, request, key, build):
+    """
+    Answers from the cache when it can, with a 304 when the client already
+    has the same bytes. build() only runs on a miss.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        entry = encode_entry(build)
+        cache.put(key, entry)
+    return respond(request, entry)
+
+async def cached_json_on(executor, cache, request, key, build):
+    """
+    cached_json() for async handlers: hits are answered on the event loop,
+    build() and the encoding of a miss run on executor.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        entry = await asyncio.get_running_loop().run_in_executor(executor, encode_entry, build)
+        cache.put(key, entry)
+    return respond(request, entry)
@@ -0,0 +1,110 @@
+"""
+App categories ("Browsers", "IDE", "Games", ...) from user-editable rules,
+kept under "categories" in the config file:
+
+    {"category": "Browsers", "proc": ["chrome.exe", "firefox.exe"]}
+    {"category": "IDE", "proc": "jetbrains-*.exe"}
+    {"category": "Video", "proc": "applicationframehost.exe", "title": "re:.*(Netflix|YouTube).*"}
+
+A pattern is an exact name, a glob (* ? [...]) or a regex after "re:",
+always matched against the whole field and ignoring case. All fields of a
+rule have to match, any pattern of a list can, and the first matching rule
+wins. The title is only known for apps that are named after their window
+(UWP apps, see TrackerWorker.resolve_app), every other app is one exe.
+
+All rules are compiled into a single regex over "proc\\0title", so a lookup
+is one match whatever the number of rules, and results are memoized per
+distinct (proc, title).
+"""
+import fnmatch, hashlib, json, re
+from st_tracker.resolver import LRU
+
+FIELDS = ("proc", "title")
+# shown for apps no rule matched
+UNCATEGORIZED = "Uncategorized"
+
+
+def guess_proc(name):
+    """The exe an app name came from, for apps recorded without one (see normalize_win32_name)."""
+    return name.lower() + ".exe"
+
+def _pattern(text, where):
+    if not isinstance(text, str) or not text:
+        raise ValueError(f"{where}: patterns must be non-empty strings")
+    if text.startswith("re:"):
+        body = text[3:]
+        try:
+            re.compile(body)
+        except re.error as e:
+            raise ValueError(f"{where}: bad regex {body!r}: {e}")
+        # the whole field is matched anyway
+        if body.startswith("^"):
+            body = body[1:]
+        if body.endswith("$") and not body.endswith("\\$"):
+            body = body[:-1]
+        return body
+    if any(c in text for c in "*?["):
+        # fnmatch gives (?s:...)\Z, the anchors come from fullmatch()
+        return fnmatch.translate(text)[4:-3]
+    return re.escape(text)
+
+
+class RuleSet:
+    """
+    Compiled rules. classify(proc, title) returns the category name or
+    None, and raises nothing for any input.
+    """
+
+    def __init__(self, rules):
+        if not isinstance(rules, list):
+            raise ValueError("categories must be a list of rules")
+        self.rules = rules
+        self.categories = []
+        alternatives = []
+        for i, rule in enumerate(rules):
+            where = f"rule {i + 1}"
+            if not isinstance(rule, dict) or not isinstance(rule.get("category"), str) or not rule["category"].strip():
+                raise ValueError(f"{where}: needs a \"category\" name")
+            if not any(field in rule for field in FIELDS):
+                raise ValueError(f"{where}: needs a \"proc\" or \"title\" pattern")
+            parts = []
+            for field in FIELDS:
+                patterns = rule.get(field)
+                if patterns is None:
+                    parts.append("[^\x00]*")
+                    continue
+                if isinstance(patterns, str):
+                    patterns = [patterns]
+                if not isinstance(patterns, list) or not patterns:
+                    raise ValueError(f"{where}: \"{field}\" must be a pattern or a list of them")
+                parts.append("(?:" + "|".join(_pattern(p, f"{where} {field}") for p in patterns) + ")")
+            # the outer group closes last, so lastgroup names the rule
+            alternatives.append(f"(?P<r{i}>" + "\x00".join(parts) + ")")
+            self.categories.append(rule["category"].strip())
+
+        try:
+            self.regex = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        except re.error as e:
+            raise ValueError(f"rules do not combine: {e}")
+        self.version = hashlib.blake2b(json.dumps(rules, sort_keys=True).encode(), digest_size=8).hexdigest()
+        self.cache = LRU(4096, "categories")
+
+    def classify(self, proc, title=None):
+        key = (proc or "", title or "")
+        category = self.cache.get(key)
+        if category is None:
+            match = self.regex.fullmatch(f"{key[0]}\x00{key[1]}") if self.regex else None
+            # "" so a miss is memoized too
+            category = self.categories[int(match.lastgroup[1:])] if match else ""
+            self.cache.put(key, category)
+        return category or None
+
+
+# what the database writer classifies new apps with, None until use()
+rules = None
+
+def use(rule_list):
+    """Compiles rule_list and makes it the active set. ValueError if invalid."""
+    global rules
+    rules = RuleSet(rule_list)
+    return rules
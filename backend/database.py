@@ -1,105 +1,1208 @@
-import sqlite3
-from datetime import date, timedelta
+import sqlite3, threading, queue, time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from shared import metrics
 from shared.paths import DB_PATH
+from shared.journal import Journal, JOURNAL_PATH
+from backend import archive, categories
 
+# how many pending batches the tracker may queue before submit() starts refusing
+WRITE_QUEUE_SIZE = 64
+# longest write() waits for its batch, maintenance and imports come in small steps
+WRITE_TIMEOUT = 120
+# a submitted batch whose transaction failed is tried this many more times,
+# RETRY_DELAY seconds apart at the latest, before the writer gives up on it
+WRITE_RETRIES = 5
+RETRY_DELAY = 5
+# the submitted kinds that are retried, nothing else has their data
+RETRIED = ("sessions", "apps")
+# threads (each with its own read-only connection) serving the API's queries,
+# kept low because turning rows into dicts holds the GIL the event loop needs
+READ_WORKERS = 2
+# prepared statements kept per connection, range_query() has a handful of shapes
+READ_STATEMENTS = 256
+# rows per transaction for import_usage(), and per fetch for export_usage()
+IMPORT_BATCH = 50000
+EXPORT_FETCH = 2000
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+_STOP = object()
+_local = threading.local()
+
+DB_SECONDS = metrics.histogram("wintrack_db_seconds", "SQLite time per database function.", ["function"])
+COMMIT_SECONDS = DB_SECONDS.labels("writer_commit")
+COMMIT_BATCHES = metrics.histogram("wintrack_db_commit_batches", "Queued batches coalesced into one writer transaction.",
+                                   buckets=(1, 2, 4, 8, 16, 32, 64))
+metrics.gauge("wintrack_db_write_queue", "Batches waiting for the writer.", fn=lambda: writer.queue.qsize())
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False)
+    # lets maintenance free pages in small steps. Only takes effect on a new
+    # file (before WAL writes its header), older databases are switched over
+    # by `python -m backend maintain --convert`
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets the dashboard read while the tracker writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+def connect_readonly(path=None):
+    """
+    A connection that can only read: opened with mode=ro and query_only,
+    so a bug in a read path can never take the write lock from the tracker.
+    Statements are prepared once per connection and reused from its cache.
+    """
+    uri = Path(path or DB_PATH).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=READ_STATEMENTS)
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+_read_pool = None
+_read_pool_lock = threading.Lock()
+
+def read_pool():
+    """
+    Bounded pool for the API: async handlers hand their queries to it, each
+    of its threads keeps one read-only connection (see _reader). Made on
+    first use, the tracker process never needs it.
+    """
+    global _read_pool
+    if _read_pool is None:
+        with _read_pool_lock:
+            if _read_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _read_pool = ThreadPoolExecutor(READ_WORKERS, thread_name_prefix="db-read")
+    return _read_pool
+
+def _reader():
+    # one long-lived read connection per thread instead of connect-per-call
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = connect_readonly()
+        _local.conn = conn
+        # the archive mirror is a temp table of the connection
+        _local.archive_version = None
+    return conn
+
+
+def day_start(day):
+    """Local midnight of an ISO date as a unix timestamp."""
+    return datetime.combine(date.fromisoformat(day), datetime.min.time()).timestamp()
+
+def split_days(start_ts, end_ts):
+    """Cuts an interval at local midnight, yields (date, start_ts, end_ts)."""
+    day = date.fromtimestamp(start_ts)
+    while True:
+        next_midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        if end_ts <= next_midnight:
+            yield day.isoformat(), start_ts, end_ts
+            return
+        yield day.isoformat(), start_ts, next_midnight
+        start_ts = next_midnight
+        day += timedelta(days=1)
+
+
+# The usage tables key days as days since 1970-01-01, weeks as the day
+# number of their Monday and months as year * 12 + month - 1
+EPOCH = date(1970, 1, 1).toordinal()
+
+def day_number(day):
+    """ISO date -> day number."""
+    return date.fromisoformat(day).toordinal() - EPOCH
+
+def day_iso(number):
+    return date.fromordinal(number + EPOCH).isoformat()
+
+def week_number(day_no):
+    """Day number of the Monday of the week, 1970-01-01 was a Thursday."""
+    return day_no - (day_no + 3) % 7
+
+def month_number(day_no):
+    d = date.fromordinal(day_no + EPOCH)
+    return d.year * 12 + d.month - 1
+
+def month_iso(number):
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+def month_first_day(number):
+    return date(number // 12, number % 12 + 1, 1).toordinal() - EPOCH
+
+# the same in SQL, for a day number column called day
+# (the double modulo keeps days before 1970 on the right Monday)
+WEEK_OF_DAY = "day - ((day + 3) % 7 + 7) % 7"
+MONTH_OF_DAY = ("CAST(strftime('%Y', day * 86400, 'unixepoch') AS INTEGER) * 12 "
+                "+ CAST(strftime('%m', day * 86400, 'unixepoch') AS INTEGER) - 1")
+# and for the ISO date TEXT columns of the old layout
+DAY_OF_ISO = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+# app name -> id in the apps table. Ids never change, so this only grows;
+# the writer clears it when a transaction that may have added apps fails
+app_ids = {}
+
+def app_id(conn, name):
+    """Id of an app name, added to the apps table if it is new, no commit."""
+    id_ = app_ids.get(name)
+    if id_ is None:
+        # classified by name until the tracker reports its exe, see describe_apps()
+        category = classify(conn, categories.guess_proc(name))
+        conn.execute("INSERT OR IGNORE INTO apps(name, category_id) VALUES(?,?)", (name, category))
+        id_ = conn.execute("SELECT id FROM apps WHERE name = ?", (name,)).fetchone()[0]
+        app_ids[name] = id_
+    return id_
+
+# category name -> id, the same for the categories table
+category_ids = {}
+
+def classify(conn, proc, title=None):
+    """
+    Category id for an exe (and title) under the active rules, no commit.
+    None while this process has no rules (see categories.use()), the app is
+    then classified by the next categorize() of the process that has them.
+    """
+    if categories.rules is None:
+        return None
+    return category_id(conn, categories.rules.classify(proc, title))
+
+def category_id(conn, name):
+    """Id of a category name, 0 when no rule matched (None), no commit."""
+    if name is None:
+        return 0
+    id_ = category_ids.get(name)
+    if id_ is None:
+        conn.execute("INSERT OR IGNORE INTO categories(name) VALUES(?)", (name,))
+        id_ = conn.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()[0]
+        category_ids[name] = id_
+    return id_
+
+
+class WriteDone(threading.Event):
+    """Set once a write() batch went through, error is what failed it."""
+    error = None
+
+
+class UsageWriter:
+    """
+    Owns the write connection of this process, there is one writer per
+    process. The tracker process writes the sessions; the API process has
+    its own for imports and category changes on the same file (backend.merge
+    writes on a connection of its own).
+    Between processes nothing is coordinated here: SQLite's WAL lets only
+    one of them hold the write lock at a time, and the other waits for it
+    up to busy_timeout (see connect()) before its transaction fails.
+    Batches are queued without blocking and a background thread coalesces
+    everything pending into a single transaction.
+
+    Queue items are (kind, payload, done, ticket):
+      "sessions" - list of (start_ts, end_ts, app, title) closed intervals
+      "totals"   - (day, [(app, total)]) absolute totals, the old bulk save
+      "apps"     - list of (app, proc, title) the tracker resolved, see describe_apps()
+      "call"     - fn(conn), run inside the same transaction
+      "flush"    - nothing, just signals done once everything before it is in
+    """
+
+    def __init__(self, path=None, maxsize=WRITE_QUEUE_SIZE):
+        self.path = path
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.refused = 0
+        # bumped after every commit that changed something, readers use it
+        # to tell whether cached results are still current
+        self.generation = 0
+        # called with the new generation after each commit, on the writer thread
+        self.on_commit = []
+        # submit() numbers its batches, committed is the highest one that
+        # made it and failed holds the RETRIED ones below it whose
+        # transaction did not (waiting for a retry, or given up)
+        self.tickets = 0
+        self.committed = 0
+        self.failed = set()
+        # (item, attempts) of submitted batches whose transaction failed,
+        # tried again on their own before the next batches
+        self.retry = []
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, kind, payload):
+        """
+        Queues a batch and returns immediately with its ticket, the batch is
+        in the database once is_committed(ticket). False means the queue is full.
+        """
+        self.start()
+        try:
+            with self.lock:
+                # read back outside the lock, self.tickets may already be
+                # another thread's
+                ticket = self.tickets + 1
+                self.queue.put_nowait((kind, payload, None, ticket))
+                self.tickets = ticket
+            self.refused = 0
+            return ticket
+        except queue.Full:
+            if not self.refused:
+                print("[DB WARN] Write queue full, batch deferred")
+            self.refused += 1
+            return False
+
+    def is_committed(self, ticket):
+        return ticket <= self.committed and ticket not in self.failed
+
+    def all_committed(self):
+        return self.committed >= self.tickets and not self.failed
+
+    def write(self, kind, payload, timeout=WRITE_TIMEOUT):
+        """
+        Queues a batch and waits until it is committed. Raises what made the
+        transaction fail, or TimeoutError if the writer does not get to it.
+        """
+        done = WriteDone()
+        self.start()
+        try:
+            self.queue.put((kind, payload, done, None), timeout=timeout)
+        except queue.Full:
+            raise TimeoutError("database writer is backed up")
+        if not done.wait(timeout):
+            raise TimeoutError(f"database writer did not answer within {timeout}s")
+        if done.error is not None:
+            raise done.error
+        return True
+
+    def flush(self, timeout=5):
+        if self.thread is None:
+            return True
+        try:
+            return self.write("flush", None, timeout)
+        except (TimeoutError, sqlite3.Error) as e:
+            print(f"[DB ERROR] Flush failed: {e}")
+            return False
+
+    def close(self, timeout=5):
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _run(self):
+        conn = connect(self.path)
+        running = True
+        while running:
+            try:
+                items = [self.queue.get(timeout=RETRY_DELAY if self.retry else None)]
+            except queue.Empty:
+                items = []
+            # drain whatever else is pending so it lands in the same transaction
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in items:
+                running = False
+                items = [item for item in items if item is not _STOP]
+
+            # separately, so a batch that keeps failing does not take the new ones with it
+            pending, self.retry = self.retry, []
+            if pending and self._transaction(conn, [item for item, _ in pending]) is not None:
+                for item, attempts in pending:
+                    self._keep(item, attempts)
+
+            error = self._transaction(conn, items) if items else None
+            if error is not None:
+                for item in items:
+                    self._keep(item, 0)
+
+            for _, _, done, _ in items:
+                if done is not None:
+                    done.error = error
+                    done.set()
+        conn.close()
+
+    def _transaction(self, conn, items):
+        """Commits items in one transaction, returns the error that rolled it back."""
+        try:
+            start = time.perf_counter()
+            with conn:
+                changed = self._commit(conn, items)
+            COMMIT_SECONDS.observe(time.perf_counter() - start)
+            COMMIT_BATCHES.observe(len(items))
+            tickets = [t for _, _, _, t in items if t]
+            self.failed.difference_update(tickets)
+            self.committed = max([self.committed] + tickets)
+            if changed:
+                self.generation += 1
+                for callback in self.on_commit:
+                    callback(self.generation)
+            return None
+        except Exception as e:
+            # anything a call raised too (an archive file that cannot be
+            # written, ...), the thread has to outlive it
+            print(f"[DB ERROR] Bulk save failed: {e}")
+            # ids handed out in the rolled back transaction are gone
+            app_ids.clear()
+            category_ids.clear()
+            # before any later ticket can move committed past them
+            self.failed.update(t for kind, _, _, t in items if t and kind in RETRIED)
+            return e
+
+    def _keep(self, item, attempts):
+        """
+        Holds on to a submitted batch of a failed transaction. The tracker
+        has already handed those intervals over (they are deltas, nothing
+        brings them back), write() batches report the error to their caller.
+        """
+        kind, _, done, _ = item
+        if done is not None or kind not in RETRIED:
+            return
+        if attempts < WRITE_RETRIES:
+            self.retry.append((item, attempts + 1))
+        else:
+            print(f"[DB ERROR] Gave up on a {kind} batch after {WRITE_RETRIES} retries")
+
+    def _commit(self, conn, items):
+        sessions = []
+        # totals are absolute, so the latest value per (date, app) wins
+        totals = {}
+        calls = []
+        apps = []
+        for kind, payload, _, _ in items:
+            if kind == "sessions":
+                sessions.extend(payload)
+            elif kind == "apps":
+                apps.extend(payload)
+            elif kind == "totals":
+                day, usage_list = payload
+                for name, dur in usage_list:
+                    totals[(day, name)] = dur
+            elif kind == "call":
+                calls.append(payload)
+
+        if apps:
+            describe_apps(conn, apps)
+        if totals:
+            sessions.extend(_adjustments(conn, totals))
+        if sessions:
+            append_sessions(conn, sessions)
+        for fn in calls:
+            fn(conn)
+        return bool(sessions or calls or apps)
+
+
+def _adjustments(conn, totals):
+    """
+    Turns absolute totals into log entries. The difference to what is already
+    rolled up is stored as an untitled interval starting at midnight, so
+    rebuilding from the log still gives the same totals. A lower total gives
+    an interval with end_ts < start_ts.
+    """
+    rows = []
+    for (day, name), total in totals.items():
+        cur = conn.execute("SELECT duration FROM daily_usage WHERE day = ? AND app_id = ?",
+                           (day_number(day), app_id(conn, name)))
+        row = cur.fetchone()
+        delta = total - (row[0] if row else 0)
+        if delta:
+            start = day_start(day)
+            rows.append((start, start + delta, name, None))
+    return rows
+
+def append_sessions(conn, sessions):
+    """Appends intervals to the log and adds them to daily_usage, no commit."""
+    rows = []
+    for start, end, name, title in sessions:
+        app = app_id(conn, name)
+        if end < start:
+            rows.append((day_number(date.fromtimestamp(start).isoformat()), start, end, app, title))
+            continue
+        for day, s, e in split_days(start, end):
+            rows.append((day_number(day), s, e, app, title))
+
+    conn.executemany("""
+        INSERT INTO sessions(day, start_ts, end_ts, app_id, title)
+        VALUES(?,?,?,?,?)
+    """, rows)
+
+    rollup = {}
+    for day, s, e, app, _ in rows:
+        rollup[(day, app)] = rollup.get((day, app), 0) + (e - s)
+    add_usage(conn, rollup)
+
+def add_usage(conn, deltas):
+    """Adds {(day number, app id): seconds} to daily_usage and the weekly/monthly summaries."""
+    weekly = {}
+    monthly = {}
+    for (day, app), dur in deltas.items():
+        key = (week_number(day), app)
+        weekly[key] = weekly.get(key, 0) + dur
+        key = (month_number(day), app)
+        monthly[key] = monthly.get(key, 0) + dur
+
+    for table, key, rows in (
+        ("daily_usage", "day", deltas),
+        ("weekly_usage", "week", weekly),
+        ("monthly_usage", "month", monthly),
+    ):
+        conn.executemany(f"""
+            INSERT INTO {table}({key}, app_id, duration)
+            VALUES(?,?,?)
+            ON CONFLICT({key}, app_id)
+            DO UPDATE SET duration = duration + excluded.duration
+        """, [(k, app, dur) for (k, app), dur in rows.items()])
+
+def describe_apps(conn, apps):
+    """Stores the exe (and the title of apps named after it) of (app, proc, title) and classifies them."""
+    rows = [(proc, title, classify(conn, proc, title), app_id(conn, name)) for name, proc, title in apps]
+    conn.executemany("UPDATE apps SET proc = ?, title = ?, category_id = ? WHERE id = ?", rows)
+
+def categorize(conn, everything=True, ruleset=None):
+    """
+    Classifies apps with ruleset (the active rules by default): all of them,
+    or only those never classified (bulk inserts by merges and migrations).
+    Apps recorded without an exe are classified by their name. No commit.
+    """
+    ruleset = ruleset or categories.rules
+    if ruleset is None:
+        return 0
+    where = "" if everything else " WHERE category_id IS NULL"
+    rows = conn.execute(f"SELECT id, name, proc, title FROM apps{where}").fetchall()
+    conn.executemany("UPDATE apps SET category_id = ? WHERE id = ?", [
+        (category_id(conn, ruleset.classify(proc or categories.guess_proc(name), title)), id_)
+        for id_, name, proc, title in rows
+    ])
+    if everything:
+        conn.execute("DELETE FROM categories WHERE id NOT IN (SELECT category_id FROM apps WHERE category_id IS NOT NULL)")
+        category_ids.clear()
+        set_meta(conn, "categories_version", ruleset.version)
+    return len(rows)
+
+def rebuild_rollups(conn, start, end):
+    """Recomputes daily_usage for start..end (ISO dates) from the log in one pass."""
+    # days before the history floor have no (full) log left to rebuild from
+    lo, hi = max(day_number(start), history_floor(conn)), day_number(end)
+    if lo > hi:
+        return
+    start = day_iso(lo)
+    conn.execute("DELETE FROM daily_usage WHERE day BETWEEN ? AND ?", (lo, hi))
+    conn.execute("""
+        INSERT INTO daily_usage(day, app_id, duration)
+        SELECT day, app_id, SUM(end_ts - start_ts)
+        FROM sessions
+        WHERE day BETWEEN ? AND ?
+        GROUP BY day, app_id
+    """, (lo, hi))
+    rebuild_summaries(conn, start, end)
+
+def rebuild_summaries(conn, start, end):
+    """Recomputes every week and month touching start..end from daily_usage."""
+    lo, hi = day_number(start), day_number(end)
+    first_week, last_week = week_number(lo), week_number(hi)
+    conn.execute("DELETE FROM weekly_usage WHERE week BETWEEN ? AND ?", (first_week, last_week))
+    conn.execute(f"""
+        INSERT INTO weekly_usage(week, app_id, duration)
+        SELECT {WEEK_OF_DAY}, app_id, SUM(duration)
+        FROM daily_usage
+        WHERE day BETWEEN ? AND ?
+        GROUP BY 1, 2
+    """, (first_week, last_week + 6))
+
+    first_month, last_month = month_number(lo), month_number(hi)
+    conn.execute("DELETE FROM monthly_usage WHERE month BETWEEN ? AND ?", (first_month, last_month))
+    conn.execute(f"""
+        INSERT INTO monthly_usage(month, app_id, duration)
+        SELECT {MONTH_OF_DAY}, app_id, SUM(duration)
+        FROM daily_usage
+        WHERE day BETWEEN ? AND ?
+        GROUP BY 1, 2
+    """, (month_first_day(first_month), month_first_day(last_month + 1) - 1))
+
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES(?,?)", (key, value))
+
+def history_floor(conn):
+    """First day number the session log still fully covers, see backend.maintenance."""
+    return max(get_meta(conn, key, -2**62) for key in ("sessions_from", "downsampled_before", "archived_before"))
+
+
+writer = UsageWriter()
+
+
+def create_tables(cur):
+    # app names are stored once, every other table refers to them by id
+    # proc is the exe the tracker last saw the app as, title is only kept for
+    # apps named after their window. category_id 0 means no rule matched,
+    # NULL not classified yet (see categorize())
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS apps (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            proc TEXT,
+            title TEXT,
+            category_id INTEGER
+        )
+    """)
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(apps)")}
+    for column in ("proc TEXT", "title TEXT", "category_id INTEGER"):
+        if column.split()[0] not in columns:
+            cur.execute(f"ALTER TABLE apps ADD COLUMN {column}")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY,
+            day INTEGER,
+            start_ts REAL,
+            end_ts REAL,
+            app_id INTEGER,
+            title TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_day ON sessions(day)")
+    # totals per day, per ISO week (keyed by its Monday) and per calendar
+    # month, kept up to date by add_usage() so the history endpoints never
+    # re-add days. WITHOUT ROWID stores the rows in primary key order, so a
+    # date range is one contiguous read
+    for table, key in (("daily_usage", "day"), ("weekly_usage", "week"), ("monthly_usage", "month")):
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key} INTEGER,
+                app_id INTEGER,
+                duration REAL,
+                PRIMARY KEY ({key}, app_id)
+            ) WITHOUT ROWID
+        """)
+        # one app's history (get_app_history) is a range of these indexes.
+        # Days are read from the index alone, the summaries look up the
+        # duration, as their totals change on every write and a covering
+        # index would be rewritten each time
+        columns = f"app_id, {key}, duration" if table == "daily_usage" else f"app_id, {key}"
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_app ON {table}({columns})")
+    # other machines' databases and exports merged in by backend.merge, with
+    # how far each has been read, and their daily totals
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sources (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            high_water INTEGER DEFAULT 0,
+            downsampled_before INTEGER,
+            merged_at REAL
+        )
+    """)
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(sources)")}
+    for column in ("sessions INTEGER", "archive_version INTEGER"):
+        if column.split()[0] not in columns:
+            cur.execute(f"ALTER TABLE sources ADD COLUMN {column}")
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS daily_usage (
-            date TEXT,
-            app_name TEXT,
+        CREATE TABLE IF NOT EXISTS remote_usage (
+            day INTEGER,
+            source INTEGER,
+            app_id INTEGER,
             duration REAL,
-            PRIMARY KEY (date, app_name)
+            PRIMARY KEY (day, source, app_id)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_remote_usage_app ON remote_usage(app_id, day, duration)")
+    # day numbers up to which retention has pruned, downsampled and archived
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value
         )
     """)
+
+def migrate_text_schema(conn):
+    """
+    Moves a database from the old layout, with the ISO date and the app name
+    as TEXT in every row, to day numbers and app ids in one transaction.
+    The oldest databases only have daily_usage: their totals are carried
+    over as untitled intervals, and the summaries are computed.
+    """
+    cur = conn.cursor()
+    tables = {name for (name,) in cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    old = [table for table in ("daily_usage", "sessions", "weekly_usage", "monthly_usage") if table in tables]
+
+    cur.execute("BEGIN")
+    for table in old:
+        cur.execute(f"ALTER TABLE {table} RENAME TO {table}_text")
+    cur.execute("DROP INDEX IF EXISTS idx_sessions_date")
+    create_tables(cur)
+
+    for table in old:
+        cur.execute(f"INSERT OR IGNORE INTO apps(name) SELECT DISTINCT app_name FROM {table}_text WHERE app_name IS NOT NULL")
+    cur.execute(f"""
+        INSERT INTO daily_usage(day, app_id, duration)
+        SELECT {DAY_OF_ISO.format("date")}, apps.id, duration
+        FROM daily_usage_text JOIN apps ON apps.name = app_name
+    """)
+
+    if "sessions" in tables:
+        cur.execute(f"""
+            INSERT INTO sessions(id, day, start_ts, end_ts, app_id, title)
+            SELECT s.id, {DAY_OF_ISO.format("s.date")}, start_ts, end_ts, apps.id, s.title
+            FROM sessions_text s JOIN apps ON apps.name = app_name
+        """)
+    else:
+        # old databases only have totals, carry them over as untitled intervals
+        rows = cur.execute("SELECT day, app_id, duration FROM daily_usage").fetchall()
+        cur.executemany("""
+            INSERT INTO sessions(day, start_ts, end_ts, app_id, title)
+            VALUES(?,?,?,?,NULL)
+        """, [(d, day_start(day_iso(d)), day_start(day_iso(d)) + dur, app) for d, app, dur in rows])
+
+    if "monthly_usage" in tables:
+        cur.execute(f"""
+            INSERT INTO weekly_usage(week, app_id, duration)
+            SELECT {DAY_OF_ISO.format("week_start")}, apps.id, duration
+            FROM weekly_usage_text JOIN apps ON apps.name = app_name
+        """)
+        cur.execute("""
+            INSERT INTO monthly_usage(month, app_id, duration)
+            SELECT CAST(substr(month, 1, 4) AS INTEGER) * 12 + CAST(substr(month, 6, 2) AS INTEGER) - 1,
+                   apps.id, duration
+            FROM monthly_usage_text JOIN apps ON apps.name = app_name
+        """)
+    else:
+        first, last = cur.execute("SELECT MIN(day), MAX(day) FROM daily_usage").fetchone()
+        if first is not None:
+            rebuild_summaries(conn, day_iso(first), day_iso(last))
+
+    for table in old:
+        cur.execute(f"DROP TABLE {table}_text")
+    conn.commit()
+    print("[DB] Migrated to the app id / day number layout")
+
+def init_db(recover=True):
+    conn = connect()
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(daily_usage)")}
+    if columns and "app_id" not in columns:
+        migrate_text_schema(conn)
+    create_tables(cur)
+
+    if recover:
+        recover_journal(conn)
     conn.commit()
     conn.close() # ALWAYS close your connections
 
-def bulk_save_usage(usage_list):
+@metrics.timed(DB_SECONDS)
+def recover_journal(conn, path=JOURNAL_PATH):
     """
-    Saves a list of (app_name, duration) tuples.
-    This is what your perform_sync() is looking for.
+    Writes back what a killed tracker had not committed, from its journal:
+    intervals still waiting for the writer and the running session up to
+    when the tracker was last awake. Whatever the log already has is skipped.
     """
-    today = date.today().isoformat()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    journal = Journal(path)
+    state = journal.read() or {}
+    sessions = []
+    for start, end, name, title in state.get("pending", []):
+        if not conn.execute("SELECT 1 FROM sessions WHERE app_id = ? AND start_ts = ?", (app_id(conn, name), start)).fetchone():
+            sessions.append((start, end, name, title))
+
+    name, start, seen = state.get("app"), state.get("start"), state.get("seen")
+    if name and start is not None:
+        # a checkpoint may have reached the log after the journal was written
+        cur = conn.execute("SELECT MAX(end_ts) FROM sessions WHERE app_id = ? AND end_ts > ?", (app_id(conn, name), start))
+        start = max(start, cur.fetchone()[0] or start)
+        if seen > start:
+            sessions.append((start, seen, name, state.get("title")))
+
+    if sessions:
+        append_sessions(conn, sessions)
+        print(f"[DB] Recovered {len(sessions)} unsynced intervals from the journal")
+    journal.clear()
+    journal.close()
+
+def bulk_save_usage(usage_list, day=None):
+    """
+    Saves a list of (app_name, duration) totals and waits for the commit.
+    """
+    day = day or date.today().isoformat()
+    writer.write("totals", (day, list(usage_list)))
+
+def queue_apps(apps):
+    """
+    Hands (app, proc, title) of newly resolved apps to the writer without
+    blocking, False if it is backed up. See describe_apps().
+    """
+    return writer.submit("apps", list(apps))
+
+def apply_categories(rule_list):
+    """
+    Makes rule_list the active category rules (ValueError if it does not
+    compile) and has the writer reclassify every app when the database was
+    classified with different rules, otherwise only apps that were added
+    without rules (by merges or imports in the API process). Does not wait
+    for it.
+    """
+    ruleset = categories.use(rule_list)
+
+    def reclassify(conn):
+        # with the same rules only apps added without them need classifying
+        everything = get_meta(conn, "categories_version") != ruleset.version
+        count = categorize(conn, everything, ruleset)
+        if count:
+            print(f"[DB] Classified {count} apps into categories")
+    writer.submit("call", reclassify)
+    return ruleset
+
+def get_categories():
+    """{category: number of apps}, with the apps no rule matched under UNCATEGORIZED."""
+    cur = _reader().execute("""
+        SELECT COALESCE(categories.name, ?), COUNT(*)
+        FROM apps LEFT JOIN categories ON categories.id = apps.category_id
+        GROUP BY 1 ORDER BY 2 DESC
+    """, (categories.UNCATEGORIZED,))
+    return dict(cur.fetchall())
+
+def queue_sessions(sessions):
+    """
+    Appends closed (start_ts, end_ts, app, title) intervals without blocking.
+    This is what perform_sync() uses from the tracker loop.
+    Returns the writer ticket, or False if the writer is backed up and the
+    caller should keep them.
+    """
+    return writer.submit("sessions", list(sessions))
+
+def is_committed(ticket):
+    """Whether the queue_sessions() batch with this ticket is in the database."""
+    return writer.is_committed(ticket)
+
+@metrics.timed(DB_SECONDS)
+def import_usage(rows, batch=IMPORT_BATCH):
+    """
+    Stores (iso_date, app, seconds) daily totals the way bulk_save_usage()
+    does, replacing what is recorded for that day and app, batch rows per
+    writer transaction. Returns the number of rows read.
+    """
+    count = 0
+    totals = {}
+    for day, app, seconds in rows:
+        totals[(day, app)] = seconds
+        count += 1
+        if len(totals) >= batch:
+            _import_totals(totals)
+            totals = {}
+    if totals:
+        _import_totals(totals)
+    return count
 
-    # Prep the data for SQLite
-    data = [(today, name, dur) for name, dur in usage_list]
+def _import_totals(totals):
+    def save(conn):
+        live = dict(totals)
+        horizon = get_meta(conn, "archived_before")
+        if horizon is not None:
+            # days maintenance has archived are updated in the archive files
+            archived = {}
+            for day, app in list(live):
+                if day_number(day) < horizon:
+                    archived.setdefault(day, {})[app] = live.pop((day, app))
+            if archived:
+                archive.write_days(archived, merge=True)
+                set_meta(conn, "archive_version", (get_meta(conn, "archive_version") or 0) + 1)
+        append_sessions(conn, _adjustments(conn, live))
+    writer.write("call", save)
 
+def export_usage(start, end, fetch=EXPORT_FETCH):
+    """
+    Yields (iso_date, app, seconds) for an ISO date range, oldest day first,
+    archived days included. Reads in batches on a connection of its own, so
+    memory stays flat whatever the range.
+    """
+    lo, hi = day_number(start), day_number(end)
+    conn = connect_readonly()
     try:
-        # This is the "Atomic" way to save. Fast and safe.
-        cur.executemany("""
-            INSERT INTO daily_usage(date, app_name, duration)
-            VALUES(?,?,?)
-            ON CONFLICT(date, app_name)
-            DO UPDATE SET duration = excluded.duration
-        """, data)
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"[DB ERROR] Bulk save failed: {e}")
+        horizon = get_meta(conn, "archived_before")
+        if horizon is not None and lo < horizon:
+            for day, app, seconds in archive.read_days():
+                if start <= day <= end and day_number(day) < horizon:
+                    yield day, app, seconds
+            lo = horizon
+
+        # daily_usage is stored in (day, app_id) order, so this is not sorted again
+        cur = conn.execute("""
+            SELECT day, name, duration
+            FROM daily_usage JOIN apps ON apps.id = app_id
+            WHERE day BETWEEN ? AND ?
+            ORDER BY day
+        """, (lo, hi))
+        last, iso = None, None
+        while True:
+            rows = cur.fetchmany(fetch)
+            if not rows:
+                break
+            for day, app, seconds in rows:
+                if day != last:
+                    last, iso = day, day_iso(day)
+                yield iso, app, seconds
     finally:
         conn.close()
 
-def get_today_data():
-    today = date.today().isoformat()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT app_name, duration FROM daily_usage WHERE date = ?", (today,))
+def clear_day(day):
+    """Drops everything recorded for one ISO date, used by the Reset button."""
+    def clear(conn):
+        conn.execute("DELETE FROM sessions WHERE day = ?", (day_number(day),))
+        conn.execute("DELETE FROM daily_usage WHERE day = ?", (day_number(day),))
+        rebuild_summaries(conn, day, day)
+    writer.write("call", clear)
+
+def rebuild(start, end):
+    """Rebuilds the daily rollups for an ISO date range on the writer thread."""
+    writer.write("call", lambda conn: rebuild_rollups(conn, start, end))
+
+def get_generation():
+    """Write generation of the database, changes whenever any data does."""
+    return writer.generation
+
+def merge_version():
+    """Bumped by every merge that brought in data, see backend.merge."""
+    return get_meta(_reader(), "merge_version", 0)
+
+def close_db():
+    """Flushes pending batches and closes the writer connection."""
+    writer.flush()
+    writer.close()
+
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@metrics.timed(DB_SECONDS)
+def get_today_data(day=None):
+    today = day or date.today().isoformat()
+    cur = _reader().cursor()
+    cur.execute("""
+        SELECT name, duration
+        FROM daily_usage JOIN apps ON apps.id = app_id
+        WHERE day = ?
+    """, (day_number(today),))
     rows = cur.fetchall()
-    conn.close()
     return {app: duration for app, duration in rows}
 
+@metrics.timed(DB_SECONDS)
 def get_weekly_usage():
     today = date.today()
     week_start = today - timedelta(days=6)
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = _reader().cursor()
 
     cur.execute("""
-        SELECT date, app_name, SUM(duration)
-        FROM daily_usage
-        WHERE date BETWEEN ? AND ?
-        GROUP BY date, app_name
-        ORDER BY date ASC
-    """, (week_start.isoformat(), today.isoformat()))
+        SELECT day, name, duration
+        FROM daily_usage JOIN apps ON apps.id = app_id
+        WHERE day BETWEEN ? AND ?
+        ORDER BY day ASC
+    """, (day_number(week_start.isoformat()), day_number(today.isoformat())))
     
     rows = cur.fetchall()
-    conn.close()
 
     result = {}
     for d, app, dur in rows:
+        d = day_iso(d)
         if d not in result:
             result[d] = {}
         result[d][app] = dur
     return result
 
+@metrics.timed(DB_SECONDS)
 def get_monthly_usage():
     today = date.today()
     # Get the start of the current month
     month_start = today.replace(day=1).isoformat()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = _reader().cursor()
 
     cur.execute("""
-        SELECT date, app_name, duration
-        FROM daily_usage
-        WHERE date BETWEEN ? AND ?
-        ORDER BY date ASC
-    """, (month_start, today.isoformat()))
+        SELECT day, name, duration
+        FROM daily_usage JOIN apps ON apps.id = app_id
+        WHERE day BETWEEN ? AND ?
+        ORDER BY day ASC
+    """, (day_number(month_start), day_number(today.isoformat())))
     
     rows = cur.fetchall()
-    conn.close()
 
     result = {}
     for d, app, dur in rows:
+        d = day_iso(d)
         if d not in result:
             result[d] = {}
         result[d][app] = dur
     return result
 
+GRANULARITIES = ("day", "week", "month")
+
+# bucket of a daily_usage row for each granularity, and how it is labelled
+BUCKET_OF_DAY = {
+    "day": "day",
+    "week": WEEK_OF_DAY,
+    "month": MONTH_OF_DAY,
+}
+BUCKET_LABEL = {
+    "day": day_iso,
+    "week": day_iso,
+    "month": month_iso,
+}
+SUMMARIES = {
+    "week": ("weekly_usage", "week"),
+    "month": ("monthly_usage", "month"),
+}
+
+def _period_start(d, granularity):
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    return d.replace(day=1)
+
+def _next_period(d, granularity):
+    if granularity == "week":
+        return d + timedelta(days=7)
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _period_key(d, granularity):
+    if granularity == "week":
+        return d.toordinal() - EPOCH
+    return d.year * 12 + d.month - 1
+
+def _range_source(start, end, granularity, horizon=None, merged=False, app=None):
+    """
+    SQL yielding (bucket, app_id, duration) rows for start..end. Weeks and
+    months that lie completely inside the range are read from the summary
+    tables, only the partial ones at the edges come from daily_usage, so a
+    multi-year range stays a few thousand rows.
+
+    Days before horizon (a day number) have been archived and come from the
+    temp.archived_usage mirror of the archive files instead. merged adds
+    the other machines' days from remote_usage. With an app id only that
+    app's rows are read, through the (app_id, day) indexes.
+    """
+    only = " AND app_id = ?" if app is not None else ""
+    extra = [app] if app is not None else []
+
+    def daily(lo, hi, table="daily_usage"):
+        return (f"SELECT {BUCKET_OF_DAY[granularity]} AS bucket, app_id, duration "
+                f"FROM {table} WHERE day BETWEEN ? AND ?{only}", [lo.toordinal() - EPOCH, hi.toordinal() - EPOCH] + extra)
+
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    parts = [daily(first, last, "remote_usage")] if merged else []
+    if horizon is not None and first.toordinal() - EPOCH < horizon:
+        horizon = date.fromordinal(horizon + EPOCH)
+        parts.append(daily(first, min(last, horizon - timedelta(days=1)), "temp.archived_usage"))
+        first = horizon
+    if first > last:
+        return _union(parts or [daily(first, last)])
+    if granularity == "day":
+        return _union(parts + [daily(first, last)])
+
+    covered_until = last
+    if last >= date.today():
+        # nothing is ever recorded after today, so the period that is still
+        # running counts as complete once the range reaches today
+        period_end = _next_period(_period_start(date.today(), granularity), granularity) - timedelta(days=1)
+        covered_until = max(last, period_end)
+
+    full_first = _period_start(first, granularity)
+    if full_first < first:
+        full_first = _next_period(full_first, granularity)
+    full_last = _period_start(covered_until + timedelta(days=1), granularity)
+    # full_last is now the first period *not* covered
+
+    if full_first >= full_last:
+        return _union(parts + [daily(first, last)])
+
+    table, key = SUMMARIES[granularity]
+    parts.append((f"SELECT {key} AS bucket, app_id, duration FROM {table} WHERE {key} BETWEEN ? AND ?{only}",
+                  [_period_key(full_first, granularity), _period_key(full_last - timedelta(days=1), granularity)] + extra))
+    if first < full_first:
+        parts.append(daily(first, full_first - timedelta(days=1)))
+    if full_last <= last:
+        parts.append(daily(full_last, last))
+    return _union(parts)
+
+def _union(parts):
+    sql = " UNION ALL ".join(part for part, _ in parts)
+    params = [p for _, part_params in parts for p in part_params]
+    return sql, params
+
+# what range_query() can group by: (bucket, group id, duration) rows from
+# the (bucket, app_id, duration) source, and the names of the group ids.
+# Apps added without rules have no category yet and count as uncategorized
+GROUPS = {
+    "app": ("SELECT bucket, app_id AS group_id, duration FROM ({source})",
+            "SELECT id, name FROM apps"),
+    "category": ("""SELECT bucket, COALESCE(apps.category_id, 0) AS group_id, SUM(duration) AS duration
+                    FROM ({source}) r JOIN apps ON apps.id = r.app_id
+                    GROUP BY 1, 2""",
+                 f"SELECT id, name FROM categories UNION ALL SELECT 0, '{categories.UNCATEGORIZED}'"),
+}
+
+def range_query(start, end, granularity="day", top=6, horizon=None, merged=False, group="app"):
+    """The single query behind get_range_usage(), as (sql, params)."""
+    source, params = _range_source(start, end, granularity, horizon, merged)
+    grouped, names = GROUPS[group]
+    sql = f"""
+        WITH grouped AS ({grouped.format(source=source)}),
+        names AS ({names}),
+        ranked AS (
+            SELECT group_id, name,
+                   ROW_NUMBER() OVER (ORDER BY SUM(duration) DESC, name) AS rank
+            FROM grouped JOIN names ON names.id = grouped.group_id
+            GROUP BY group_id
+        )
+        SELECT bucket,
+               CASE WHEN rank <= ? THEN name ELSE 'Others' END AS app,
+               SUM(duration),
+               MIN(rank)
+        FROM grouped JOIN ranked USING (group_id)
+        GROUP BY bucket, app
+        ORDER BY bucket, MIN(rank)
+    """
+    return sql, params + [top]
+
+@metrics.timed(DB_SECONDS)
+def get_range_usage(start, end, granularity="day", top=6, merged=False, group="app"):
+    """
+    Usage for an ISO date range grouped by day, ISO week (Monday) or month.
+    Ranking and folding everything past the top N into "Others" happens in
+    SQL. Returns (series, totals, top_apps), totals biggest first. merged
+    includes what backend.merge brought in from other machines, with
+    group="category" the apps are summed up per category.
+    """
+    conn = _reader()
+    horizon = get_meta(conn, "archived_before")
+    if horizon is not None and day_number(start) < horizon:
+        _load_archive(conn)
+    else:
+        horizon = None
+    sql, params = range_query(start, end, granularity, top, horizon, merged, group)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+
+    label = BUCKET_LABEL[granularity]
+    series = {}
+    totals = {}
+    ranks = {}
+    for bucket, app, dur, rank in cur.fetchall():
+        bucket = label(bucket)
+        if bucket not in series:
+            series[bucket] = {}
+        series[bucket][app] = dur
+        totals[app] = totals.get(app, 0) + dur
+        ranks[app] = rank if app != "Others" else top + 1
+
+    order = sorted(totals, key=ranks.get)
+    top_apps = [app for app in order if app != "Others"]
+    return series, {app: totals[app] for app in order}, top_apps
+
+# how many buckets the rolling totals of get_app_history() add up, and the
+# distance between two bucket keys
+ROLLING = {
+    "day": (7, 1),
+    "week": (4, 7),
+    "month": (3, 1),
+}
+
+def app_history_query(app, start, end, granularity="day", horizon=None, merged=False):
+    """The query behind get_app_history(), as (sql, params)."""
+    source, params = _range_source(start, end, granularity, horizon, merged, app)
+    # summed up and ordered in Python, for a few hundred rows a GROUP BY and
+    # a window function cost more than the index read itself
+    return f"SELECT bucket, duration FROM ({source})", params
+
+@metrics.timed(DB_SECONDS)
+def get_app_history(name, start, end, granularity="day", merged=False):
+    """
+    One app's usage for start..end by day, ISO week or month, as
+    (series, rolling, total), or None for an app that was never recorded.
+    series holds the buckets the app was used in, rolling the total of the
+    ROLLING buckets up to each of them (the ones before start included).
+    Weeks and months are always whole, the first one may begin before start.
+    """
+    conn = _reader()
+    row = conn.execute("SELECT id FROM apps WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+
+    first = date.fromisoformat(start)
+    if granularity == "day":
+        warm = first - timedelta(days=ROLLING["day"][0] - 1)
+    else:
+        warm = _period_start(first, granularity)
+        for _ in range(ROLLING[granularity][0] - 1):
+            warm = _period_start(warm - timedelta(days=1), granularity)
+    horizon = get_meta(conn, "archived_before")
+    if horizon is not None and warm.toordinal() - EPOCH < horizon:
+        _load_archive(conn)
+    else:
+        horizon = None
+    sql, params = app_history_query(row[0], warm.isoformat(), end, granularity, horizon, merged)
+
+    # merged, archived and summary rows can share a bucket
+    buckets = {}
+    for bucket, dur in conn.execute(sql, params):
+        buckets[bucket] = buckets.get(bucket, 0) + dur
+
+    label = BUCKET_LABEL[granularity]
+    lo = day_number(start) if granularity == "day" else _period_key(_period_start(first, granularity), granularity)
+    window, step = ROLLING[granularity]
+    keys = sorted(buckets)
+    series, rolling = {}, {}
+    running = 0
+    oldest = 0
+    for bucket in keys:
+        dur = buckets[bucket]
+        running += dur
+        # by key distance, so buckets without usage count as zero
+        while keys[oldest] <= bucket - window * step:
+            running -= buckets[keys[oldest]]
+            oldest += 1
+        if bucket >= lo:
+            key = label(bucket)
+            series[key] = dur
+            rolling[key] = running
+    return series, rolling, sum(series.values())
+
+def _load_archive(conn):
+    """
+    Mirrors the archive files into a temp table of this read connection, so
+    range_query() can read archived days like daily_usage. Only reloaded
+    when maintenance has archived something since.
+    """
+    version = get_meta(conn, "archive_version", 0)
+    if getattr(_local, "archive_version", None) == version:
+        return
+    # the mirror is the one thing a reader writes, to its own temp database
+    conn.execute("PRAGMA query_only=0")
+    try:
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS archived_usage (
+                day INTEGER,
+                app_id INTEGER,
+                duration REAL,
+                PRIMARY KEY (day, app_id)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS temp.idx_archived_usage_app ON archived_usage(app_id, day, duration)")
+        conn.execute("DELETE FROM temp.archived_usage")
+        ids = dict(conn.execute("SELECT name, id FROM apps"))
+        conn.executemany("INSERT OR REPLACE INTO temp.archived_usage VALUES(?,?,?)",
+                         [(day_number(day), ids[app], dur) for day, app, dur in archive.read_days() if app in ids])
+        # ends the implicit transaction, or this connection would keep reading an old snapshot
+        conn.commit()
+    finally:
+        conn.execute("PRAGMA query_only=1")
+    _local.archive_version = version
+
 
 def add_today_usage(app_name, duration):
-    bulk_save_usage([(app_name, duration)])
\ No newline at end of file
+    bulk_save_usage([(app_name, duration)])
@@ -0,0 +1,89 @@
+import asyncio, json, threading, time
+
+# comment line sent when nothing happened for a while, keeps proxies and
+# the browser from dropping the stream and lets us notice dead clients
+KEEPALIVE = b": keepalive\n\n"
+
+
+class LiveHub:
+    """
+    Fans one serialized snapshot out to every connected event stream.
+    notify() can be called from any thread, it builds the SSE frame once and
+    each subscriber only gets a wake-up, so N tabs cost one json.dumps.
+    """
+
+    def __init__(self, snapshot, keepalive=15):
+        self.snapshot = snapshot
+        self.keepalive = keepalive
+        self.loop = None
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.version = 0
+        self.frame = None
+        self.serializations = 0
+
+    def notify(self):
+        if not self.clients:
+            # nothing to build a frame for, the first subscriber builds its own
+            return
+        self._build()
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def watch(self, version, interval=0.25):
+        """
+        For a tracker in another process: checks version() while someone is
+        listening and calls notify() when it moved. Reading the number is a
+        few bytes of shared memory, nothing is serialized unless it changed.
+        """
+        def loop():
+            seen = None
+            while True:
+                time.sleep(interval)
+                if not self.clients:
+                    continue
+                current = version()
+                if current != seen:
+                    seen = current
+                    self.notify()
+
+        threading.Thread(target=loop, name="live-watch", daemon=True).start()
+
+    def _build(self):
+        with self.lock:
+            self.version += 1
+            data = json.dumps(self.snapshot(), separators=(",", ":"))
+            self.frame = f"id: {self.version}\ndata: {data}\n\n".encode()
+            self.serializations += 1
+
+    def _wake(self):
+        for wakeup in self.clients:
+            # a client that has not picked up the last frame yet will just
+            # read the newest one, so a full queue is fine
+            if wakeup.empty():
+                wakeup.put_nowait(None)
+
+    async def stream(self, request):
+        self.loop = asyncio.get_running_loop()
+        first = not self.clients
+        wakeup = asyncio.Queue(maxsize=1)
+        self.clients.add(wakeup)
+        if self.frame is None or first:
+            # nobody was listening, so no frame was built for the last changes
+            self._build()
+        try:
+            sent = None
+            while True:
+                frame = self.frame
+                if frame is not sent:
+                    sent = frame
+                    yield frame
+                try:
+                    await asyncio.wait_for(wakeup.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield KEEPALIVE
+        finally:
+            self.clients.discard(wakeup)
@@ -0,0 +1,236 @@
+"""
+Keeps the history database small: prunes the session log, downsamples old
+weeks, moves old months to the archive files and vacuums. Runs on its own
+thread in the tracker (see TrackerDaemon) or from `python -m backend maintain`.
+
+Every change goes through the writer in small steps, so the tracker's own
+batches are never held up for long. Progress is kept in the meta table:
+
+  sessions_from      - first day that still has its session log
+  downsampled_before - Monday before which weeks only keep their top apps
+  archived_before    - first day of the first month still in SQLite
+"""
+import sqlite3, time
+from datetime import date, timedelta
+from backend import archive
+from backend.database import (
+    writer, connect, app_id, add_usage, get_meta, set_meta,
+    day_iso, week_number, month_number, month_first_day, EPOCH,
+)
+
+OTHERS = "Others"
+# session rows deleted per transaction
+PRUNE_BATCH = 5000
+# pages freed per incremental_vacuum call
+VACUUM_PAGES = 64
+
+
+def _call(fn):
+    """Runs fn(conn) in a writer transaction and returns what it returned."""
+    result = []
+    writer.write("call", lambda conn: result.append(fn(conn)))
+    return result[0] if result else None
+
+def _first_day():
+    """Oldest day number in daily_usage, and the downsampling progress."""
+    conn = connect()
+    try:
+        first = conn.execute("SELECT MIN(day) FROM daily_usage").fetchone()[0]
+        return first, get_meta(conn, "downsampled_before")
+    finally:
+        conn.close()
+
+def _cutoff(today, days):
+    # day number before which a step applies, None when it is turned off
+    if not days:
+        return None
+    return (today - timedelta(days=days)).toordinal() - EPOCH
+
+
+def prune_sessions(before, stop=None):
+    """Drops the session log of every day before the day number `before`."""
+    def prune(conn):
+        if (get_meta(conn, "sessions_from") or 0) < before:
+            set_meta(conn, "sessions_from", before)
+        cur = conn.execute("""
+            DELETE FROM sessions WHERE id IN (
+                SELECT id FROM sessions WHERE day < ? LIMIT ?
+            )
+        """, (before, PRUNE_BATCH))
+        return cur.rowcount
+
+    removed = 0
+    while not (stop and stop.is_set()):
+        count = _call(prune)
+        if count is None:
+            break
+        removed += count
+        if count < PRUNE_BATCH:
+            break
+    return removed
+
+
+def downsample_week(conn, week, top):
+    """
+    Keeps the top apps of one week day by day and folds the rest of each day
+    into "Others". Totals per day, week and month stay the same.
+    """
+    others = app_id(conn, OTHERS)
+    lo, hi = week, week + 6
+    keep = [others] + [app for (app,) in conn.execute("""
+        SELECT app_id FROM daily_usage
+        WHERE day BETWEEN ? AND ? AND app_id != ?
+        GROUP BY app_id ORDER BY SUM(duration) DESC LIMIT ?
+    """, (lo, hi, others, top))]
+    marks = ",".join("?" * len(keep))
+    rows = conn.execute(f"""
+        SELECT day, app_id, duration FROM daily_usage
+        WHERE day BETWEEN ? AND ? AND app_id NOT IN ({marks})
+    """, [lo, hi] + keep).fetchall()
+
+    deltas = {}
+    for day, app, dur in rows:
+        deltas[(day, app)] = -dur
+        deltas[(day, others)] = deltas.get((day, others), 0) + dur
+    add_usage(conn, deltas)
+    # what was moved is now zero, in the summaries up to rounding
+    for table, key, first, last in (
+        ("daily_usage", "day", lo, hi),
+        ("weekly_usage", "week", week, week),
+        ("monthly_usage", "month", month_number(lo), month_number(hi)),
+    ):
+        conn.execute(f"DELETE FROM {table} WHERE {key} BETWEEN ? AND ? AND abs(duration) < 1e-6",
+                     (first, last))
+    return len(rows)
+
+def downsample(before, top, stop=None):
+    """Downsamples every week that ends before the day number `before`, one week per transaction."""
+    first, done = _first_day()
+    if first is None:
+        return 0
+    week = week_number(max(first, done or first))
+    folded = 0
+    while week + 7 <= before and not (stop and stop.is_set()):
+        def step(conn, week=week):
+            count = downsample_week(conn, week, top)
+            set_meta(conn, "downsampled_before", week + 7)
+            return count
+        count = _call(step)
+        if count is None:
+            break
+        folded += count
+        week += 7
+    return folded
+
+
+def archive_month(conn, month):
+    """Moves one month out of SQLite into its archive file."""
+    lo, hi = month_first_day(month), month_first_day(month + 1) - 1
+    days = {}
+    for day, name, dur in conn.execute("""
+        SELECT day, name, duration
+        FROM daily_usage JOIN apps ON apps.id = app_id
+        WHERE day BETWEEN ? AND ?
+    """, (lo, hi)):
+        days.setdefault(day_iso(day), {})[name] = dur
+    if days:
+        # written first: if the transaction fails, archived_before still
+        # says these days live in SQLite, and a retry rewrites the same days
+        archive.write_days(days)
+
+    conn.execute("DELETE FROM daily_usage WHERE day BETWEEN ? AND ?", (lo, hi))
+    conn.execute("DELETE FROM sessions WHERE day BETWEEN ? AND ?", (lo, hi))
+    conn.execute("DELETE FROM monthly_usage WHERE month = ?", (month,))
+    # a week running into the next month is still read day by day from
+    # daily_usage, so only the weeks that are completely archived go
+    conn.execute("DELETE FROM weekly_usage WHERE week + 6 <= ?", (hi,))
+    set_meta(conn, "archived_before", hi + 1)
+    set_meta(conn, "archive_version", (get_meta(conn, "archive_version") or 0) + 1)
+    return len(days)
+
+def archive_months(before, stop=None):
+    """Archives every whole month before the day number `before`, one month per transaction."""
+    first, _ = _first_day()
+    if first is None:
+        return 0
+    month = month_number(first)
+    archived = 0
+    while month_first_day(month + 1) <= before and not (stop and stop.is_set()):
+        count = _call(lambda conn, month=month: archive_month(conn, month))
+        if count is None:
+            break
+        archived += count
+        month += 1
+    return archived
+
+
+def vacuum(step_ms=50, budget=5, convert=False):
+    """
+    Gives free pages back to the OS a few at a time, on a connection of its
+    own. Each pass holds the write lock for about step_ms; the whole run
+    stops after budget seconds and picks up where it left off next time.
+
+    Databases created before auto_vacuum=INCREMENTAL need one full VACUUM
+    to switch, which only happens with convert=True.
+    """
+    conn = connect()
+    try:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            if not convert:
+                return 0
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            print("[DB] Switched to incremental vacuum")
+            return 0
+
+        freed = 0
+        deadline = time.monotonic() + budget
+        pages = VACUUM_PAGES
+        while time.monotonic() < deadline:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                break
+            started = time.monotonic()
+            # executescript steps the pragma to the end, execute() would
+            # only free the first page
+            conn.executescript(f"PRAGMA incremental_vacuum({pages})")
+            freed += min(pages, free)
+            # size the next pass to the time box
+            took = (time.monotonic() - started) * 1000
+            if took > step_ms:
+                pages = max(8, pages // 2)
+            elif took < step_ms / 4:
+                pages *= 2
+            time.sleep(0.01)
+        return freed
+    except sqlite3.Error as e:
+        print(f"[DB ERROR] Vacuum failed: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def run_maintenance(settings, today=None, stop=None, convert=False):
+    """
+    One maintenance round with the settings from helper.read_retention().
+    Returns what was done, for logging.
+    """
+    today = today or date.today()
+    archive_before = _cutoff(today, settings.get("archive_days"))
+    if archive_before is not None:
+        # whole months only
+        archive_before = month_first_day(month_number(archive_before))
+    downsample_before = _cutoff(today, settings.get("downsample_days"))
+    sessions_before = _cutoff(today, settings.get("sessions_days"))
+
+    report = {}
+    if sessions_before is not None:
+        report["sessions_pruned"] = prune_sessions(sessions_before, stop)
+    if downsample_before is not None:
+        report["rows_downsampled"] = downsample(week_number(downsample_before), settings.get("downsample_top", 10), stop)
+    if archive_before is not None:
+        report["days_archived"] = archive_months(archive_before, stop)
+    if not (stop and stop.is_set()):
+        report["pages_freed"] = vacuum(settings.get("vacuum_step_ms", 50), convert=convert)
+    return report
@@ -0,0 +1,184 @@
+"""
+Combined totals across machines. Other WinTrack databases (screen_time.db
+copied from another workstation) or exports of them are merged into the
+remote_usage table, which range queries add in with merged=True.
+
+A database is ATTACHed read-only and aggregated in SQL. Each source keeps
+a high-water mark, the last session id read, so a repeat merge only
+re-reads the days that got new sessions since, and how many sessions it
+had up to there: fewer means some were deleted (Reset, or retention on
+that machine), which no new id shows, and the whole source is read again.
+Months its maintenance archived are read from the archive folder next to
+the database whenever that machine's archive changed. Exports are
+reloaded whenever the file changed.
+"""
+import sqlite3, time
+from pathlib import Path
+from shared.paths import DB_PATH
+from backend import transfer, archive
+from backend.database import get_meta, set_meta, day_iso, DAY_OF_ISO
+
+EXPORT_FORMATS = {".csv": "csv", ".ndjson": "ndjson"}
+
+
+def _connect():
+    # uri=True so the sources can be attached with mode=ro
+    conn = sqlite3.connect(DB_PATH.as_uri(), uri=True, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.isolation_level = None
+    return conn
+
+def _source(conn, path):
+    conn.execute("INSERT OR IGNORE INTO sources(path) VALUES(?)", (path,))
+    return conn.execute("SELECT id, high_water, downsampled_before, sessions, archive_version FROM sources WHERE path = ?",
+                        (path,)).fetchone()
+
+def _load_rows(conn, rows):
+    """Fills temp.merge_rows with (iso_date, app, seconds) and adds the apps."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS merge_rows (day TEXT, name TEXT, duration REAL)")
+    conn.execute("DELETE FROM temp.merge_rows")
+    conn.executemany("INSERT INTO temp.merge_rows VALUES(?,?,?)", rows)
+    conn.execute("INSERT OR IGNORE INTO apps(name) SELECT DISTINCT name FROM temp.merge_rows")
+
+def merge_database(conn, source, path, high_water, downsampled, sessions, archived):
+    """Brings one attached WinTrack database up to date, returns the number of days read."""
+    conn.execute("ATTACH DATABASE ? AS src", (Path(path).as_uri() + "?mode=ro",))
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA src.table_info(daily_usage)")}
+        if "app_id" not in columns:
+            raise ValueError("not a WinTrack database of this version (open it with WinTrack once)")
+        has_meta = conn.execute("SELECT 1 FROM src.sqlite_master WHERE name = 'meta'").fetchone()
+        meta = dict(conn.execute("""
+            SELECT key, value FROM src.meta
+            WHERE key IN ('downsampled_before', 'archived_before', 'archive_version')
+        """)) if has_meta else {}
+        new_downsampled = meta.get("downsampled_before")
+        archived_before = meta.get("archived_before")
+        archive_dir = Path(path).parent / "archive"
+        if archived_before is not None and not archive_dir.is_dir():
+            raise ValueError(f"its days before {day_iso(archived_before)} were archived to files, "
+                             f"copy its archive folder to {archive_dir} to merge them")
+
+        conn.execute("BEGIN IMMEDIATE")
+        new_high, new_sessions = conn.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM src.sessions").fetchone()
+        kept = conn.execute("SELECT COUNT(*) FROM src.sessions WHERE id <= ?", (high_water or 0,)).fetchone()[0]
+
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS merge_days (day INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.merge_days")
+        everything = not high_water or new_high < high_water or kept != sessions
+        if everything:
+            # first merge, the file was replaced or sessions were deleted:
+            # everything, the session log may be pruned already
+            conn.execute("DELETE FROM remote_usage WHERE source = ?", (source,))
+            conn.execute("INSERT INTO temp.merge_days SELECT DISTINCT day FROM src.daily_usage")
+        else:
+            conn.execute("INSERT OR IGNORE INTO temp.merge_days SELECT DISTINCT day FROM src.sessions WHERE id > ?",
+                         (high_water,))
+            if new_downsampled != downsampled:
+                # retention on that machine moved apps into "Others" without new sessions
+                conn.execute("INSERT OR IGNORE INTO temp.merge_days SELECT DISTINCT day FROM src.daily_usage WHERE day >= ? AND day < ?",
+                             (downsampled or -2**62, new_downsampled or 2**62))
+
+        conn.execute("INSERT OR IGNORE INTO main.apps(name) SELECT name FROM src.apps")
+        conn.execute("DELETE FROM remote_usage WHERE source = ? AND day IN temp.merge_days", (source,))
+        conn.execute("""
+            INSERT INTO remote_usage(day, source, app_id, duration)
+            SELECT d.day, ?, a.id, d.duration
+            FROM src.daily_usage d
+            JOIN src.apps s ON s.id = d.app_id
+            JOIN main.apps a ON a.name = s.name
+            WHERE d.day IN temp.merge_days
+        """, (source,))
+        days = conn.execute("SELECT COUNT(*) FROM temp.merge_days").fetchone()[0]
+
+        new_archived = meta.get("archive_version")
+        if archived_before is not None and (everything or new_archived != archived):
+            # the archived days are no longer in its daily_usage, whatever
+            # the files hold from there on is still in SQLite
+            horizon = day_iso(archived_before)
+            _load_rows(conn, ((day, app, seconds) for day, app, seconds in archive.read_days(archive_dir)
+                              if day < horizon))
+            conn.execute("DELETE FROM remote_usage WHERE source = ? AND day < ?", (source, archived_before))
+            conn.execute(f"""
+                INSERT OR REPLACE INTO remote_usage(day, source, app_id, duration)
+                SELECT {DAY_OF_ISO.format("r.day")}, ?, a.id, r.duration
+                FROM temp.merge_rows r JOIN apps a ON a.name = r.name
+            """, (source,))
+            days += conn.execute("SELECT COUNT(DISTINCT day) FROM temp.merge_rows").fetchone()[0]
+
+        conn.execute("""
+            UPDATE sources SET high_water = ?, downsampled_before = ?, sessions = ?, archive_version = ?, merged_at = ?
+            WHERE id = ?
+        """, (new_high, new_downsampled, new_sessions, new_archived, time.time(), source))
+        if days:
+            set_meta(conn, "merge_version", (get_meta(conn, "merge_version") or 0) + 1)
+        conn.execute("COMMIT")
+        return days
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("DETACH DATABASE src")
+
+def merge_export(conn, source, path, high_water, fmt):
+    """Replaces what an export file brought in before, if the file changed."""
+    stamp = Path(path).stat().st_mtime_ns
+    if stamp == high_water:
+        return 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            _load_rows(conn, transfer.decode(f, fmt))
+        conn.execute("DELETE FROM remote_usage WHERE source = ?", (source,))
+        conn.execute(f"""
+            INSERT OR REPLACE INTO remote_usage(day, source, app_id, duration)
+            SELECT {DAY_OF_ISO.format("r.day")}, ?, a.id, r.duration
+            FROM temp.merge_rows r JOIN apps a ON a.name = r.name
+        """, (source,))
+        days = conn.execute("SELECT COUNT(DISTINCT day) FROM temp.merge_rows").fetchone()[0]
+        conn.execute("UPDATE sources SET high_water = ?, merged_at = ? WHERE id = ?", (stamp, time.time(), source))
+        set_meta(conn, "merge_version", (get_meta(conn, "merge_version") or 0) + 1)
+        conn.execute("COMMIT")
+        return days
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def merge_sources(paths=None):
+    """
+    Merges the given databases / exports, or every source merged before.
+    Returns {path: days read or the error}.
+    """
+    conn = _connect()
+    report = {}
+    try:
+        if not paths:
+            paths = [path for (path,) in conn.execute("SELECT path FROM sources ORDER BY id")]
+        for path in paths:
+            path = str(Path(path).resolve())
+            try:
+                if Path(path) == DB_PATH.resolve():
+                    raise ValueError("this is the local database")
+                if not Path(path).is_file():
+                    raise ValueError("no such file")
+                source, high_water, *state = _source(conn, path)
+                fmt = EXPORT_FORMATS.get(Path(path).suffix.lower())
+                if fmt:
+                    report[path] = merge_export(conn, source, path, high_water, fmt)
+                else:
+                    report[path] = merge_database(conn, source, path, high_water, *state)
+            except (sqlite3.Error, ValueError, OSError) as e:
+                print(f"[MERGE ERROR] {path}: {e}")
+                report[path] = str(e)
+    finally:
+        conn.close()
+    return report
+
+def list_sources():
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT path, high_water, merged_at FROM sources ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    return [{"path": path, "high_water": high_water, "merged_at": merged_at} for path, high_water, merged_at in rows]
@@ -0,0 +1,83 @@
+"""
+Bulk history transfer, one row per day and app:
+
+    csv     date,app,seconds          (with that header line)
+    ndjson  {"date": ..., "app": ..., "seconds": ...} per line
+
+Used by /api/export, /api/import and `python -m backend export|import`.
+"""
+import csv, io, json, math
+from datetime import date
+from backend.database import export_usage, import_usage
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+CSV_HEADER = ["date", "app", "seconds"]
+# rows per chunk handed to the response
+CHUNK_ROWS = 1000
+
+
+def encode(rows, fmt):
+    """Yields (iso_date, app, seconds) rows as byte chunks of the given format."""
+    buf = io.StringIO()
+    if fmt == "csv":
+        out = csv.writer(buf, lineterminator="\n")
+        out.writerow(CSV_HEADER)
+        write = out.writerow
+    else:
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+        write = lambda row: buf.write(dumps({"date": row[0], "app": row[1], "seconds": row[2]}) + "\n")
+
+    count = 0
+    for row in rows:
+        write(row)
+        count += 1
+        if count == CHUNK_ROWS:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+            count = 0
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+def export_chunks(start, end, fmt):
+    """The whole export of an ISO date range, streamed straight from the cursor."""
+    return encode(export_usage(start, end), fmt)
+
+
+def _row(line, day, app, seconds):
+    try:
+        date.fromisoformat(day)
+        seconds = float(seconds)
+    except (TypeError, ValueError):
+        raise ValueError(f"line {line}: expected an ISO date and seconds, got {day!r}, {seconds!r}")
+    if not app:
+        raise ValueError(f"line {line}: app name is empty")
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"line {line}: seconds must be a finite number, 0 or more, got {seconds!r}")
+    return day, app, seconds
+
+def decode(lines, fmt, first_line=1):
+    """Yields (iso_date, app, seconds) from text lines, ValueError names the bad line."""
+    if fmt == "csv":
+        for line, row in enumerate(csv.reader(lines), first_line):
+            if not row or row == CSV_HEADER:
+                continue
+            if len(row) != 3:
+                raise ValueError(f"line {line}: expected 3 columns, got {len(row)}")
+            yield _row(line, *row)
+    else:
+        for line, text in enumerate(lines, first_line):
+            if not text.strip():
+                continue
+            try:
+                data = json.loads(text)
+                yield _row(line, data["date"], data["app"], data["seconds"])
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                raise ValueError(f"line {line}: {e}")
+
+def import_lines(lines, fmt, first_line=1):
+    """Imports text lines through import_usage(), returns the number of rows."""
+    return import_usage(decode(lines, fmt, first_line))
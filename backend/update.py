@@ -0,0 +1,108 @@
+"""
+Update check for /api/update. A background thread fetches the remote
+version file every few hours and keeps the answer in memory, so the
+endpoint never waits on the network. Requests are conditional
+(ETag / Last-Modified) and failures back off exponentially.
+
+WINTRACK_UPDATE_URL points the check somewhere else, e.g. a local
+stand-in server.
+"""
+import os, threading, time
+
+UPDATE_URL = os.getenv("WINTRACK_UPDATE_URL",
+                       "https://raw.githubusercontent.com/sr1k7nth/WinTrack/main/remote_version.json")
+# seconds between checks, and the retry delays after failures
+CHECK_INTERVAL = 6 * 3600
+RETRY_MIN = 60
+RETRY_MAX = 6 * 3600
+TIMEOUT = 5
+# the first check waits until the API has started serving
+STARTUP_DELAY = 5
+
+
+def version_tuple(v):
+    return tuple(map(int, v.split(".")))
+
+
+class UpdateChecker:
+    """
+    result is the /api/update answer as of the last check. It is replaced,
+    never changed, so readers just take the reference.
+    """
+
+    def __init__(self, current_version, url=UPDATE_URL, interval=CHECK_INTERVAL, session=None):
+        self.current_version = current_version
+        self.url = url
+        self.interval = interval
+        # requests is only imported by the first check, off the startup path
+        self.session = session
+        self.result = {
+            "update_available": False,
+            "current_version": current_version,
+            "latest_version": current_version,
+        }
+        self.etag = None
+        self.last_modified = None
+        self.failures = 0
+        self.checks = 0
+        self.not_modified = 0
+        self.checked_at = None
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="update-check", daemon=True)
+                self.thread.start()
+
+    def refresh(self):
+        """Checks again now instead of when the timer runs out."""
+        self.wakeup.set()
+
+    def check(self):
+        """One conditional request, returns the seconds until the next one."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        self.checks += 1
+
+        import requests
+        if self.session is None:
+            self.session = requests.Session()
+        try:
+            response = self.session.get(self.url, headers=headers, timeout=TIMEOUT)
+            if response.status_code == 304:
+                self.not_modified += 1
+            else:
+                response.raise_for_status()
+                latest = response.json().get("latest_version", self.current_version)
+                self.result = {
+                    "update_available": version_tuple(latest) > version_tuple(self.current_version),
+                    "current_version": self.current_version,
+                    "latest_version": latest,
+                }
+                self.etag = response.headers.get("ETag")
+                self.last_modified = response.headers.get("Last-Modified")
+        except (requests.RequestException, ValueError, AttributeError) as e:
+            # offline or a bad file: keep the last answer and retry later
+            self.failures += 1
+            delay = min(RETRY_MAX, RETRY_MIN * 2 ** (self.failures - 1))
+            if self.failures == 1:
+                print(f"[UPDATE] Check failed, retrying in {delay}s: {e}")
+            return delay
+
+        self.failures = 0
+        self.checked_at = time.time()
+        return self.interval
+
+    def _run(self):
+        self.wakeup.wait(STARTUP_DELAY)
+        self.wakeup.clear()
+        while True:
+            delay = self.check()
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
@@ -0,0 +1,173 @@
+"""
+Headless benchmark suite for the database and aggregation hot paths.
+Needs neither Win32 nor Qt, results go to a JSON file that can be compared
+with the one from another commit.
+
+    python -m benchmarks --years 3 --apps 2000 --out bench_results.json
+    python -m benchmarks --compare old.json --out new.json
+"""
+import os, asyncio, tempfile, argparse, json, platform, sqlite3, statistics, subprocess, time
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from starlette.requests import Request
+from backend import database, api
+from benchmarks.synthetic import generate_history, load_history
+from shared import memory
+
+
+def request():
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+def timed(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "n": repeat,
+        "mean_ms": statistics.mean(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[max(0, int(len(samples) * 0.95) - 1)],
+        "min_ms": samples[0],
+    }
+
+def bench_writes(args):
+    """Throughput of the two write paths on a fresh range of days."""
+    results = {}
+    future = date.today() + timedelta(days=400)
+    history = list(generate_history(years=0.1, apps=args.apps, seed=1, end=future))
+    rows = sum(len(usage) for _, usage in history)
+
+    start = time.perf_counter()
+    for day, usage in history:
+        database.bulk_save_usage(usage, day)
+    elapsed = time.perf_counter() - start
+    results["write.bulk_save_usage"] = {"n": len(history), "rows": rows, "rows_per_s": rows / elapsed,
+                                        "mean_ms": elapsed * 1000 / len(history)}
+
+    base = database.day_start(future.isoformat()) + 86400 * 30
+    batches = [[(base + b * 60 + i, base + b * 60 + i + 1, f"App{i:05d}", "") for i in range(50)] for b in range(200)]
+    start = time.perf_counter()
+    for batch in batches:
+        while not database.queue_sessions(batch):
+            database.writer.flush()
+    database.writer.flush()
+    elapsed = time.perf_counter() - start
+    results["write.queue_sessions"] = {"n": len(batches), "rows": 50 * len(batches),
+                                       "rows_per_s": 50 * len(batches) / elapsed,
+                                       "mean_ms": elapsed * 1000 / len(batches)}
+    return results
+
+def bench_reads(args):
+    today = date.today()
+    year_ago = (today - timedelta(days=364)).isoformat()
+    everything = (today - timedelta(days=int(args.years * 365))).isoformat()
+    scenarios = {
+        "read.get_today_data": lambda: database.get_today_data(),
+        "read.get_weekly_usage": database.get_weekly_usage,
+        "read.get_monthly_usage": database.get_monthly_usage,
+    }
+    for granularity in database.GRANULARITIES:
+        scenarios[f"read.get_range_usage.year.{granularity}"] = \
+            lambda g=granularity: database.get_range_usage(year_ago, today.isoformat(), g)
+        scenarios[f"read.get_range_usage.all.{granularity}"] = \
+            lambda g=granularity: database.get_range_usage(everything, today.isoformat(), g)
+    return {name: timed(fn, args.repeat) for name, fn in scenarios.items()}
+
+def bench_api(args):
+    # a busy day in the live stats for the daily handlers
+    memory.publish(dict(generate_history(years=1 / 365, apps=args.apps, per_day=300).__next__()[1]),
+                   "App00000", time.time() - 60)
+    stats = memory.current.totals
+
+    today = date.today()
+    year_ago = (today - timedelta(days=364)).isoformat()
+    clear = api.history_cache.clear
+    # the handlers are coroutines, run each one to completion on one loop
+    loop = asyncio.new_event_loop()
+    run = lambda call: lambda: loop.run_until_complete(call())
+    scenarios = {
+        "api.format_top_apps": (lambda: api.format_top_apps(stats), None),
+        "api.get_stats": (run(api.get_stats), None),
+        "api.daily_snapshot": (api.daily_snapshot, None),
+        "api.weekly_stats.cold": (run(lambda: api.weekly_stats(request())), clear),
+        "api.weekly_stats.cached": (run(lambda: api.weekly_stats(request())), None),
+        "api.monthly_stats.cold": (run(lambda: api.monthly_stats(request())), clear),
+        "api.monthly_stats.cached": (run(lambda: api.monthly_stats(request())), None),
+        "api.range_endpoint.year.week.cold": (run(lambda: api.range_endpoint(request(), year_ago, None, "week", 6)), clear),
+    }
+    try:
+        return {name: timed(fn, args.repeat, setup) for name, (fn, setup) in scenarios.items()}
+    finally:
+        loop.close()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def compare(old, new):
+    print(f"\n{'scenario':<40} {'old':>10} {'new':>10} {'change':>8}")
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if not before or "mean_ms" not in before:
+            continue
+        change = (result["mean_ms"] - before["mean_ms"]) / before["mean_ms"] * 100
+        print(f"{name:<40} {before['mean_ms']:9.3f}ms {result['mean_ms']:9.3f}ms {change:+7.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--years", type=float, default=2, help="years of synthetic history")
+    parser.add_argument("--apps", type=int, default=1000, help="distinct app names")
+    parser.add_argument("--per-day", type=int, default=25, help="app draws per day")
+    parser.add_argument("--skew", type=float, default=1.1, help="long-tail exponent, higher = fewer popular apps")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    start = time.perf_counter()
+    rows = load_history(database, years=args.years, apps=args.apps, per_day=args.per_day, skew=args.skew)
+    load_s = time.perf_counter() - start
+
+    results = {}
+    results.update(bench_writes(args))
+    results.update(bench_reads(args))
+    results.update(bench_api(args))
+    database.close_db()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "params": vars(args),
+            "history_rows": rows,
+            "history_load_s": load_s,
+            "db_bytes": os.path.getsize(database.DB_PATH),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:<40} {result['mean_ms']:9.3f} ms")
+    print(f"\n{rows} history rows, written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
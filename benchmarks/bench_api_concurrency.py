@@ -0,0 +1,104 @@
+"""
+/api/daily latency while range scans run in parallel. A few clients keep
+requesting /api/range over multi-year history with a different start each
+time (so the response cache never answers), while a probe polls
+/api/daily. p99 of the probe should stay close to its idle value. Server,
+scanners and probe are separate processes, so the clients do not compete
+with the server (or the probe) for a GIL.
+
+    python -m benchmarks.bench_api_concurrency [scanners] [seconds] [years]
+"""
+import os, sys, tempfile, time, statistics, socket, subprocess, multiprocessing
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+import httpx
+from backend import database
+from benchmarks.synthetic import load_history
+
+PROBE_INTERVAL = 0.05
+SERVER = """
+import sys, time, uvicorn
+from shared import memory
+from backend.api import app
+memory.publish({f"app{i}.exe": float(i) for i in range(40)}, "app1.exe", time.time())
+uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def probe(base, seconds):
+    samples = []
+    with httpx.Client(base_url=base) as client:
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            t = time.perf_counter()
+            client.get("/api/daily").raise_for_status()
+            samples.append((time.perf_counter() - t) * 1000)
+            time.sleep(PROBE_INTERVAL)
+    return samples
+
+def scan(base, stop, offset, span, count):
+    today = date.today()
+    with httpx.Client(base_url=base, timeout=60) as client:
+        i = offset
+        while not stop.is_set():
+            # a new start every request, so each one is a cache miss
+            start = (today - timedelta(days=span - i % 365)).isoformat()
+            client.get("/api/range", params={"start": start, "granularity": "day", "top": 10}).raise_for_status()
+            with count.get_lock():
+                count.value += 1
+            i += 1
+
+def report(label, samples):
+    print(f"{label:<22} n={len(samples):4d}  p50 {statistics.median(samples):6.2f} ms  "
+          f"p99 {percentile(samples, 0.99):6.2f} ms  max {max(samples):6.2f} ms")
+
+def main(scanners=8, seconds=10, years=3):
+    database.init_db()
+    load_history(database, years=years, apps=500)
+    database.close_db()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-c", SERVER, str(port)])
+    base = f"http://127.0.0.1:{port}"
+    while True:
+        try:
+            httpx.get(base + "/api/status")
+            break
+        except httpx.TransportError:
+            time.sleep(0.05)
+
+    idle = probe(base, seconds / 2)
+    stop, count = multiprocessing.Event(), multiprocessing.Value("i", 0)
+    workers = [multiprocessing.Process(target=scan, args=(base, stop, i * 45, int(years * 365), count))
+               for i in range(scanners)]
+    for worker in workers:
+        worker.start()
+    time.sleep(1)
+    started = count.value
+    loaded = probe(base, seconds)
+    scans = count.value - started
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    report("/api/daily idle", idle)
+    report(f"/api/daily {scanners} scanners", loaded)
+    print(f"/api/range {scans / seconds:.1f} scans/s over {int(years * 365)} days")
+    server.terminate()
+    server.wait()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:4]))
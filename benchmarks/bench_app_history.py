@@ -0,0 +1,116 @@
+"""
+One app's history (/api/app/{name}/history) on multi-year synthetic data
+with thousands of apps. Checks that the day tables are read through their
+covering (app_id, day, duration) index and the summaries through their
+(app_id, week/month) index, never scanned, that the numbers agree with
+/api/range, then reports latency for popular and rare apps: the index read
+alone and the whole get_app_history() (series, rolling totals, labels),
+with the indexes and with them dropped (what the primary keys alone give).
+
+    python -m benchmarks.bench_app_history [years] [apps] [per_day]
+"""
+import os, sys, re, tempfile, time, statistics
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from benchmarks.synthetic import load_history, app_names
+
+INDEXES = ["idx_daily_usage_app", "idx_weekly_usage_app", "idx_monthly_usage_app", "idx_remote_usage_app"]
+
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+def median_ms(fn, repeat=50):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def plan(start, end, granularity, merged):
+    conn = database._reader()
+    app = conn.execute("SELECT id FROM apps LIMIT 1").fetchone()[0]
+    sql, params = database.app_history_query(app, start, end, granularity, None, merged)
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def lookups(names, start, end):
+    """{(granularity, label): (index read ms, get_app_history ms, buckets)}"""
+    conn = database._reader()
+    results = {}
+    for granularity in database.GRANULARITIES:
+        for label, name in names.items():
+            app = conn.execute("SELECT id FROM apps WHERE name = ?", (name,)).fetchone()[0]
+            sql, params = database.app_history_query(app, start, end, granularity)
+            read = median_ms(lambda: conn.execute(sql, params).fetchall())
+            full = median_ms(lambda: database.get_app_history(name, start, end, granularity))
+            results[(granularity, label)] = (read, full, len(database.get_app_history(name, start, end, granularity)[0]))
+    return results
+
+def main(years=3, apps=5000, per_day=150):
+    database.init_db()
+    started = time.perf_counter()
+    rows = load_history(database, years=years, apps=apps, per_day=per_day)
+    print(f"{rows} daily rows, {apps} apps, {years} years, loaded in {time.perf_counter() - started:.1f}s")
+
+    today = date.today()
+    start, end = (today - timedelta(days=int(years * 365) - 1)).isoformat(), today.isoformat()
+    names = app_names(apps)
+    picks = {"popular": names[0], "mid": names[50], "rare": names[apps - 1]}
+
+    results = []
+    for granularity in database.GRANULARITIES:
+        steps = plan(start, end, granularity, merged=True)
+        scans = [step for step in steps if re.match(r"(SCAN|SEARCH) \w*usage", step)]
+        covering = all("USING COVERING INDEX idx_" in step for step in scans
+                       if step.startswith(("SEARCH daily_usage", "SEARCH remote_usage")))
+        results.append(check(f"{granularity:<5} plan only searches the per-app indexes",
+                             scans and covering and all("USING" in step and "INDEX idx_" in step
+                                                        and "(app_id=?" in step for step in scans)))
+        if not results[-1]:
+            print("\n".join("     " + step for step in steps))
+
+    year_ago = (today - timedelta(days=364)).isoformat()
+    for granularity in database.GRANULARITIES:
+        _, totals, _ = database.get_range_usage(year_ago, end, granularity, top=50)
+        series, _, _ = database.get_app_history(picks["popular"], year_ago, end, "day")
+        results.append(check(f"{granularity:<5} total agrees with /api/range",
+                             abs(totals[picks["popular"]] - sum(series.values())) < 1e-6))
+    series, rolling, _ = database.get_app_history(picks["popular"], year_ago, end, "day")
+    day = max(series)
+    week = [(date.fromisoformat(day) - timedelta(days=i)).isoformat() for i in range(7)]
+    results.append(check("rolling total is the last 7 days", abs(rolling[day] - sum(series.get(d, 0) for d in week)) < 1e-6))
+    results.append(check("unknown app is None", database.get_app_history("NoSuchApp", start, end) is None))
+
+    indexed = lookups(picks, start, end)
+    default_year = median_ms(lambda: database.get_app_history(picks["popular"], year_ago, end))
+    # the same queries on the primary keys alone
+    conn = database.connect(database.DB_PATH)
+    for index in INDEXES:
+        conn.execute(f"DROP INDEX {index}")
+    conn.commit()
+    conn.close()
+    scanned = lookups(picks, start, end)
+    database.close_db()
+
+    print(f"\n{'':<18}{'buckets':>8}{'per-app index: read / total':>32}{'primary key only: read / total':>34}")
+    for (granularity, label), (read, full, buckets) in indexed.items():
+        old_read, old_full, _ = scanned[(granularity, label)]
+        print(f"{granularity:<6}{label:<12}{buckets:8d}{read:19.3f} / {full:6.3f} ms{old_read:21.3f} / {old_full:6.3f} ms")
+    worst = max(full for (granularity, _), (_, full, _) in indexed.items() if granularity != "day")
+    results.append(check(f"weeks and months of all history: slowest lookup {worst:.3f} ms, under 1 ms", worst < 1))
+    worst = max(read for read, _, _ in indexed.values())
+    results.append(check(f"index read of any lookup {worst:.3f} ms, under 1 ms", worst < 1))
+    print(f"the endpoint's default (a year by day) for the most used app: {default_year:.3f} ms")
+
+    print("OK" if all(results) else "FAILED")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:4])))
@@ -0,0 +1,107 @@
+"""
+Dashboard asset serving on a synthetic Vite build: the previous
+StaticFiles mount + FileResponse fallback against the in-memory
+AssetManifest. Reports time per request, bytes on the wire, files opened
+per request (through an audit hook) and checks the caching headers.
+
+    python -m benchmarks.bench_assets [requests]
+"""
+import sys, random, tempfile, time
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.testclient import TestClient
+from backend.assets import AssetManifest
+
+opened = []
+sys.addaudithook(lambda event, args: opened.append(args[0]) if event == "open" else None)
+
+
+def make_dist(root):
+    rng = random.Random(7)
+    words = ["const", "function", "return", "useState", "props", "chart", "=>", "{", "}", "data"]
+    (root / "assets").mkdir(parents=True)
+    (root / "index.html").write_text(
+        '<!doctype html><html><head><script type="module" src="/assets/index-B2x9kQa1.js"></script>'
+        '<link rel="stylesheet" href="/assets/index-Cq81mZ0e.css"></head><body><div id="root"></div></body></html>')
+    (root / "assets" / "index-B2x9kQa1.js").write_text(" ".join(rng.choice(words) for _ in range(120000)))
+    (root / "assets" / "index-Cq81mZ0e.css").write_text(
+        "".join(f".c{i}{{color:#{rng.randrange(1 << 24):06x};margin:{i % 9}px}}" for i in range(3000)))
+    (root / "favicon.svg").write_text('<svg xmlns="http://www.w3.org/2000/svg"><circle r="8"/></svg>')
+    (root / "assets" / "logo-D4e5F6g7.png").write_bytes(bytes(rng.randrange(256) for _ in range(20000)))
+
+def old_app(dist):
+    app = FastAPI()
+    app.mount("/assets", StaticFiles(directory=dist / "assets"), name="assets")
+
+    @app.get("/{full_path:path}")
+    def serve_spa(full_path: str):
+        file_path = dist / full_path
+        if file_path.exists() and file_path.is_file():
+            return FileResponse(file_path)
+        return FileResponse(dist / "index.html")
+    return app
+
+def new_app(dist):
+    app = FastAPI()
+    spa = AssetManifest(dist)
+
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+    async def serve_spa(request: Request, full_path: str):
+        return spa.respond(request, full_path)
+    return app, spa
+
+def measure(client, paths, n):
+    headers = {"Accept-Encoding": "gzip, deflate"}
+    wire, opens = 0, len(opened)
+    start = time.perf_counter()
+    for i in range(n):
+        response = client.get(paths[i % len(paths)], headers=headers)
+        wire += len(response.content) if response.headers.get("content-encoding") != "gzip" \
+            else int(response.headers["content-length"])
+    elapsed = time.perf_counter() - start
+    return elapsed / n * 1000, wire / n, (len(opened) - opens) / n
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+def main(n=400):
+    dist = Path(tempfile.mkdtemp()) / "dist"
+    make_dist(dist)
+    paths = ["/", "/weekly", "/assets/index-B2x9kQa1.js", "/assets/index-Cq81mZ0e.css", "/favicon.svg"]
+
+    start = time.perf_counter()
+    app, spa = new_app(dist)
+    plain, packed = spa.size()
+    print(f"manifest: {len(spa.files)} files in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{plain / 1024:.0f} KiB plain + {packed / 1024:.0f} KiB gzip in memory")
+
+    for label, client in (("StaticFiles/FileResponse", TestClient(old_app(dist))), ("AssetManifest", TestClient(app))):
+        per_request, per_wire, per_open = measure(client, paths, n)
+        print(f"{label:<26} {per_request:6.2f} ms/request  {per_wire / 1024:7.1f} KiB/request  {per_open:.1f} files opened/request")
+
+    client = TestClient(app)
+    results = []
+    js = client.get("/assets/index-B2x9kQa1.js", headers={"Accept-Encoding": "gzip"})
+    results.append(check("hashed asset is immutable and gzipped",
+                         "immutable" in js.headers["cache-control"] and js.headers.get("content-encoding") == "gzip"))
+    index = client.get("/", headers={"Accept-Encoding": "identity"})
+    results.append(check("index.html revalidates", index.headers["cache-control"] == "no-cache"
+                         and "content-encoding" not in index.headers))
+    again = client.get("/some/route", headers={"If-None-Match": index.headers["etag"]})
+    results.append(check("client routes get index.html, 304 on a matching ETag", again.status_code == 304))
+    results.append(check("gzip;q=0 is honoured", "content-encoding" not in client.get(
+        "/assets/index-Cq81mZ0e.css", headers={"Accept-Encoding": "gzip;q=0"}).headers))
+    results.append(check("missing asset is a 404", client.get("/assets/gone-12345678.js").status_code == 404))
+    results.append(check("png is not compressed", "content-encoding" not in client.get(
+        "/assets/logo-D4e5F6g7.png", headers={"Accept-Encoding": "gzip"}).headers))
+
+    print("OK" if all(results) else "FAILED")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:2])))
@@ -0,0 +1,138 @@
+"""
+App categories: the compiled RuleSet against checking rule by rule, for a
+few hundred rules, and what a memoized lookup costs per tick. Then checks
+the matching rules (first match wins, exact / glob / regex, titles only
+for UWP apps), that /api/range grouped by category adds up to the same
+total as grouped by app, and that changing the rules reclassifies history.
+
+    python -m benchmarks.bench_categories [rules] [lookups]
+"""
+import os, sys, fnmatch, re, tempfile, time
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database, categories
+from benchmarks.synthetic import load_history, app_names
+
+
+def naive_classify(rules, proc, title):
+    """The obvious loop, one pattern at a time."""
+    def matches(pattern, value):
+        if pattern.startswith("re:"):
+            return re.fullmatch(pattern[3:], value, re.IGNORECASE) is not None
+        return fnmatch.fnmatch(value.lower(), pattern.lower())
+
+    for rule in rules:
+        ok = True
+        for field, value in (("proc", proc), ("title", title or "")):
+            patterns = rule.get(field)
+            if patterns is None:
+                continue
+            patterns = [patterns] if isinstance(patterns, str) else patterns
+            ok = ok and any(matches(p, value) for p in patterns)
+        if ok:
+            return rule["category"]
+    return None
+
+def make_rules(n):
+    rules = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            rules.append({"category": f"Cat{i % 40}", "proc": [f"tool{i}.exe", f"tool{i}-helper.exe"]})
+        elif kind == 1:
+            rules.append({"category": f"Cat{i % 40}", "proc": f"suite{i}-*.exe"})
+        else:
+            rules.append({"category": f"Cat{i % 40}", "proc": "applicationframehost.exe",
+                          "title": f"re:.*(Store{i}|Player{i}).*"})
+    return rules
+
+def per_call(fn, keys):
+    start = time.perf_counter()
+    for proc, title in keys:
+        fn(proc, title)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+def main(rule_count=300, lookups=20000):
+    rules = make_rules(rule_count)
+    start = time.perf_counter()
+    ruleset = categories.RuleSet(rules)
+    print(f"{rule_count} rules compiled in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # distinct (proc, title) pairs, most of them match nothing (the worst case)
+    keys = [(f"app{i}.exe", None) for i in range(lookups // 2)] + \
+           [(f"suite{i * 3 + 1}-x.exe", None) for i in range(lookups // 4)] + \
+           [("ApplicationFrameHost.exe", f"Player{i * 3 + 2} - movie") for i in range(lookups // 4)]
+    naive = per_call(lambda p, t: naive_classify(rules, p, t), keys[:2000])
+    compiled = per_call(lambda p, t: categories.RuleSet.classify(ruleset, p, t), keys)
+    hit = per_call(ruleset.classify, keys[:4000])
+    hit = per_call(ruleset.classify, keys[:4000])
+    print(f"rule by rule     {naive:9.2f} µs/lookup")
+    print(f"combined regex   {compiled:9.2f} µs/lookup (first sight of a pair)")
+    print(f"memoized         {hit:9.2f} µs/lookup (every tick after that)")
+
+    results = []
+    results.append(check("compiled and naive agree",
+                         all(ruleset.classify(p, t) == naive_classify(rules, p, t) for p, t in keys[::50])))
+    demo = categories.RuleSet([
+        {"category": "Video", "proc": "applicationframehost.exe", "title": "re:.*(netflix|youtube).*"},
+        {"category": "Browsers", "proc": ["chrome.exe", "firefox.exe"]},
+        {"category": "Tools", "proc": "*.exe"},
+        {"category": "Never", "proc": "chrome.exe"},
+    ])
+    results.append(check("exact names ignore case", demo.classify("Chrome.EXE") == "Browsers"))
+    results.append(check("first matching rule wins", demo.classify("chrome.exe") == "Browsers"))
+    results.append(check("globs match the whole name", demo.classify("code.exe") == "Tools"
+                         and demo.classify("code.exe.bak") is None))
+    results.append(check("title regexes", demo.classify("ApplicationFrameHost.exe", "Netflix") == "Video"
+                         and demo.classify("ApplicationFrameHost.exe", "Calculator") == "Tools"))
+    for bad in ([{"proc": "x.exe"}], [{"category": "X"}], [{"category": "X", "proc": "re:("}], {"category": "X"}):
+        try:
+            categories.RuleSet(bad)
+            results.append(check(f"rejects {bad}", False))
+        except ValueError:
+            pass
+
+    database.init_db()
+    load_history(database, years=1, apps=300)
+    names = app_names(300)
+    database.apply_categories([{"category": "Even", "proc": [f"{n.lower()}.exe" for n in names[::2]]}])
+    database.queue_apps([(names[1], "ApplicationFrameHost.exe", "Netflix")])
+    database.writer.flush()
+
+    today = date.today()
+    start, end = (today - timedelta(days=364)).isoformat(), today.isoformat()
+    _, by_app, _ = database.get_range_usage(start, end, "month", top=50)
+    _, by_category, top = database.get_range_usage(start, end, "month", top=50, group="category")
+    results.append(check("category totals add up to the app totals",
+                         abs(sum(by_app.values()) - sum(by_category.values())) < 1e-6 and set(top) == {"Even", "Uncategorized"}))
+    even = database.get_categories()["Even"]
+    results.append(check("apps classified by name until their exe is known", even == 150))
+
+    database.apply_categories([{"category": "Even", "proc": [f"{n.lower()}.exe" for n in names[::2]]},
+                               {"category": "Video", "proc": "applicationframehost.exe", "title": "re:.*netflix.*"}])
+    database.writer.flush()
+    _, by_category, _ = database.get_range_usage(start, end, "month", top=50, group="category")
+    results.append(check("a rule change reclassifies history", "Video" in by_category
+                         and abs(sum(by_app.values()) - sum(by_category.values())) < 1e-6))
+
+    repeat = 20
+    for group in database.GROUPS:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            database.get_range_usage(start, end, "day", top=10, group=group)
+        print(f"year by day, grouped by {group:<9} {(time.perf_counter() - started) / repeat * 1000:7.2f} ms")
+    database.close_db()
+
+    print("OK" if all(results) else "FAILED")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:3])))
@@ -0,0 +1,69 @@
+"""
+Rows written per hour by TrackerWorker under the old fixed 30 s sync and
+the adaptive flush policy, on the same scripted traces. Also checks that
+both policies end up with the same totals in the database.
+
+    python -m benchmarks.bench_flush [hours] [seed]
+"""
+import os, sys, tempfile, time
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from benchmarks.bench_sources import make_trace, APPS
+from st_tracker.sources import ScriptedSource, Foreground
+from st_tracker.worker import TrackerWorker
+
+POLICIES = {
+    # what perform_sync did before: every 30 s, whatever happened
+    "timer-30s": dict(max_staleness=30, flush_on_change=False),
+    "adaptive": dict(),
+}
+
+
+def focused_trace(hours=8, start=None):
+    # long stretches in one app, where the timer mostly rewrote the same row
+    ts = start
+    events = []
+    for i in range(hours):
+        events.append(Foreground(ts + i * 3600, "", APPS[i % 2]))
+    events.append(Foreground(ts + hours * 3600, "", APPS[2]))
+    return events
+
+def run(events, policy):
+    source = ScriptedSource(events)
+    worker = TrackerWorker(60, source=source)
+    for name, value in policy.items():
+        setattr(worker, name, value)
+    worker.run()
+    database.writer.flush()
+    return worker.sync_stats()
+
+def main(hours=8, seed=1):
+    database.init_db()
+    # the virtual clock produces hours of batches in milliseconds, don't let
+    # a full queue merge them and hide what each policy writes
+    database.writer.queue.maxsize = 0
+    day = 0
+    for trace_name, trace in (("busy", lambda start: make_trace(hours, seed, start)),
+                              ("focused", lambda start: focused_trace(hours, start))):
+        totals = []
+        for policy_name, policy in POLICIES.items():
+            # each run gets its own day so they don't share totals
+            start = time.mktime((2024, 3, 4 + day, 9, 0, 0, 0, 0, -1))
+            stats = run(trace(start), policy)
+            totals.append(database.get_today_data(time.strftime("%Y-%m-%d", time.localtime(start))))
+            day += 1
+            print(f"{trace_name:<8} {policy_name:<10} rows/h {stats['rows_per_hour']:8.1f}   "
+                  f"flushes/h {stats['flushes_per_hour']:7.1f}   "
+                  f"session rows {stats['session_rows']:5d}   usage rows {stats['usage_rows']:5d}")
+
+        same = all(t.keys() == totals[0].keys() and
+                   all(abs(t[k] - totals[0][k]) < 1e-6 for k in t) for t in totals)
+        print(f"{trace_name:<8} totals identical across policies: {same}")
+    database.close_db()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
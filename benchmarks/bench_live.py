@@ -0,0 +1,71 @@
+"""
+Serialization work behind /api/live with N subscribers: every published
+change should be encoded once no matter how many tabs are connected, and
+not at all while none are.
+
+    python -m benchmarks.bench_live [subscribers] [changes]
+"""
+import os, sys, tempfile, time, threading, asyncio
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+import httpx, uvicorn
+from shared import memory
+from backend.api import app, live_hub
+
+PORT = 7791
+
+
+async def subscribe(url, frames, stop):
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream("GET", url) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    frames.append(line)
+                if stop.is_set():
+                    break
+
+async def run(subscribers, changes):
+    url = f"http://127.0.0.1:{PORT}/api/live"
+    stop = asyncio.Event()
+    frames = [[] for _ in range(subscribers)]
+    tasks = [asyncio.create_task(subscribe(url, f, stop)) for f in frames]
+    while len(live_hub.clients) < subscribers:
+        await asyncio.sleep(0.01)
+
+    before = live_hub.serializations
+    start = time.perf_counter()
+    for i in range(changes):
+        # the worker thread publishes, not the event loop
+        await asyncio.to_thread(memory.publish, {"Code": float(i), "Chrome": 1.0}, "Code", time.time())
+        await asyncio.sleep(0.005)
+    while min(len(f) for f in frames) < changes + 1:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    memory.publish({}, None, None)
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(0.1)
+    serialized = live_hub.serializations - before - 1
+    # with nobody listening a change costs nothing
+    before = live_hub.serializations
+    await asyncio.to_thread(memory.publish, {"Code": 1.0}, "Code", time.time())
+    return serialized, elapsed, len(live_hub.clients), live_hub.serializations - before
+
+def main(subscribers=50, changes=20):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    serialized, elapsed, left, idle = asyncio.run(run(subscribers, changes))
+    print(f"{subscribers} subscribers, {changes} changes: {serialized} serializations "
+          f"({serialized / changes:.2f} per change), {elapsed * 1000:.0f} ms, "
+          f"{left} clients left after disconnect, {idle} serializations for a change with none")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
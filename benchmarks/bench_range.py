@@ -0,0 +1,51 @@
+"""
+/api/range latency on multi-year synthetic history, plus a check that the
+query plan only does index range scans on the usage tables: any full scan
+of daily/weekly/monthly_usage fails the run.
+
+    python -m benchmarks.bench_range [years] [apps]
+"""
+import os, sys, tempfile, time, statistics
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from benchmarks.synthetic import load_history
+
+
+def full_scans(sql, params):
+    plan = database.connect().execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    tables = ("daily_usage", "weekly_usage", "monthly_usage")
+    return [row[3] for row in plan if row[3].startswith("SCAN") and row[3].split()[1] in tables]
+
+def main(years=3, apps=500):
+    database.init_db()
+    load_history(database, years=years, apps=apps)
+    today = date.today()
+
+    scanned = []
+    for days in (7, 31, 365, int(years * 365)):
+        start = (today - timedelta(days=days - 1)).isoformat()
+        for granularity in database.GRANULARITIES:
+            scans = full_scans(*database.range_query(start, today.isoformat(), granularity))
+            samples = []
+            for _ in range(20):
+                t = time.perf_counter()
+                database.get_range_usage(start, today.isoformat(), granularity)
+                samples.append((time.perf_counter() - t) * 1000)
+            print(f"{days:5d} days  {granularity:<5}  median {statistics.median(samples):7.2f} ms  "
+                  f"plan {'FULL SCAN ' + '; '.join(scans) if scans else 'index range scans only'}")
+            if scans:
+                scanned.append((days, granularity))
+    database.close_db()
+
+    for days, granularity in scanned:
+        print(f"FAIL {days} days by {granularity} scans a whole usage table")
+    print("OK" if not scanned else "FAILED")
+    return 1 if scanned else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:3])))
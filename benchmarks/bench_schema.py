@@ -0,0 +1,114 @@
+"""
+Old TEXT layout (ISO date and app name in every row) against the app id /
+day number layout on the same multi-year synthetic history: file size,
+the weekly/monthly range scans, and how long init_db() takes to migrate.
+
+    python -m benchmarks.bench_schema [years] [apps]
+"""
+import os, sys, tempfile, shutil, sqlite3, statistics, time
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from benchmarks.synthetic import load_history
+
+TEXT_LAYOUT = """
+    CREATE TABLE daily_usage (date TEXT, app_name TEXT, duration REAL, PRIMARY KEY (date, app_name));
+    CREATE TABLE sessions (id INTEGER PRIMARY KEY, date TEXT, start_ts REAL, end_ts REAL, app_name TEXT, title TEXT);
+    CREATE INDEX idx_sessions_date ON sessions(date);
+    CREATE TABLE weekly_usage (week_start TEXT, app_name TEXT, duration REAL, PRIMARY KEY (week_start, app_name));
+    CREATE TABLE monthly_usage (month TEXT, app_name TEXT, duration REAL, PRIMARY KEY (month, app_name));
+"""
+
+# the same questions asked of each layout: (text sql, id sql, days back, weekly keys)
+SCANS = {
+    "weekly (7 days by day)": (
+        "SELECT date, app_name, duration FROM daily_usage WHERE date BETWEEN ? AND ? ORDER BY date",
+        "SELECT day, name, duration FROM daily_usage JOIN apps ON apps.id = app_id WHERE day BETWEEN ? AND ? ORDER BY day",
+        7, False),
+    "monthly (31 days by day)": (
+        "SELECT date, app_name, duration FROM daily_usage WHERE date BETWEEN ? AND ? ORDER BY date",
+        "SELECT day, name, duration FROM daily_usage JOIN apps ON apps.id = app_id WHERE day BETWEEN ? AND ? ORDER BY day",
+        31, False),
+    "year per app (daily rows)": (
+        "SELECT app_name, SUM(duration) FROM daily_usage WHERE date BETWEEN ? AND ? GROUP BY app_name",
+        "SELECT name, SUM(duration) FROM daily_usage JOIN apps ON apps.id = app_id WHERE day BETWEEN ? AND ? GROUP BY app_id",
+        365, False),
+    "year by week (summary)": (
+        "SELECT week_start, app_name, duration FROM weekly_usage WHERE week_start BETWEEN ? AND ?",
+        "SELECT week, name, duration FROM weekly_usage JOIN apps ON apps.id = app_id WHERE week BETWEEN ? AND ?",
+        365, True),
+}
+
+
+def file_size(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+def to_text_layout(src, dst):
+    """Writes the same data in the old layout, straight from the new one."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    conn = sqlite3.connect(dst)
+    conn.executescript(TEXT_LAYOUT)
+    conn.execute("ATTACH ? AS new", (str(src),))
+    conn.executescript("""
+        INSERT INTO daily_usage
+        SELECT date(day * 86400, 'unixepoch'), name, duration FROM new.daily_usage JOIN new.apps ON apps.id = app_id;
+        INSERT INTO sessions
+        SELECT s.id, date(s.day * 86400, 'unixepoch'), s.start_ts, s.end_ts, name, s.title FROM new.sessions s JOIN new.apps ON apps.id = app_id;
+        INSERT INTO weekly_usage
+        SELECT date(week * 86400, 'unixepoch'), name, duration FROM new.weekly_usage JOIN new.apps ON apps.id = app_id;
+        INSERT INTO monthly_usage
+        SELECT printf('%04d-%02d', month / 12, month % 12 + 1), name, duration FROM new.monthly_usage JOIN new.apps ON apps.id = app_id;
+    """)
+    conn.commit()
+    conn.close()
+
+def timed(conn, sql, params, repeat=30):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main(years=3, apps=2000):
+    database.init_db()
+    rows = load_history(database, years=years, apps=apps)
+    database.close_db()
+    new_path = database.DB_PATH
+    text_path = new_path.with_name("text_layout.db")
+    to_text_layout(new_path, text_path)
+
+    new_size, text_size = file_size(new_path), file_size(text_path)
+    print(f"{rows} daily rows over {years} years, {apps} apps")
+    print(f"file size     text {text_size / 1e6:7.2f} MB   ids {new_size / 1e6:7.2f} MB   {new_size / text_size - 1:+.0%}")
+
+    today = date.today()
+    text_conn, new_conn = sqlite3.connect(text_path), sqlite3.connect(new_path)
+    for name, (text_sql, new_sql, days, weekly) in SCANS.items():
+        first = today - timedelta(days=days - 1)
+        text_ms = timed(text_conn, text_sql, (first.isoformat(), today.isoformat()))
+        lo, hi = database.day_number(first.isoformat()), database.day_number(today.isoformat())
+        if weekly:
+            lo, hi = database.week_number(lo), database.week_number(hi)
+        new_ms = timed(new_conn, new_sql, (lo, hi))
+        print(f"{name:<28} text {text_ms:7.3f} ms   ids {new_ms:7.3f} ms   {new_ms / text_ms - 1:+.0%}")
+    text_conn.close()
+    new_conn.close()
+
+    # init_db() on a copy of the old layout
+    shutil.copy(text_path, new_path)
+    start = time.perf_counter()
+    database.init_db(recover=False)
+    print(f"migration     {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,56 @@
+"""
+Wakeups per hour and switch-detection latency for each activity source,
+using the same synthetic day of window switches.
+
+    python -m benchmarks.bench_sources [hours] [seed]
+"""
+import os, sys, tempfile, random, time
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from st_tracker.sources import ScriptedSource, Foreground, Idle, Active
+from st_tracker.worker import TrackerWorker
+
+APPS = ["code.exe", "chrome.exe", "slack.exe", "explorer.exe", "spotify.exe", "WindowsTerminal.exe"]
+
+
+def make_trace(hours=8, seed=1, start=None):
+    rng = random.Random(seed)
+    ts = start if start is not None else time.mktime((2024, 3, 4, 9, 0, 0, 0, 0, -1))
+    end = ts + hours * 3600
+    events = []
+    while ts < end:
+        events.append(Foreground(ts, "", rng.choice(APPS)))
+        # mostly short alt-tabs with a long tail of focused stretches
+        ts += rng.expovariate(1 / 45) if rng.random() < 0.8 else rng.uniform(0.2, 1.5)
+        if rng.random() < 0.01:
+            events.append(Idle(ts + 60, ts))
+            ts += rng.uniform(120, 900)
+            events.append(Active(ts))
+    return events
+
+def run(source):
+    worker = TrackerWorker(60, source=source)
+    start = time.perf_counter()
+    worker.run()
+    wall = time.perf_counter() - start
+    return source.stats(), wall
+
+def main(hours=8, seed=1):
+    database.init_db()
+    print(f"{len(make_trace(hours, seed))} events over {hours}h")
+    for day, poll_interval in enumerate((None, 1.0)):
+        # each backend gets its own day so the runs don't share totals
+        start = time.mktime((2024, 3, 4 + day, 9, 0, 0, 0, 0, -1))
+        stats, wall = run(ScriptedSource(make_trace(hours, seed, start), poll_interval=poll_interval))
+        print(f"{stats['backend']:<22} wakeups/h {stats['wakeups_per_hour']:8.1f}   "
+              f"latency avg {stats['switch_latency_avg'] * 1000:7.1f} ms   "
+              f"max {stats['switch_latency_max'] * 1000:7.1f} ms   "
+              f"missed {stats['missed_switches']:4d}   ({wall * 1000:.0f} ms wall)")
+    database.close_db()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,124 @@
+"""
+Startup budget, headless. Import time of each process' entry module (from
+-X importtime, with its heaviest imports and the web/network packages it
+pulls in), then the tracker daemon started in a fresh interpreter on a
+polling source: time until its first tick (the first published
+snapshot) and until the API it spawns answers.
+
+    python -m benchmarks.bench_startup [--years 3] [--no-api]
+"""
+import os, sys, argparse, json, subprocess, tempfile, time
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from benchmarks.synthetic import load_history
+
+ENTRY_MODULES = {
+    "tracker": "st_tracker.daemon",
+    "api": "backend.api",
+    "gui (without Qt)": "shared.control",
+}
+# none of these belong on the tracker's startup path
+WEB_STACK = ("fastapi", "uvicorn", "starlette", "pydantic", "requests", "urllib3", "httpx", "concurrent")
+
+CHILD = """
+import json, sys, threading, time, urllib.request
+started = time.perf_counter()
+from shared import memory
+from st_tracker.daemon import TrackerDaemon
+from st_tracker.sources import PollingSource
+imported = time.perf_counter()
+
+ticked = threading.Event()
+memory.listeners.append(ticked.set)
+source = PollingSource(lambda: ("", "code.exe", 0.0))
+daemon = TrackerDaemon(api=sys.argv[1] == "api", source=source)
+initialized = time.perf_counter()
+thread = threading.Thread(target=daemon.run)
+thread.start()
+ticked.wait()
+first_tick = time.perf_counter()
+
+api = None
+if sys.argv[1] == "api":
+    deadline = time.time() + 30
+    while api is None and time.time() < deadline:
+        try:
+            urllib.request.urlopen("http://127.0.0.1:7777/api/status", timeout=1).read()
+            api = time.perf_counter()
+        except OSError:
+            time.sleep(0.01)
+
+print("STARTUP", json.dumps({"import": imported - started, "init": initialized - imported,
+                  "first_tick": first_tick - initialized, "api": api and api - first_tick}), flush=True)
+daemon.worker.stop()
+thread.join()
+"""
+
+
+def import_times(module):
+    """(total µs, [(µs, name)] of its heaviest direct imports, modules loaded)."""
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    total, children = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # a module is printed after its imports, two more spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                total = int(cumulative)
+                break
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative), name.strip()))
+    loaded = json.loads(result.stdout.splitlines()[-1])
+    return total, sorted(children, reverse=True)[:5], loaded
+
+def run_daemon(api):
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", CHILD, "api" if api else "no-api"],
+                             stdout=subprocess.PIPE, text=True)
+    for line in child.stdout:
+        if line.startswith("STARTUP "):
+            break
+    wall = time.perf_counter() - start
+    child.stdout.read()
+    child.wait(30)
+    phases = json.loads(line[len("STARTUP "):])
+    phases["interpreter"] = wall - sum(v for v in phases.values() if v)
+    return phases
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--no-api", action="store_true")
+    args = parser.parse_args(argv)
+
+    for label, module in ENTRY_MODULES.items():
+        total, heaviest, loaded = import_times(module)
+        web = sorted({name.split(".")[0] for name in loaded if name.split(".")[0] in WEB_STACK})
+        print(f"{label:<18} import {module:<18} {total / 1000:6.1f} ms   web/network: {', '.join(web) or 'none'}")
+        for us, name in heaviest:
+            print(f"{'':<20}{name:<30} {us / 1000:6.1f} ms")
+
+    database.init_db()
+    load_history(database, years=args.years, apps=500)
+    database.close_db()
+
+    runs = [run_daemon(not args.no_api) for _ in range(3)]
+    print(f"\ntracker daemon, {args.years:g} years of history, best of {len(runs)}:")
+    for phase in ("interpreter", "import", "init", "first_tick", "api"):
+        values = [run[phase] for run in runs if run.get(phase) is not None]
+        if values:
+            print(f"  {phase:<12} {min(values) * 1000:8.1f} ms")
+    best = min(runs, key=lambda run: run["interpreter"] + run["import"] + run["init"] + run["first_tick"])
+    print(f"  process start to first tick {(best['interpreter'] + best['import'] + best['init'] + best['first_tick']) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Sync latency seen by TrackerWorker.perform_sync, before and after the
+write-behind writer.
+
+    python -m benchmarks.bench_sync [apps] [rounds]
+"""
+import os, sys, tempfile, time, sqlite3, statistics
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+
+
+def legacy_bulk_save(usage_list, day):
+    # what bulk_save_usage did before: connect, upsert, commit, close,
+    # into a table with the old layout
+    conn = sqlite3.connect(database.DB_PATH)
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS legacy_daily_usage (
+            date TEXT,
+            app_name TEXT,
+            duration REAL,
+            PRIMARY KEY (date, app_name)
+        )
+    """)
+    data = [(day, name, dur) for name, dur in usage_list]
+    cur.executemany("""
+        INSERT INTO legacy_daily_usage(date, app_name, duration)
+        VALUES(?,?,?)
+        ON CONFLICT(date, app_name)
+        DO UPDATE SET duration = excluded.duration
+    """, data)
+    conn.commit()
+    conn.close()
+
+def timed(fn, batches, day):
+    samples = []
+    for batch in batches:
+        start = time.perf_counter()
+        fn(batch, day)
+        samples.append((time.perf_counter() - start) * 1000)
+        # the worker syncs every 30 s, so let the writer drain between rounds
+        database.writer.flush()
+    return samples
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<22} mean {statistics.mean(samples):8.3f} ms   "
+          f"p50 {statistics.median(samples):8.3f} ms   p99 {p99:8.3f} ms")
+
+def main(apps=50, rounds=200):
+    database.init_db()
+    batches = [[(f"App{i}", float(r * 30 + i)) for i in range(apps)] for r in range(rounds)]
+
+    report("connect-per-call", timed(legacy_bulk_save, batches, "2000-01-01"))
+    report("bulk_save_usage", timed(database.bulk_save_usage, batches, "2000-01-02"))
+
+    # what perform_sync sends now: the intervals closed since the last sync
+    start = database.day_start("2000-01-03")
+    sessions = [[(start + r * 30, start + r * 30 + 1 + i * 0.1, f"App{i}", "") for i in range(apps)] for r in range(rounds)]
+    report("queue_sessions", timed(lambda batch, day: database.queue_sessions(batch), sessions, None))
+    database.close_db()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
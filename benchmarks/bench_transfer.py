@@ -0,0 +1,71 @@
+"""
+Throughput of bulk history transfer on a multi-million-row synthetic
+history: import through import_usage() in batched transactions, then
+export as CSV and NDJSON straight from the cursor, with the peak Python
+memory of an export to show it does not grow with the range.
+
+    python -m benchmarks.bench_transfer [--years 20 --per-day 800]
+"""
+import os, sys, tempfile, argparse, time, tracemalloc
+from datetime import date
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database, transfer
+from benchmarks.synthetic import generate_history
+
+
+def synthetic_rows(**options):
+    for day, usage in generate_history(**options):
+        for app, seconds in usage:
+            yield day, app, seconds
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    result = fn()
+    wall = time.perf_counter() - start
+    print(f"{label:<28} {rows:>10,} rows {wall:7.2f}s {rows / wall:>12,.0f} rows/s")
+    return result
+
+def export_bytes(start, end, fmt):
+    return sum(len(chunk) for chunk in transfer.export_chunks(start, end, fmt))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=20)
+    parser.add_argument("--apps", type=int, default=10000)
+    parser.add_argument("--per-day", type=int, default=800)
+    args = parser.parse_args(argv)
+    options = dict(years=args.years, apps=args.apps, per_day=args.per_day)
+
+    database.init_db(recover=False)
+    count = sum(1 for _ in synthetic_rows(**options))
+    timed("import", count, lambda: database.import_usage(synthetic_rows(**options)))
+    # the same totals again: every row is read and compared, nothing changes
+    timed("import (unchanged)", count, lambda: database.import_usage(synthetic_rows(**options)))
+
+    start, end = "1970-01-01", "9999-12-31"
+    exported = timed("export rows", count, lambda: sum(1 for _ in database.export_usage(start, end)))
+    sizes = {}
+    for fmt in transfer.FORMATS:
+        sizes[fmt] = timed(f"export {fmt}", count, lambda: export_bytes(start, end, fmt))
+
+    # memory of a full export against one of a single month
+    peaks = {}
+    for label, first in (("full range", start), ("last month", date.today().replace(day=1).isoformat())):
+        tracemalloc.start()
+        for _ in transfer.export_chunks(first, end, "ndjson"):
+            pass
+        peaks[label] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    database.close_db()
+    print(f"exported {exported:,} of {count:,} rows, "
+          + ", ".join(f"{fmt} {size / 2**20:.0f} MiB" for fmt, size in sizes.items()))
+    print("peak export memory: " + ", ".join(f"{label} {peak / 1024:.0f} KiB" for label, peak in peaks.items()))
+    return 0 if exported == count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Kills a tracker mid-run and checks that the journal gives back what it
+had not synced. The tracker runs in a child process on a scripted clock
+and is killed with os._exit at a chosen virtual time, so the writer thread
+and the journal are left exactly as a crash would leave them.
+
+    python -m benchmarks.check_journal [hours] [seed]
+"""
+import os, sys, json, subprocess, tempfile, time, sqlite3
+
+KILLED = 9
+KILL_AFTER = 0.61  # fraction of the trace, lands in the middle of a session
+
+
+def child(mode, hours, seed):
+    from backend import database
+    from benchmarks.bench_sources import make_trace
+    from shared.journal import Journal
+    from st_tracker.sources import ScriptedSource, Active
+    from st_tracker.worker import TrackerWorker
+
+    start = time.mktime((2024, 3, 4, 9, 0, 0, 0, 0, -1))
+    kill_at = start + hours * 3600 * KILL_AFTER
+    events = make_trace(hours, seed, start)
+
+    class KilledSource(ScriptedSource):
+        def next_event(self, timeout):
+            event = super().next_event(timeout)
+            if self.clock >= kill_at:
+                os._exit(KILLED)
+            return event
+
+    database.init_db()
+    if mode == "kill":
+        worker = TrackerWorker(60, KilledSource(events), Journal())
+    else:
+        # the same trace stopping cleanly at kill_at, for the expected totals
+        trace = [e for e in events if e.ts < kill_at] + [Active(kill_at)]
+        worker = TrackerWorker(60, ScriptedSource(trace))
+    worker.run()
+    database.close_db()
+    print(json.dumps(worker.total_info))
+
+def run_child(mode, appdata, hours, seed):
+    env = dict(os.environ, LOCALAPPDATA=appdata)
+    args = [sys.executable, "-m", "benchmarks.check_journal", "--child", mode, str(hours), str(seed)]
+    return subprocess.run(args, env=env, capture_output=True, text=True)
+
+def db_totals(appdata):
+    conn = sqlite3.connect(os.path.join(appdata, "WinTrack", "screen_time.db"))
+    totals = dict(conn.execute("""
+        SELECT name, duration FROM daily_usage JOIN apps ON apps.id = app_id
+        WHERE day = julianday('2024-03-04') - 2440587.5
+    """))
+    conn.close()
+    return totals
+
+def main(hours=8, seed=1):
+    from st_tracker.worker import JOURNAL_INTERVAL
+
+    clean_dir, killed_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    clean = run_child("clean", clean_dir, hours, seed)
+    expected = json.loads(clean.stdout.strip().splitlines()[-1])
+
+    killed = run_child("kill", killed_dir, hours, seed)
+    assert killed.returncode == KILLED, killed.stderr
+    before = db_totals(killed_dir)
+
+    # what the next tracker start does: init_db() replays the journal
+    recover = subprocess.run([sys.executable, "-c", "from backend.database import init_db; init_db()"],
+                             env=dict(os.environ, LOCALAPPDATA=killed_dir), capture_output=True, text=True)
+    print(recover.stdout.strip())
+    after = db_totals(killed_dir)
+
+    lost_before = sum(expected.values()) - sum(before.values())
+    lost_after = sum(expected.values()) - sum(after.values())
+    print(f"expected {sum(expected.values()):9.1f} s")
+    print(f"lost without the journal {lost_before:7.1f} s")
+    print(f"lost after replay        {lost_after:7.1f} s")
+
+    worst = max(abs(expected.get(app, 0) - after.get(app, 0)) for app in set(expected) | set(after))
+    ok = 0 <= lost_after <= JOURNAL_INTERVAL and worst <= JOURNAL_INTERVAL
+    print(f"per-app error at most {worst:.1f} s, within {JOURNAL_INTERVAL} s: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], *map(int, sys.argv[3:5]))
+    else:
+        sys.exit(main(*map(int, sys.argv[1:3])))
@@ -0,0 +1,111 @@
+"""
+Merges synthetic databases of other "machines" into a local one and checks
+that the merged view is exactly local + sources, that a repeat merge only
+re-reads the days that changed, that a Reset on a source and months it
+archived still come through (and a source whose archive folder is
+missing is refused), and how long the first and repeat merges take.
+
+    python -m benchmarks.check_merge [--machines 3 --years 2]
+"""
+import os, sys, tempfile, argparse, subprocess, sqlite3, shutil, time
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database, merge
+
+MACHINE = """
+import sys
+from backend import database
+from benchmarks.synthetic import load_history
+database.init_db(recover=False)
+if sys.argv[1] == "load":
+    load_history(database, years=float(sys.argv[2]), apps=300, per_day=30, seed=int(sys.argv[3]))
+elif sys.argv[1] == "reset":
+    database.clear_day(sys.argv[2])
+elif sys.argv[1] == "archive":
+    from backend import maintenance
+    maintenance.archive_months(database.day_number(sys.argv[2]))
+else:
+    database.bulk_save_usage([("Merged", 1234.5)], sys.argv[2])
+database.close_db()
+"""
+
+
+def machine(root, *args):
+    """Runs a command against the database of another LOCALAPPDATA."""
+    env = dict(os.environ, LOCALAPPDATA=root)
+    subprocess.run([sys.executable, "-c", MACHINE, *map(str, args)], env=env, check=True)
+    return os.path.join(root, "WinTrack", "screen_time.db")
+
+def sum_of(path):
+    conn = sqlite3.connect(path)
+    total = conn.execute("SELECT SUM(duration) FROM daily_usage").fetchone()[0]
+    conn.close()
+    return total
+
+def last_day(path):
+    conn = sqlite3.connect(path)
+    day = conn.execute("SELECT date(MAX(day) * 86400, 'unixepoch') FROM daily_usage").fetchone()[0]
+    conn.close()
+    return day
+
+def merged_total(merged):
+    _, totals, _ = database.get_range_usage("1970-01-01", "2099-12-31", "month", merged=merged)
+    return sum(totals.values())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--machines", type=int, default=3)
+    parser.add_argument("--years", type=float, default=2)
+    args = parser.parse_args(argv)
+
+    database.init_db(recover=False)
+    paths = [machine(tempfile.mkdtemp(), "load", args.years, seed) for seed in range(args.machines)]
+    problems = []
+
+    start = time.perf_counter()
+    first = merge.merge_sources(paths)
+    print(f"first merge   {sum(first.values()):>6} days in {time.perf_counter() - start:.3f}s")
+
+    machine(os.path.dirname(os.path.dirname(paths[0])), "add", "2024-02-29")
+    start = time.perf_counter()
+    again = merge.merge_sources()
+    print(f"repeat merge  {sum(again.values()):>6} days in {time.perf_counter() - start:.3f}s")
+    if sum(again.values()) != 1:
+        problems.append(f"repeat merge read {again}, expected the one changed day")
+
+    expected = merged_total(False) + sum(sum_of(path) for path in paths)
+    if abs(merged_total(True) - expected) > 1e-3:
+        problems.append(f"merged total {merged_total(True):.3f}, expected {expected:.3f}")
+
+    # a Reset deletes a day's sessions without a new id to notice
+    machine(os.path.dirname(os.path.dirname(paths[0])), "reset", last_day(paths[0]))
+    merge.merge_sources()
+    expected = merged_total(False) + sum(sum_of(path) for path in paths)
+    if abs(merged_total(True) - expected) > 1e-3:
+        problems.append(f"after a Reset on a source merged total {merged_total(True):.3f}, expected {expected:.3f}")
+
+    if args.machines > 1:
+        # archived months live in files next to the database, not in it
+        root = os.path.dirname(os.path.dirname(paths[1]))
+        machine(root, "archive", last_day(paths[1])[:8] + "01")
+        archive_dir = os.path.join(root, "WinTrack", "archive")
+        shutil.move(archive_dir, archive_dir + ".away")
+        report = merge.merge_sources([paths[1]])
+        if not isinstance(report[str(os.path.realpath(paths[1]))], str):
+            problems.append(f"merged a source whose archive folder is missing: {report}")
+        shutil.move(archive_dir + ".away", archive_dir)
+        merge.merge_sources()
+        if abs(merged_total(True) - expected) > 1e-3:
+            problems.append(f"with archived months merged total {merged_total(True):.3f}, expected {expected:.3f}")
+
+    database.close_db()
+    for problem in problems:
+        print("  " + problem)
+    print("OK" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Scrapes /api/metrics after a replayed trace and a few API calls, checks
+that the page is valid Prometheus text (one HELP/TYPE per family, sane
+histograms) and that every hot path reports, then measures what an
+observe() costs.
+
+    python -m benchmarks.check_metrics
+"""
+import os, sys, re, tempfile, time, timeit
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from fastapi.testclient import TestClient
+from shared import metrics
+from backend import api, database
+from benchmarks.bench_sources import make_trace
+from st_tracker.daemon import TrackerDaemon
+from st_tracker.resolver import ProcessNames
+from st_tracker.sources import ScriptedSource
+from st_tracker.worker import TrackerWorker
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+EXPECTED = [
+    ("wintrack_loop_seconds_count", {}),
+    ("wintrack_sync_seconds_count", {}),
+    ("wintrack_sync_rows_total", {"table": "sessions"}),
+    ("wintrack_probe_seconds_count", {"probe": "process"}),
+    ("wintrack_cache_hit_ratio", {"cache": "pid"}),
+    ("wintrack_cache_hit_ratio", {"cache": "app_names"}),
+    ("wintrack_db_seconds_count", {"function": "get_today_data"}),
+    ("wintrack_db_seconds_count", {"function": "get_range_usage"}),
+    ("wintrack_db_seconds_count", {"function": "writer_commit"}),
+    ("wintrack_api_seconds_count", {"route": "/api/range"}),
+    ("process_resident_memory_bytes", {}),
+    ("process_cpu_seconds_total", {}),
+]
+
+
+def parse(text):
+    """[(name, labels, value)], raises on anything that is not Prometheus text."""
+    samples, described = [], set()
+    for number, line in enumerate(text.splitlines(), 1):
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            key = (line[2:6], line.split()[2])
+            if key in described:
+                raise ValueError(f"line {number}: second {line[:40]}")
+            described.add(key)
+            continue
+        match = SAMPLE.match(line)
+        if not match:
+            raise ValueError(f"line {number}: not a sample: {line!r}")
+        labels = dict(re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        samples.append((match.group(1), labels, float(match.group(3))))
+    return samples
+
+def value(samples, name, labels):
+    for sample, sample_labels, val in samples:
+        if sample == name and all(sample_labels.get(k) == v for k, v in labels.items()):
+            return val
+    return None
+
+def check_histograms(samples):
+    problems = []
+    buckets = {}
+    for name, labels, val in samples:
+        if name.endswith("_bucket"):
+            key = (name, tuple(sorted((k, v) for k, v in labels.items() if k != "le")))
+            buckets.setdefault(key, []).append(val)
+    for key, counts in buckets.items():
+        if counts != sorted(counts):
+            problems.append(f"{key} buckets are not cumulative")
+    return problems
+
+def main():
+    database.init_db(recover=False)
+    worker = TrackerWorker(60, source=ScriptedSource(make_trace(hours=4)))
+    worker.run()
+    database.writer.flush()
+
+    names = ProcessNames(name="pid")
+    for _ in range(20):
+        names.name(os.getpid())
+
+    client = TestClient(api.app)
+    client.get("/api/range", params={"start": "2024-01-01"})
+    client.get("/api/weekly")
+    response = client.get("/api/metrics")
+    problems = []
+    if not response.headers["content-type"].startswith("text/plain"):
+        problems.append(f"content type {response.headers['content-type']}")
+
+    samples = parse(response.text)
+    problems += check_histograms(samples)
+    for name, labels in EXPECTED:
+        val = value(samples, name, labels)
+        print(f"{name:<34} {str(labels):<28} {val}")
+        if not val:
+            problems.append(f"{name} {labels} missing or zero")
+
+    # two processes merged into one page, as when the tracker runs apart
+    daemon = TrackerDaemon.__new__(TrackerDaemon)
+    merged = metrics.render(metrics.collect(process="api"), daemon.handle("metrics"))
+    both = parse(merged)
+    if value(both, "wintrack_loop_seconds_count", {"process": "tracker"}) is None:
+        problems.append("tracker samples missing from the merged page")
+    print(f"page: {len(response.text) / 1024:.1f} KiB, {len(samples)} samples; merged {len(both)}")
+
+    child = metrics.histogram("check_metrics_seconds", "observe() cost")
+    per_call = min(timeit.repeat(lambda: child.observe(0.0003), number=100000, repeat=5)) / 100000
+    start = time.perf_counter()
+    for _ in range(100):
+        metrics.render(metrics.collect())
+    print(f"observe(): {per_call * 1e9:.0f} ns, render: {(time.perf_counter() - start) * 10:.2f} ms")
+
+    database.close_db()
+    for problem in problems:
+        print("  " + problem)
+    print("OK" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Drives ProcessNames with a fake process table, so it runs without Windows.
+Checks that a reused pid gets the new process' name (the old pid-keyed
+dict kept the old one), that a pid seen again under the same window costs
+no create time lookup, that the cache stays bounded and that the counters
+add up, then reports lookups per second on a skewed switch trace.
+
+    python -m benchmarks.check_resolver [switches]
+"""
+import sys, random, time, psutil
+from st_tracker.resolver import ProcessNames, LRU
+
+
+class FakeProcess:
+    def __init__(self, table, pid):
+        if pid not in table.procs:
+            raise psutil.NoSuchProcess(pid)
+        self.table = table
+        self.pid = pid
+
+    def create_time(self):
+        self.table.time_calls += 1
+        return self.table.procs[self.pid][1]
+
+    def name(self):
+        self.table.name_calls += 1
+        return self.table.procs[self.pid][0]
+
+
+class FakeTable:
+    """pid -> (exe, create_time), with spawn/exit like the OS."""
+
+    def __init__(self):
+        self.procs = {}
+        self.clock = 1000.0
+        self.name_calls = 0
+        self.time_calls = 0
+
+    def spawn(self, pid, exe):
+        self.clock += 1
+        self.procs[pid] = (exe, self.clock)
+
+    def exit(self, pid):
+        del self.procs[pid]
+
+    def __call__(self, pid):
+        return FakeProcess(self, pid)
+
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+def main(switches=100000):
+    table = FakeTable()
+    names = ProcessNames(maxsize=4, process=table)
+    legacy = {}
+
+    def legacy_name(pid):
+        # the old Win32Source.describe cache, keyed by pid only
+        if pid not in legacy:
+            legacy[pid] = table(pid).name()
+        return legacy[pid]
+
+    results = []
+    table.spawn(100, "chrome.exe")
+    results.append(check("first lookup", names.name(100) == "chrome.exe" and legacy_name(100) == "chrome.exe"))
+    results.append(check("second lookup is a hit", names.name(100) == "chrome.exe" and names.cache.hits == 1))
+
+    table.exit(100)
+    results.append(check("exited process is Unknown", names.name(100) == "Unknown"))
+    table.spawn(100, "notepad.exe")
+    results.append(check("reused pid gets the new name", names.name(100) == "notepad.exe"))
+    print(f"     (pid-keyed dict says {legacy_name(100)!r})")
+
+    # the foreground window vouches for the pid, no syscall at all
+    windows = ProcessNames(process=table)
+    table.spawn(300, "code.exe")
+    windows.name(300, hwnd=7)
+    before = table.time_calls
+    results.append(check("same window is a hit without create_time()",
+                         windows.name(300, hwnd=7) == "code.exe" and table.time_calls == before))
+    results.append(check("another window of the process checks it once",
+                         windows.name(300, hwnd=8) == "code.exe" and table.time_calls == before + 1
+                         and windows.name(300, hwnd=8) == "code.exe" and table.time_calls == before + 1))
+    table.exit(300)
+    table.spawn(300, "mspaint.exe")
+    results.append(check("reused pid under a new window gets the new name", windows.name(300, hwnd=9) == "mspaint.exe"))
+
+    for pid in range(200, 210):
+        table.spawn(pid, f"app{pid}.exe")
+        names.name(pid)
+    stats = names.cache.stats()
+    # the stale chrome.exe entry of pid 100 went when notepad.exe replaced it
+    results.append(check("cache stays bounded", stats["size"] == 4 and stats["evictions"] == 7))
+    # the lookup of the exited process never reaches the cache
+    results.append(check("hits + misses = lookups", stats["hits"] + stats["misses"] == 13))
+
+    # memoized app names: UWP titles are part of the key, plain exes are not
+    app_names = LRU(2)
+    app_names.put("code.exe", "Code")
+    app_names.put(("ApplicationFrameHost.exe", "Calculator"), "Calculator")
+    results.append(check("app name memo", app_names.get("code.exe") == "Code"
+                         and app_names.get(("ApplicationFrameHost.exe", "Mail")) is None))
+
+    # a switch trace over a few dozen long-lived processes
+    rng = random.Random(1)
+    table = FakeTable()
+    for pid in range(1, 41):
+        table.spawn(pid * 4, f"app{pid}.exe")
+    names = ProcessNames(process=table)
+    pids = [pid * 4 for pid in range(1, 41)]
+    weights = [1 / rank for rank in range(1, 41)]
+    trace = rng.choices(pids, weights, k=switches)
+    start = time.perf_counter()
+    for pid in trace:
+        # one window per process
+        names.name(pid, hwnd=pid + 1)
+    elapsed = time.perf_counter() - start
+    stats = names.cache.stats()
+    print(f"{switches} lookups in {elapsed * 1000:.0f} ms, {stats['hits'] / switches:.1%} hits, "
+          f"{table.name_calls} name() and {table.time_calls} create_time() calls")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:2])))
@@ -0,0 +1,91 @@
+"""
+Runs history maintenance on a few years of synthetic data and checks that
+nothing is lost: every day, week and month keeps its total (downsampled
+apps end up in "Others"), range queries still cover the archived years,
+and a rebuild afterwards does not touch the compacted history.
+Prints the database size before and after and the archive size.
+
+    python -m benchmarks.check_retention [--years 3]
+"""
+import os, sys, tempfile, argparse, time
+from datetime import date
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import archive, database
+from backend.maintenance import run_maintenance
+from benchmarks.synthetic import load_history
+from st_tracker.helper import RETENTION_DEFAULTS
+
+
+def bucket_totals(start, end, granularity):
+    series, totals, _ = database.get_range_usage(start, end, granularity)
+    return {bucket: sum(usage.values()) for bucket, usage in series.items()}, totals
+
+def compare(name, before, after, tolerance=1e-3):
+    problems = [f"{name} {bucket}: {before.get(bucket, 0):.3f} -> {after.get(bucket, 0):.3f}"
+                for bucket in sorted(set(before) | set(after))
+                if abs(before.get(bucket, 0) - after.get(bucket, 0)) > tolerance]
+    print(f"{name:<8} {len(before):>5} buckets, {len(problems)} differ")
+    return problems
+
+def db_size():
+    conn = database.connect()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+    rows = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("sessions", "daily_usage", "weekly_usage", "monthly_usage")}
+    conn.close()
+    return size, rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=3)
+    args = parser.parse_args(argv)
+
+    database.init_db(recover=False)
+    load_history(database, years=args.years, apps=300, per_day=30)
+    today = date.today()
+    start, end = "1970-01-01", today.isoformat()
+
+    before = {g: bucket_totals(start, end, g) for g in database.GRANULARITIES}
+    size, rows = db_size()
+    print(f"before: {size / 1024:.0f} KiB {rows}")
+
+    # every step on, the defaults leave them off
+    settings = dict(RETENTION_DEFAULTS, sessions_days=90, downsample_days=365, archive_days=730)
+    t0 = time.perf_counter()
+    report = run_maintenance(settings, today)
+    print(f"maintenance: {report} in {time.perf_counter() - t0:.2f}s")
+    # a second round has nothing left to do
+    again = run_maintenance(settings, today)
+    print(f"again:       {again}")
+
+    size, rows = db_size()
+    stored = sum(p.stat().st_size for p in archive.ARCHIVE_DIR.glob("*.json.gz"))
+    print(f"after:  {size / 1024:.0f} KiB {rows}, archive {stored / 1024:.0f} KiB")
+
+    problems = []
+    for g in database.GRANULARITIES:
+        after = bucket_totals(start, end, g)
+        problems += compare(g, before[g][0], after[0])
+    whole = sum(before["day"][1].values()), sum(bucket_totals(start, end, "day")[1].values())
+    if abs(whole[0] - whole[1]) > 1e-3:
+        problems.append(f"total {whole[0]:.3f} -> {whole[1]:.3f}")
+
+    database.rebuild(start, end)
+    problems += compare("rebuilt", before["day"][0], bucket_totals(start, end, "day")[0])
+
+    if again.get("sessions_pruned") or again.get("rows_downsampled") or again.get("days_archived"):
+        problems.append(f"second round changed data: {again}")
+
+    database.close_db()
+    for problem in problems[:20]:
+        print("  " + problem)
+    print("OK" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
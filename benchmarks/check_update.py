@@ -0,0 +1,87 @@
+"""
+Runs the update check against a local stand-in for the version file.
+Checks that repeat checks are conditional (304, no body), that a new
+version is picked up, that failures back off and keep the last answer,
+and that /api/update answers from memory while the server hangs.
+
+    python -m benchmarks.check_update
+"""
+import os, sys, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.update import UpdateChecker
+
+
+class StandIn(BaseHTTPRequestHandler):
+    version = "1.0.0"
+    hang = 0
+    requests = []
+
+    def do_GET(self):
+        StandIn.requests.append(dict(self.headers))
+        if StandIn.hang:
+            time.sleep(StandIn.hang)
+        etag = f'"{StandIn.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({"latest_version": StandIn.version}).encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(label, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/remote_version.json"
+    checker = UpdateChecker("1.0.0", url=url, interval=3600)
+    results = []
+
+    results.append(check("first check fetches", checker.check() == 3600 and not checker.result["update_available"]))
+    checker.check()
+    results.append(check("second check is conditional", StandIn.requests[-1].get("If-None-Match") == '"1.0.0"'
+                         and checker.not_modified == 1))
+
+    StandIn.version = "1.1.0"
+    checker.check()
+    results.append(check("new version is picked up", checker.result["update_available"]
+                         and checker.result["latest_version"] == "1.1.0"))
+
+    server.shutdown()
+    server.server_close()
+    delays = [checker.check() for _ in range(4)]
+    results.append(check(f"failures back off {delays}", delays == sorted(delays) and delays[0] < delays[-1]))
+    results.append(check("last answer kept while offline", checker.result["latest_version"] == "1.1.0"))
+
+    # the endpoint with a server that takes the whole timeout to answer
+    StandIn.hang = 3
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["WINTRACK_UPDATE_URL"] = f"http://127.0.0.1:{server.server_port}/remote_version.json"
+    from backend import api
+    from fastapi.testclient import TestClient
+    client = TestClient(api.app)
+    client.get("/api/update")
+    start = time.perf_counter()
+    for _ in range(100):
+        client.get("/api/update")
+    per_call = (time.perf_counter() - start) / 100
+    results.append(check(f"/api/update does not wait on the network ({per_call * 1e3:.2f} ms per call)", per_call < 0.05))
+
+    print("OK" if all(results) else "FAILED")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
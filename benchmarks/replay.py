@@ -0,0 +1,109 @@
+"""
+Replays an activity trace through the real TrackerWorker and accounting
+code on a virtual clock and prints the per-app totals it ends up with.
+A day of events takes milliseconds, so this doubles as a regression
+harness (--expect) and a throughput benchmark for the accounting core.
+
+    python -m benchmarks.replay day.jsonl
+    python -m benchmarks.replay day.jsonl --save-totals expected.json
+    python -m benchmarks.replay day.jsonl --expect expected.json
+    python -m benchmarks.replay --synthetic 24 --save-trace day.jsonl
+
+See st_tracker/trace.py for the trace format.
+"""
+import os, sys, tempfile, argparse, json, time
+from datetime import date, timedelta
+
+# a scratch directory, never the real database (LOCALAPPDATA is always set on Windows)
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp()
+
+from backend import database
+from benchmarks.bench_sources import make_trace
+from st_tracker.sources import ScriptedSource
+from st_tracker.trace import dump_trace, load_trace
+from st_tracker.worker import TrackerWorker
+
+
+def replay(events, idle_threshold=60):
+    """Runs the events through a fresh worker, returns ({day: {app: seconds}}, wall seconds)."""
+    database.init_db(recover=False)
+    # one run per clean slate, earlier replays would add up otherwise
+    first = date.fromtimestamp(events[0].ts).isoformat()
+    last = date.fromtimestamp(events[-1].ts).isoformat()
+    days = (database.day_number(first), database.day_number(last))
+    database.writer.write("call", lambda conn: conn.execute("DELETE FROM sessions WHERE day BETWEEN ? AND ?", days))
+    database.rebuild(first, last)
+
+    worker = TrackerWorker(idle_threshold, source=ScriptedSource(events))
+    start = time.perf_counter()
+    worker.run()
+    database.writer.flush()
+    wall = time.perf_counter() - start
+
+    totals = {}
+    day = date.fromisoformat(first)
+    while day.isoformat() <= last:
+        usage = database.get_today_data(day.isoformat())
+        if usage:
+            totals[day.isoformat()] = usage
+        day += timedelta(days=1)
+    return totals, wall
+
+def diff(expected, actual, tolerance=1e-6):
+    problems = []
+    for day in sorted(set(expected) | set(actual)):
+        want, got = expected.get(day, {}), actual.get(day, {})
+        for app in sorted(set(want) | set(got)):
+            if abs(want.get(app, 0) - got.get(app, 0)) > tolerance:
+                problems.append(f"{day} {app}: expected {want.get(app, 0):.3f}, got {got.get(app, 0):.3f}")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay")
+    parser.add_argument("trace", nargs="?", help="trace file, one JSON event per line")
+    parser.add_argument("--synthetic", type=float, metavar="HOURS", help="generate a trace instead")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--threshold", type=float, default=60, help="idle threshold in seconds")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many times for timing")
+    parser.add_argument("--save-trace", help="write the (generated) trace here")
+    parser.add_argument("--save-totals", help="write the resulting totals here")
+    parser.add_argument("--expect", help="totals file to compare against, exit 1 on a mismatch")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        events = load_trace(args.trace)
+    elif args.synthetic:
+        events = make_trace(args.synthetic, args.seed)
+    else:
+        parser.error("give a trace file or --synthetic HOURS")
+    if args.save_trace:
+        dump_trace(events, args.save_trace)
+
+    walls = []
+    for _ in range(args.repeat):
+        totals, wall = replay(events, args.threshold)
+        walls.append(wall)
+    database.close_db()
+
+    for day, usage in totals.items():
+        print(day)
+        for app, seconds in sorted(usage.items(), key=lambda item: -item[1]):
+            print(f"  {app:<30} {seconds:10.1f} s")
+    best = min(walls)
+    print(f"{len(events)} events in {best * 1000:.1f} ms, {len(events) / best:,.0f} events/s")
+
+    if args.save_totals:
+        with open(args.save_totals, "w", encoding="utf-8") as f:
+            json.dump(totals, f, indent=2)
+    if args.expect:
+        with open(args.expect, encoding="utf-8") as f:
+            problems = diff(json.load(f), totals)
+        for problem in problems:
+            print("MISMATCH", problem)
+        print("totals match" if not problems else f"{len(problems)} mismatches")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Synthetic usage history for benchmarks.
+
+App popularity follows a Zipf-like long tail: a handful of apps show up
+every day, most of the names are rare.
+"""
+import random
+from datetime import date, timedelta
+
+
+def app_names(apps):
+    return [f"App{i:05d}" for i in range(apps)]
+
+def generate_history(years=1, apps=200, per_day=25, skew=1.1, seed=42, end=None):
+    """Yields (iso_date, [(app, seconds), ...]) from oldest to newest day."""
+    rng = random.Random(seed)
+    names = app_names(apps)
+    weights = [1 / (rank + 1) ** skew for rank in range(apps)]
+    end = end or date.today()
+    days = int(years * 365)
+
+    for offset in range(days - 1, -1, -1):
+        day = end - timedelta(days=offset)
+        # sorted, set order depends on the per-process string hash seed
+        picked = sorted(set(rng.choices(names, weights, k=per_day)))
+        yield day.isoformat(), [(name, rng.uniform(5, 3600)) for name in picked]
+
+def load_history(database, **options):
+    """Writes a generated history through bulk_save_usage, returns row count."""
+    rows = 0
+    for day, usage in generate_history(**options):
+        database.bulk_save_usage(usage, day)
+        rows += len(usage)
+    database.writer.flush()
+    return rows
@@ -14,46 +14,31 @@ import {
 ChartJS.register(CategoryScale, LinearScale, BarElement, ArcElement, Tooltip, Legend);
 
 export default function Daily() {
-  const [stats, setDaily] = useState<Record<string, number>>({});
+  const [snapshotStats, setDaily] = useState<Record<string, number>>({});
   const [error, setError] = useState("");
   const [status, setStatus] = useState("");
 
-  async function fetchDaily() {
-    try {
-      const [dailyRes, statusRes] = await Promise.all([
-        fetch("http://localhost:7777/api/daily"),
-        fetch("http://localhost:7777/api/status")
-      ]);
-
-      if (!dailyRes.ok) {
-        throw new Error("Daily API failed");
-      }
-
-      if (!statusRes.ok) {
-        throw new Error("Status API failed");
-      }
-
-      const dailyData = await dailyRes.json();
-      const statusData = await statusRes.json();
-
-      if (!statusData.running) {
-        setStatus("Tracker stopped");
-      } else if (statusData.error) {
-        setStatus(`Tracker error: ${statusData.error}`);
-      } else {
-        setStatus("Running");
-      }
-
-      setDaily(dailyData);
-      setError("");
-    }
-    catch (err) {
-      setError("Backend offline");
-      setStatus("Offline");
-      setDaily({});
+  // app that is still running and when the server took the snapshot,
+  // its seconds are added locally so the stream only carries real changes
+  const [live, setLive] = useState<{ app: string; at: number } | null>(null);
+  const [now, setNow] = useState(Date.now() / 1000);
+
+  function handleSnapshot(event: MessageEvent) {
+    const snapshot = JSON.parse(event.data);
+    const statusData = snapshot.status;
+
+    if (!statusData.running) {
+      setStatus("Tracker stopped");
+    } else if (statusData.error) {
+      setStatus(`Tracker error: ${statusData.error}`);
+    } else {
+      setStatus("Running");
     }
-  }
 
+    setDaily(snapshot.daily);
+    setLive(snapshot.live);
+    setError("");
+  }
 
   function format_time(time: number) {
     const h = Math.floor(time / 3600);
@@ -62,6 +47,13 @@ export default function Daily() {
     return `${h > 0 ? h + 'h ' : ''}${m}m ${s}s`;
   }
 
+  const stats = useMemo(() => {
+    if (!live) return snapshotStats;
+    const key = live.app in snapshotStats ? live.app : "Others";
+    const elapsed = Math.max(0, now - live.at);
+    return { ...snapshotStats, [key]: (snapshotStats[key] || 0) + elapsed };
+  }, [snapshotStats, live, now]);
+
   const values = Object.values(stats);
   const totalSeconds = values.reduce((acc, curr) => acc + curr, 0);
 
@@ -69,33 +61,40 @@ export default function Daily() {
 
 
   useEffect(() => {
-    let intervalId: number | undefined;
-    let isPolling = false;
-
-    function startPolling() {
-      if (isPolling) return;
-      isPolling = true;
-
-      fetchDaily();
-      intervalId = window.setInterval(fetchDaily, 1000);
+    let source: EventSource | undefined;
+    let tickId: number | undefined;
+
+    function connect() {
+      if (source) return;
+
+      source = new EventSource("http://localhost:7777/api/live");
+      source.onmessage = handleSnapshot;
+      source.onerror = () => {
+        setError("Backend offline");
+        setStatus("Offline");
+        setDaily({});
+        setLive(null);
+      };
+      tickId = window.setInterval(() => setNow(Date.now() / 1000), 1000);
     }
 
-    function stopPolling() {
-      if (!isPolling) return;
-      isPolling = false;
-      clearInterval(intervalId);
+    function disconnect() {
+      if (!source) return;
+      source.close();
+      source = undefined;
+      clearInterval(tickId);
     }
 
     function handleVisibility() {
-      if (document.hidden) stopPolling();
-      else startPolling();
+      if (document.hidden) disconnect();
+      else connect();
     }
 
-    startPolling();
+    connect();
     document.addEventListener("visibilitychange", handleVisibility);
 
     return () => {
-      stopPolling();
+      disconnect();
       document.removeEventListener("visibilitychange", handleVisibility);
     };
   }, []);
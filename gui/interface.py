@@ -1,13 +1,19 @@
+import sys, multiprocessing
+
+# child processes of the frozen exe (the API) start through here too
+multiprocessing.freeze_support()
+
+# the frozen exe doubles as the headless tracker, see shared.control
+if "--headless" in sys.argv:
+    from st_tracker.__main__ import main
+    main([])
+    sys.exit()
+
 from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QSystemTrayIcon, QMenu, QDialog, QSpinBox, QLabel, QDialogButtonBox, QCheckBox, QMessageBox
 from PySide6.QtGui import QIcon
-import sys, socket
-from PySide6.QtCore import QThread, QSettings, QTimer
-from st_tracker.worker import TrackerWorker
-from threading import Thread
-from backend.api import run_api
-from backend.database import init_db
-from st_tracker import helper
-import webbrowser
+import socket, threading
+from PySide6.QtCore import QSettings, QTimer, Signal
+from shared.control import ControlClient, connect_or_spawn
 from pathlib import Path
 
 
@@ -55,16 +61,24 @@ class ThresholdDialog(QDialog):
         return self.spin_box.value()
 
 class ButtonHolder(QMainWindow):
+    """
+    Thin client: tracking and the API run in the headless tracker process,
+    this window only sends it commands over the control socket.
+    """
+
+    # (ControlClient or None, error text) from the thread in attach()
+    attached = Signal(object, str)
+
     def __init__(self):
         super().__init__()
         self.settings = QSettings("ScreenTime", "ScreenTimeApp")
-        init_db()
+        # None until attach() has found or started the tracker
+        self.control = None
+        self.attached.connect(self.on_attached)
         self.setWindowTitle("WinTrack")
         self.setWindowIcon(QIcon(str(ICON_PATH)))
         self.setFixedSize(300, 200)
 
-        saved_threshold_val = helper.read()
-
         btn_reset = QPushButton("Reset")
         btn_reset.clicked.connect(self.handle_reset)
 
@@ -115,6 +129,9 @@ class ButtonHolder(QMainWindow):
         vewiStats_action = menu.addAction("View Stats")
         vewiStats_action.triggered.connect(self.handle_viewStats)
 
+        close_ui_action = menu.addAction("Close UI (keep tracking)")
+        close_ui_action.triggered.connect(self.close_ui)
+
         exit_action = menu.addAction("Exit")
         exit_action.triggered.connect(self.exit_app)
 
@@ -124,46 +141,81 @@ class ButtonHolder(QMainWindow):
         self.tray.setContextMenu(menu)
         self.tray.show()
 
-
-        #c=Creating QThread
-        self.thread = QThread()
-        self.worker = TrackerWorker(saved_threshold_val)
-
-        #starting FastAPI in Thread
-        self.api_thread = Thread(target=run_api, daemon=True)
-        self.api_thread.start()
-        print("FastAPI server started.")
-
-        #Now worker object belongs to this QThread
-        self.worker.moveToThread(self.thread)
-
-        # When QThread starts, execute worker.run() inside the thread
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.thread.start()
+    def attach(self):
+        """Finds or starts the tracker without holding up the tray."""
+        threading.Thread(target=self._attach, name="attach", daemon=True).start()
+
+    def _attach(self):
+        # a tracker that is already running (headless or from another window) is reused
+        control = ControlClient.connect()
+        if control is None:
+            try:
+
+                # Source - https://stackoverflow.com/a/37360906
+
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.bind(('127.0.0.1', 7777))
+                sock.close()
+
+            except OSError:
+                self.attached.emit(None, "App is already running!")
+                return
+
+            control = connect_or_spawn()
+            if control is None:
+                self.attached.emit(None, "Could not start the tracker!")
+                return
+        self.attached.emit(control, "")
+
+    def on_attached(self, control, error):
+        if error:
+            # show_error() ends in sys.exit(), which Qt may swallow in a slot
+            try:
+                show_error(error)
+            finally:
+                self.tray.hide()
+                QApplication.exit(1)
+        self.control = control
+
+    def send(self, *command):
+        if self.control is None:
+            print("[CONTROL] Tracker not attached yet")
+            return None
+        try:
+            return self.control.call(*command)
+        except (OSError, EOFError) as e:
+            print(f"[CONTROL] Tracker not reachable: {e}")
+            return None
 
     def handle_pause(self):
-        self.worker.pause()
+        self.send("pause")
         print("Tracking paused.")
 
     def handle_resume(self):
-        self.worker.resume()
+        self.send("resume")
         print("Tracking resumed.")
 
     def handle_start(self):
-        self.worker.reset()
-        self.worker.resume()
+        self.send("reset")
+        self.send("resume")
         print("Tracking started fresh!")
 
     def handle_reset(self):
-        self.worker.reset()
+        self.send("reset")
         print("Data reset!")
 
     def handle_viewStats(self):
+        import webbrowser
         webbrowser.open("http://127.0.0.1:7777")
 
     def exit_app(self):
-        self.worker.running = False
+        # the tracker does its last sync and flushes the db on its own
+        self.send("stop")
+        self.close_ui()
+
+    def close_ui(self):
+        if self.control is not None:
+            self.control.close()
         self.tray.hide()
         QApplication.quit()
 
@@ -181,13 +233,16 @@ class ButtonHolder(QMainWindow):
             self.exit_app()
 
     def handle_threshold(self):
-        dialog = ThresholdDialog(self.worker.idle_threshold, self)
+        status = self.send("status")
+        if status is None:
+            return
+        dialog = ThresholdDialog(status["threshold"], self)
         
         if dialog.exec() == QDialog.Accepted:
             new_val = dialog.get_value()
             
-            self.worker.idle_threshold = new_val
-            helper.write(new_val)
+            # the tracker saves it to the config as well
+            self.send("threshold", new_val)
             print(f"Threshold updated to {new_val}s")
 
     def save_checkbox_state(self, is_checked):
@@ -195,21 +250,11 @@ class ButtonHolder(QMainWindow):
 
 
 
-app = QApplication(sys.argv)
-
-try:
-
-    # Source - https://stackoverflow.com/a/37360906
-
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.bind(('127.0.0.1', 7777))
-    sock.close()
-    
-except OSError:
+def show_error(text):
     msg = QMessageBox()
     msg.setIcon(QMessageBox.Critical)
     msg.setWindowTitle("Error")
-    msg.setText("App is already running!\nThis window will close automatically.")
+    msg.setText(text + "\nThis window will close automatically.")
     msg.setStandardButtons(QMessageBox.Ok)
 
     msg.buttonClicked.connect(lambda: sys.exit())
@@ -218,9 +263,14 @@ except OSError:
     QTimer.singleShot(5000, sys.exit)
 
     msg.exec()
+    sys.exit()
 
 
+app = QApplication(sys.argv)
+
+# the tray comes up first, the tracker is attached once the event loop runs
 window = ButtonHolder()
 window.show()
+QTimer.singleShot(0, window.attach)
 
 app.exec()
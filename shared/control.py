@@ -0,0 +1,58 @@
+import secrets, subprocess, sys, time
+from multiprocessing.connection import Client
+from shared.paths import APPDATA_DIR
+
+# the tray GUI talks to the headless tracker through this socket
+CONTROL_ADDRESS = ("127.0.0.1", 7778)
+KEY_PATH = APPDATA_DIR / "control.key"
+
+
+def control_key(create=False):
+    if create:
+        KEY_PATH.write_bytes(secrets.token_bytes(32))
+    return KEY_PATH.read_bytes()
+
+
+class ControlClient:
+    """Sends commands like ("pause",) or ("threshold", 30) to the tracker."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @classmethod
+    def connect(cls):
+        try:
+            return cls(Client(CONTROL_ADDRESS, authkey=control_key()))
+        except (OSError, EOFError):
+            return None
+
+    def call(self, *command):
+        self.conn.send(command)
+        return self.conn.recv()
+
+    def close(self):
+        self.conn.close()
+
+
+def tracker_command():
+    if getattr(sys, "frozen", False):
+        # the frozen exe starts in headless mode with this flag
+        return [sys.executable, "--headless"]
+    return [sys.executable, "-m", "st_tracker"]
+
+def connect_or_spawn(timeout=10):
+    """Attaches to a running tracker, or starts one and waits for it."""
+    client = ControlClient.connect()
+    if client is not None:
+        return client
+
+    flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    subprocess.Popen(tracker_command(), creationflags=flags)
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.2)
+        client = ControlClient.connect()
+        if client is not None:
+            return client
+    return None
@@ -0,0 +1,66 @@
+import json, mmap, struct, zlib
+from shared.paths import APPDATA_DIR
+
+JOURNAL_PATH = APPDATA_DIR / "journal.bin"
+SLOT_SIZE = 32 * 1024
+
+# seq, body length, crc32 of the body
+HEADER = struct.Struct("<QII")
+
+
+class Journal:
+    """
+    Small fixed-size memory-mapped file holding what the tracker has not
+    committed to SQLite yet. Updating it is a copy into the page cache, so
+    it can be done on every wakeup, and the OS keeps it when the process
+    is killed.
+
+    There are two slots written alternately, each with a checksum, so a
+    write torn by a power loss leaves the previous state readable.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.file = open(path, "a+b")
+        if self.file.seek(0, 2) < 2 * SLOT_SIZE:
+            self.file.truncate(2 * SLOT_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 2 * SLOT_SIZE)
+        self.seq = max((seq for seq, _ in self._slots()), default=0)
+        self.last = None
+
+    def _slots(self):
+        for offset in (0, SLOT_SIZE):
+            seq, length, crc = HEADER.unpack_from(self.map, offset)
+            if not seq or length > SLOT_SIZE - HEADER.size:
+                continue
+            body = self.map[offset + HEADER.size:offset + HEADER.size + length]
+            if zlib.crc32(body) == crc:
+                yield seq, body
+
+    def read(self):
+        """The last state written, or None if there is none."""
+        seq, body = max(self._slots(), default=(0, b""))
+        return json.loads(body) if body else None
+
+    def write(self, state):
+        body = json.dumps(state, separators=(",", ":")).encode()
+        if body == self.last:
+            return True
+        if HEADER.size + len(body) > SLOT_SIZE:
+            print(f"[JOURNAL] {len(body)} bytes do not fit, journal not updated")
+            return False
+
+        self.seq += 1
+        offset = (self.seq % 2) * SLOT_SIZE
+        # body first, the header makes the slot valid
+        self.map[offset + HEADER.size:offset + HEADER.size + len(body)] = body
+        HEADER.pack_into(self.map, offset, self.seq, len(body), zlib.crc32(body))
+        self.last = body
+        return True
+
+    def clear(self):
+        self.write({})
+
+    def close(self):
+        self.map.close()
+        self.file.close()
@@ -1,4 +1,94 @@
-from threading import Lock
+import json
+from shared.status import worker_status
 
-stats_data = {}
-stats_lock = Lock() #allows only one function at a time
+# apps shown by name in the daily view, the rest is summed up as "Others"
+TOP_N = 6
+
+
+class Snapshot:
+    """
+    The live stats as of one publish. It is never changed after it is made,
+    publish() builds a new one and swaps the module-level reference, so
+    readers just take `current` and never lock or copy anything.
+
+    totals excludes the running session (app, start). ranked is totals
+    sorted by time without the running app, which keeps growing between
+    publishes and is slotted in on each read instead.
+    """
+
+    __slots__ = ("version", "totals", "app", "start", "status", "ranked", "total", "body", "daily_body")
+
+    def __init__(self, version, totals, app=None, start=None, status=None):
+        self.version = version
+        self.totals = totals
+        self.app = app
+        self.start = start
+        self.status = dict(status or {})
+        self.ranked = sorted(((name, dur) for name, dur in totals.items() if name != app),
+                             key=lambda item: item[1], reverse=True)
+        self.total = sum(totals.values())
+        # what the tracker process puts in shared memory for the API process
+        self.body = json.dumps({
+            "version": version,
+            "totals": totals,
+            "live": {"app": app, "start": start},
+            "status": self.status,
+        }, separators=(",", ":")).encode()
+        # nothing is running, so the daily view is the same until the next publish
+        self.daily_body = None if self.running else json.dumps(self.top()).encode()
+
+    @classmethod
+    def from_dict(cls, data):
+        live = data.get("live") or {}
+        return cls(data.get("version", 0), data.get("totals", {}),
+                   live.get("app"), live.get("start"), data.get("status", worker_status))
+
+    @property
+    def running(self):
+        return self.app is not None and self.start is not None
+
+    def top(self, now=None, n=TOP_N):
+        """Top n apps and "Others" as of now, with the running session added."""
+        top = self.ranked[:n]
+        total = self.total
+        count = len(self.ranked)
+        if self.running:
+            delta = max(0, now - self.start) if now is not None else 0
+            live = (self.app, self.totals.get(self.app, 0) + delta)
+            total += delta
+            count += 1
+            # stable like sorted(): the running app goes after equal ones
+            i = 0
+            while i < len(top) and top[i][1] >= live[1]:
+                i += 1
+            top = (top[:i] + [live] + top[i:])[:n]
+
+        daily = dict(top)
+        if count > n:
+            others = total - sum(dur for _, dur in top)
+            if others > 0:
+                daily["Others"] = others
+        return daily
+
+
+current = Snapshot(0, {})
+
+# called (from the worker thread) after each publish that changed something
+listeners = []
+
+
+def publish(totals, app, start, force=False):
+    """Swaps in a new snapshot and tells the listeners, unless nothing changed."""
+    global current
+    old = current
+    if not force and old.app == app and old.start == start and old.status == worker_status and old.totals == totals:
+        return False
+    current = Snapshot(old.version + 1, dict(totals), app, start, worker_status)
+    for listener in listeners:
+        listener()
+    return True
+
+
+def notify():
+    """Republishes the same stats, for when only worker_status changed."""
+    publish(current.totals, current.app, current.start, force=True)
@@ -0,0 +1,183 @@
+"""
+Counters and histograms for /api/metrics, in the Prometheus text format.
+
+Hot paths keep a reference to their child (the metric for one set of label
+values) and only add to numbers that already exist: observe() is a bisect
+and three additions, nothing is allocated per event. Label children are
+made once, the first time a label value is seen, and label values are
+always from a small fixed set (function names, routes, probes).
+
+Updates are not locked. Each value has a single writer thread or the GIL
+makes the race a lost increment at worst, which is fine for monitoring.
+
+Each process has its own registry. collect() turns it into plain data
+that can be sent over the control socket, render() merges collections
+from several processes into one page.
+"""
+import bisect, functools, os, threading, time
+import psutil
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds, 50 µs to 10 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+registry = {}
+_lock = threading.Lock()
+
+
+class Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # one slot per bound plus +Inf, cumulated when collected
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Family:
+    """A metric name with its label names and one child per label values."""
+
+    def __init__(self, kind, name, help, labels=(), buckets=None, fn=None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = buckets
+        # called when collected, returns the value or {label values: value}
+        self.fn = fn
+        self.children = {}
+        registry[name] = self
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with _lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Value()
+                    self.children[values] = child
+        return child
+
+    def samples(self):
+        if self.fn is not None:
+            result = self.fn()
+            values = result if isinstance(result, dict) else {(): result}
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in values.items()]
+
+        samples = []
+        for key, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, key))
+            if self.kind != "histogram":
+                samples.append((self.name, labels, child.value))
+                continue
+            total = 0
+            for bound, count in zip(self.bounds_labels(), child.counts):
+                total += count
+                samples.append((self.name + "_bucket", dict(labels, le=bound), total))
+            samples.append((self.name + "_sum", labels, child.sum))
+            samples.append((self.name + "_count", labels, child.count))
+        return samples
+
+    def bounds_labels(self):
+        return [repr(float(b)) for b in self.buckets] + ["+Inf"]
+
+
+def _family(kind, name, help, labels, **options):
+    family = registry.get(name) or Family(kind, name, help, labels, **options)
+    # without labels callers get the single child to update directly
+    return family if labels or family.fn else family.labels()
+
+def counter(name, help, labels=(), fn=None):
+    return _family("counter", name, help, labels, fn=fn)
+
+def gauge(name, help, labels=(), fn=None):
+    return _family("gauge", name, help, labels, fn=fn)
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return _family("histogram", name, help, labels, buckets=buckets)
+
+
+def timed(family):
+    """Decorator observing the run time of a function, labelled with its name."""
+    def wrap(fn):
+        child = family.labels(fn.__name__)
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return timed_fn
+    return wrap
+
+
+_process = psutil.Process(os.getpid())
+
+def _cpu_seconds():
+    times = _process.cpu_times()
+    return times.user + times.system
+
+gauge("process_resident_memory_bytes", "Resident memory of the process.", fn=lambda: _process.memory_info().rss)
+counter("process_cpu_seconds_total", "User and system CPU time of the process.", fn=_cpu_seconds)
+
+
+def collect(**const_labels):
+    """The registry as [(name, kind, help, [(sample, labels, value)])], with const_labels on every sample."""
+    families = []
+    for family in list(registry.values()):
+        try:
+            samples = family.samples()
+        except Exception as e:
+            print(f"[METRICS ERROR] {family.name}: {e}")
+            continue
+        for _, labels, _ in samples:
+            labels.update(const_labels)
+        families.append((family.name, family.kind, family.help, samples))
+    return families
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render(*collections):
+    """Prometheus text for collect() results, families of the same name merged."""
+    merged = {}
+    for families in collections:
+        for name, kind, help, samples in families:
+            if name in merged:
+                merged[name][2].extend(samples)
+            else:
+                merged[name] = (kind, help, list(samples))
+
+    lines = []
+    for name, (kind, help, samples) in merged.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample, labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{sample}{{{label_text}}} {float(value)!r}")
+            else:
+                lines.append(f"{sample} {float(value)!r}")
+    return "\n".join(lines) + "\n"
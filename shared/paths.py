@@ -2,7 +2,8 @@ import os
 from pathlib import Path
 import sys
 
-APPDATA_DIR = Path(os.getenv("LOCALAPPDATA")) / "WinTrack"
+# LOCALAPPDATA only exists on Windows, fall back so the tracker core runs elsewhere too
+APPDATA_DIR = Path(os.getenv("LOCALAPPDATA") or Path.home() / ".local" / "share") / "WinTrack"
 APPDATA_DIR.mkdir(parents=True, exist_ok=True)
 
 CONFIG_PATH = APPDATA_DIR / "config.json"
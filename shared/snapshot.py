@@ -0,0 +1,99 @@
+import json, struct, sys, threading, multiprocessing
+from multiprocessing import shared_memory
+
+SNAPSHOT_NAME = "wintrack_live"
+SNAPSHOT_SIZE = 256 * 1024
+
+# seq (odd while a write is in progress), body length, db write generation
+HEADER = struct.Struct("<QIxxxxQ")
+
+
+class SnapshotWriter:
+    """
+    Publishes the live stats of the tracker process as JSON in a block of
+    shared memory, guarded by a sequence number so readers in other
+    processes never see a half-written snapshot and never take a lock.
+    """
+
+    def __init__(self, name=SNAPSHOT_NAME, size=SNAPSHOT_SIZE):
+        try:
+            # left over from a tracker that was killed
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.seq = 0
+        self.generation = 0
+        self.length = 0
+        # the worker publishes bodies and the writer thread generations, the
+        # header is repacked whole so only one of them may touch it at a time
+        self.lock = threading.Lock()
+        HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+
+    def write(self, data):
+        return self.write_body(json.dumps(data, separators=(",", ":")).encode())
+
+    def write_body(self, body):
+        if HEADER.size + len(body) > self.shm.size:
+            print(f"[SNAPSHOT] {len(body)} bytes do not fit, snapshot skipped")
+            return False
+
+        buf = self.shm.buf
+        with self.lock:
+            self.seq += 1
+            HEADER.pack_into(buf, 0, self.seq, self.length, self.generation)
+            buf[HEADER.size:HEADER.size + len(body)] = body
+            self.seq += 1
+            self.length = len(body)
+            HEADER.pack_into(buf, 0, self.seq, self.length, self.generation)
+        return True
+
+    def set_generation(self, generation):
+        with self.lock:
+            self.generation = generation
+            HEADER.pack_into(self.shm.buf, 0, self.seq, self.length, generation)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SnapshotReader:
+    def __init__(self, name=SNAPSHOT_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if sys.platform != "win32" and multiprocessing.parent_process() is None:
+            # only the writer owns the block, don't let this process' resource
+            # tracker unlink it when we exit. Children of the writer share its
+            # tracker, unregistering there would drop the writer's entry
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.seq = None
+        self.data = None
+
+    def version(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def generation(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[2]
+
+    def read(self):
+        """Latest complete snapshot, parsed once per version."""
+        buf = self.shm.buf
+        for _ in range(1000):
+            seq, length, _ = HEADER.unpack_from(buf, 0)
+            if seq == self.seq:
+                return self.data
+            if seq % 2:
+                continue
+            body = bytes(buf[HEADER.size:HEADER.size + length])
+            if HEADER.unpack_from(buf, 0)[0] != seq:
+                continue
+            self.seq = seq
+            self.data = json.loads(body) if body else None
+            return self.data
+        return self.data
+
+    def close(self):
+        self.shm.close()
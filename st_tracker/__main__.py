@@ -0,0 +1,20 @@
+"""
+Headless tracker, no Qt needed:
+
+    python -m st_tracker [--no-api]
+"""
+import argparse, multiprocessing
+from st_tracker.daemon import TrackerDaemon
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m st_tracker")
+    parser.add_argument("--no-api", action="store_true", help="don't start the dashboard API process")
+    args = parser.parse_args(argv)
+
+    TrackerDaemon(api=not args.no_api).run()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
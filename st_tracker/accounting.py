@@ -0,0 +1,162 @@
+# switches shorter than this are not counted for the app being left
+BRIEF_SWITCH = 2.0
+
+
+class UsageAccountant:
+    """
+    Turns foreground/idle/pause events into per-app totals for one day.
+    It never looks at the clock itself, every method gets the event time,
+    so it behaves the same on a live source and on a scripted one.
+
+    Every counted stretch of time is also kept as a closed
+    (start_ts, end_ts, app, title) interval in self.closed until the
+    worker hands it to the database. self.dirty holds the apps those
+    intervals belong to, i.e. the rows the next flush will touch.
+    """
+
+    def __init__(self, totals=None):
+        self.total_info = dict(totals or {})
+        self.closed = []
+        self.dirty = set()
+        self.current_app = None
+        self.current_title = None
+        self.session_start = None
+        # when the current app came to the front, for the brief switch rule
+        self.session_origin = None
+        self.was_idle = False
+        self.paused = False
+        self.paused_time = None
+        # last window seen in front, also while idle or paused
+        self.foreground = None
+
+    def credit(self, start, end):
+        if end > start:
+            app = self.current_app
+            self.total_info[app] = self.total_info.get(app, 0) + (end - start)
+            self.closed.append((start, end, app, self.current_title))
+            self.dirty.add(app)
+
+    def take_closed(self):
+        """
+        Hands out the closed intervals and clears the dirty set. Pieces of
+        one session cut by checkpoints are joined back into one interval.
+        """
+        closed, self.closed = self.closed, []
+        self.dirty = set()
+        merged = []
+        for piece in closed:
+            if merged and merged[-1][1] == piece[0] and merged[-1][2:] == piece[2:]:
+                merged[-1] = (merged[-1][0],) + piece[1:]
+            else:
+                merged.append(piece)
+        return merged
+
+    def give_back(self, closed):
+        """Puts intervals the writer refused back in front, for the next flush."""
+        self.closed[:0] = closed
+        self.dirty.update(piece[2] for piece in closed)
+
+    def _begin(self, now):
+        self.current_app, self.current_title = self.foreground
+        self.session_start = now
+        self.session_origin = now
+
+    def switch(self, app, now, title=None):
+        self.foreground = (app, title)
+        if self.paused or self.was_idle:
+            return
+        if app == self.current_app:
+            return
+
+        if self.current_app is not None and self.session_start is not None:
+            duration = now - self.session_origin
+            if duration > BRIEF_SWITCH:
+                self.credit(self.session_start, now)
+            else:
+                print(f"[CLEANUP] Ignored brief switch to: {self.current_app} ({duration:.2f}s)")
+
+        #new session
+        self._begin(now)
+
+    def idle(self, now, since):
+        if self.was_idle:
+            return
+        if self.current_app and self.session_start is not None and not self.paused:
+            # count up to the last input, not up to when we noticed
+            self.credit(self.session_start, min(since, now))
+        self.session_start = None
+        self.was_idle = True
+
+    def active(self, now):
+        if not self.was_idle:
+            return
+        self.was_idle = False
+        if self.foreground is not None and not self.paused:
+            self._begin(now)
+        else:
+            self.current_app = None
+            self.session_start = None
+
+    def pause(self, now):
+        if not self.paused:
+            self.close_session(now)
+            self.session_start = None
+            self.paused = True
+            self.paused_time = now
+
+    def resume(self, now):
+        if not self.paused:
+            return
+        self.paused = False
+        self.paused_time = None
+
+        if self.was_idle or self.foreground is None:
+            return
+        # paused time is not counted, the session picks up from here,
+        # or a switch that happened while paused is applied now
+        if self.foreground[0] == self.current_app:
+            self.session_start = now
+        else:
+            self._begin(now)
+
+    def reset(self, now):
+        self.total_info = {}
+        self.closed = []
+        self.dirty = set()
+        self.current_app = None
+        self.session_start = None
+        if not (self.paused or self.was_idle) and self.foreground is not None:
+            self._begin(now)
+
+    def checkpoint(self, upto):
+        """
+        Closes the part of the running session up to `upto` so it can be
+        written, the session goes on from there. Sessions still short enough
+        to be dropped as a brief switch are left alone.
+        """
+        if self.session_start is None or upto <= self.session_start:
+            return
+        if upto - self.session_origin > BRIEF_SWITCH:
+            self.close_session(upto)
+
+    def close_session(self, now):
+        """Credits the running session up to now and starts a new one there."""
+        if self.current_app is not None and self.session_start is not None and not self.paused:
+            self.credit(self.session_start, now)
+            self.session_start = now
+
+    def new_day(self, totals, now):
+        self.close_session(now)
+        self.total_info = dict(totals or {})
+
+    def live_delta(self, now):
+        if self.current_app is None or self.session_start is None or self.paused:
+            return 0.0
+        return max(0.0, now - self.session_start)
+
+    def live_totals(self, now):
+        totals = self.total_info.copy()
+        delta = self.live_delta(now)
+        if delta > 0:
+            totals[self.current_app] = totals.get(self.current_app, 0) + delta
+        return totals
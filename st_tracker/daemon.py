@@ -0,0 +1,151 @@
+import signal, threading, multiprocessing
+from multiprocessing.connection import Listener
+from backend.database import init_db, close_db, writer, apply_categories
+from shared import memory, metrics
+from shared.control import CONTROL_ADDRESS, control_key
+from shared.journal import Journal
+from shared.snapshot import SnapshotWriter, SNAPSHOT_NAME
+from st_tracker import helper
+from st_tracker.worker import TrackerWorker
+
+# history maintenance waits for startup to settle, then runs a few times a day
+MAINTENANCE_DELAY = 10 * 60
+MAINTENANCE_INTERVAL = 6 * 3600
+
+
+def serve_api(snapshot_name):
+    # imported here so the tracker process itself never loads the web stack
+    from backend.api import run_api
+    run_api(snapshot_name)
+
+
+class TrackerDaemon:
+    """
+    Runs the tracker without Qt. Live stats go to a shared-memory snapshot
+    that the API process reads, and the tray GUI (if any) drives it through
+    the control socket.
+    """
+
+    def __init__(self, api=True, source=None):
+        self.api = api
+        self.api_process = None
+        self.listener = None
+        self.stopping = threading.Event()
+
+        # also replays the journal of a tracker that was killed
+        init_db()
+        self.load_categories()
+        self.snapshot = SnapshotWriter(SNAPSHOT_NAME)
+        self.journal = Journal()
+        self.worker = TrackerWorker(helper.read(), source, self.journal)
+
+        memory.listeners.append(self.write_snapshot)
+        writer.on_commit.append(self.snapshot.set_generation)
+
+    def load_categories(self):
+        try:
+            apply_categories(helper.read_categories())
+        except ValueError as e:
+            # a broken rule leaves everything uncategorized until it is fixed
+            print(f"[CATEGORIES ERROR] {e}")
+            apply_categories([])
+
+    def write_snapshot(self):
+        # already serialized when it was published
+        self.snapshot.write_body(memory.current.body)
+
+    def handle(self, command, *args):
+        if command == "pause":
+            self.worker.pause()
+        elif command == "resume":
+            self.worker.resume()
+        elif command == "reset":
+            self.worker.reset()
+        elif command == "threshold":
+            self.worker.idle_threshold = args[0]
+            helper.write(args[0])
+        elif command == "stop":
+            self.worker.stop()
+        elif command == "categories":
+            # the API saved new rules (or merged apps in), reclassify
+            self.load_categories()
+        elif command == "metrics":
+            # rendered together with its own by the API's /api/metrics
+            return metrics.collect(process="tracker")
+        elif command != "status":
+            return {"error": f"unknown command {command}"}
+        return {"threshold": self.worker.idle_threshold, "paused": self.worker.paused,
+                "sync": self.worker.sync_stats(), "app_names": self.worker.app_names.stats()}
+
+    def serve_client(self, conn):
+        with conn:
+            while True:
+                try:
+                    command = conn.recv()
+                except (EOFError, OSError):
+                    return
+                conn.send(self.handle(*command))
+
+    def serve_control(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                # closed on shutdown, or a client with the wrong key
+                if self.listener is None:
+                    return
+                continue
+            threading.Thread(target=self.serve_client, args=(conn,), daemon=True).start()
+
+    def maintain(self):
+        # only needed minutes after startup
+        from backend.maintenance import run_maintenance
+        delay = MAINTENANCE_DELAY
+        while not self.stopping.wait(delay):
+            delay = MAINTENANCE_INTERVAL
+            try:
+                report = run_maintenance(helper.read_retention(), stop=self.stopping)
+                print(f"[MAINTENANCE] {report}")
+            except Exception as e:
+                print(f"[MAINTENANCE ERROR] {e}")
+
+    def start_api(self):
+        # tracking comes first, the web stack loads after the first tick
+        self.worker.started.wait()
+        if self.stopping.is_set() or not self.worker.running:
+            return
+        self.api_process = multiprocessing.Process(target=serve_api, args=(SNAPSHOT_NAME,), name="wintrack-api", daemon=True)
+        self.api_process.start()
+        print("FastAPI server started.")
+
+    def run(self):
+        threading.Thread(target=self.maintain, name="maintenance", daemon=True).start()
+        self.listener = Listener(CONTROL_ADDRESS, authkey=control_key(create=True))
+        threading.Thread(target=self.serve_control, name="control", daemon=True).start()
+
+        if self.api:
+            threading.Thread(target=self.start_api, name="start-api", daemon=True).start()
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda *_: self.worker.stop())
+            signal.signal(signal.SIGTERM, lambda *_: self.worker.stop())
+
+        try:
+            self.worker.run()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.stopping.set()
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+        if self.api_process is not None:
+            self.api_process.terminate()
+            self.api_process.join(5)
+        close_db()
+        if writer.all_committed():
+            # everything is committed, nothing to replay next time
+            self.journal.clear()
+        self.journal.close()
+        self.snapshot.close()
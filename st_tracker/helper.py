@@ -1,23 +1,76 @@
 import json
 from shared.paths import CONFIG_PATH
 
+# history maintenance, ages in days, 0 turns a step off. The steps that
+# throw detail away are off until the user sets an age
+RETENTION_DEFAULTS = {
+    # the per-interval session log (titles) is kept this long
+    "sessions_days": 0,
+    # older weeks keep only their top apps per day, the rest becomes "Others"
+    "downsample_days": 0,
+    "downsample_top": 10,
+    # older months move out of SQLite into compressed yearly archive files
+    "archive_days": 0,
+    # longest a single incremental vacuum pass may hold the database
+    "vacuum_step_ms": 50,
+}
+
+# app categories, see backend.categories for the rule format
+CATEGORY_DEFAULTS = [
+    {"category": "Browsers", "proc": ["chrome.exe", "firefox.exe", "msedge.exe", "brave.exe", "opera.exe", "vivaldi.exe"]},
+    {"category": "IDE", "proc": ["code.exe", "devenv.exe", "pycharm*.exe", "idea*.exe", "webstorm*.exe",
+                                 "rider*.exe", "clion*.exe", "sublime_text.exe", "notepad++.exe"]},
+    {"category": "Terminal", "proc": ["windowsterminal.exe", "cmd.exe", "powershell.exe", "pwsh.exe", "wsl.exe"]},
+    {"category": "Communication", "proc": ["slack.exe", "discord.exe", "teams.exe", "ms-teams.exe", "zoom.exe",
+                                           "telegram.exe", "whatsapp.exe", "outlook.exe", "thunderbird.exe"]},
+    {"category": "Office", "proc": ["winword.exe", "excel.exe", "powerpnt.exe", "onenote.exe", "acrobat.exe", "notion.exe"]},
+    {"category": "Games", "proc": ["steam.exe", "epicgameslauncher.exe", "re:.*-win64-shipping\\.exe"]},
+]
 
-def read():
-    if not CONFIG_PATH.exists():
-        default_data = {"threshold_time": 60}
-        CONFIG_PATH.write_text(json.dumps(default_data))
-        return 60
 
+def _load():
     try:
         with open(CONFIG_PATH, "r") as f:
             data = json.load(f)
-            return data.get("threshold_time", 60)
-    except (json.JSONDecodeError, KeyError):
-        default_data = {"threshold_time": 60}
+        if isinstance(data, dict):
+            return data
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return None
+
+
+def read():
+    data = _load()
+    if data is None:
+        default_data = {"threshold_time": 60, "retention": dict(RETENTION_DEFAULTS),
+                        "categories": CATEGORY_DEFAULTS}
         CONFIG_PATH.write_text(json.dumps(default_data))
         return 60
+    return data.get("threshold_time", 60)
+
+
+def read_retention():
+    """Retention settings, with the defaults for anything not in the config."""
+    settings = dict(RETENTION_DEFAULTS)
+    settings.update((_load() or {}).get("retention") or {})
+    return settings
+
+
+def read_categories():
+    """The category rules, the defaults when the config has none."""
+    rules = (_load() or {}).get("categories")
+    return CATEGORY_DEFAULTS if rules is None else rules
+
+
+def write_categories(rules):
+    # keeps the other settings
+    data = _load() or {}
+    data["categories"] = rules
+    CONFIG_PATH.write_text(json.dumps(data))
 
 
 def write(new_threshold):
-    data = {"threshold_time": new_threshold}
-    CONFIG_PATH.write_text(json.dumps(data))
\ No newline at end of file
+    # keeps the other settings
+    data = _load() or {}
+    data["threshold_time"] = new_threshold
+    CONFIG_PATH.write_text(json.dumps(data))
@@ -0,0 +1,104 @@
+import time
+import psutil
+from collections import OrderedDict
+from shared import metrics
+
+PROCESS_ERRORS = (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess)
+
+# named caches, reported on /api/metrics
+caches = {}
+
+PROBE_SECONDS = metrics.histogram("wintrack_probe_seconds", "Latency of Win32 and psutil lookups.", ["probe"])
+PROCESS_PROBE = PROBE_SECONDS.labels("process")
+
+metrics.counter("wintrack_cache_hits_total", "Lookups answered from a cache.", ["cache"],
+                fn=lambda: {(name, ): cache.hits for name, cache in caches.items()})
+metrics.counter("wintrack_cache_misses_total", "Lookups that missed a cache.", ["cache"],
+                fn=lambda: {(name, ): cache.misses for name, cache in caches.items()})
+metrics.gauge("wintrack_cache_hit_ratio", "Hits / lookups of a cache since start.", ["cache"],
+              fn=lambda: {(name, ): cache.hits / max(1, cache.hits + cache.misses) for name, cache in caches.items()})
+
+
+class LRU:
+    """Bounded mapping that drops the least recently used key, with counters."""
+
+    def __init__(self, maxsize=256, name=None):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if name is not None:
+            caches[name] = self
+
+    def get(self, key, valid=None):
+        """The value of key, valid(value) False drops it and counts as a miss."""
+        value = self.entries.get(key)
+        if value is not None and valid is not None and not valid(value):
+            del self.entries[key]
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {"size": len(self.entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+class ProcessNames:
+    """
+    Executable name of a pid. Windows hands out pids again once a process
+    is gone, so each name is stored with its process' create time: a new
+    process on an old pid is a miss instead of the old process' name.
+
+    Asking for the create time is a syscall too, so it is only checked when
+    the pid turns up under another window than last time (or without one).
+    A window belongs to one process for its whole life, so the same window
+    and pid are the same process.
+
+    process(pid) must behave like psutil.Process, which is also where the
+    create time comes from.
+    """
+
+    def __init__(self, maxsize=256, process=psutil.Process, name=None):
+        self.process = process
+        # pid -> [create_time, hwnd, name]
+        self.cache = LRU(maxsize, name)
+
+    def name(self, pid, hwnd=None):
+        start = time.perf_counter()
+        proc = None
+
+        def same_process(entry):
+            nonlocal proc
+            if hwnd is not None and entry[1] == hwnd:
+                return True
+            proc = self.process(pid)
+            if proc.create_time() != entry[0]:
+                return False
+            entry[1] = hwnd
+            return True
+
+        try:
+            entry = self.cache.get(pid, same_process)
+            if entry is not None:
+                return entry[2]
+            proc = proc or self.process(pid)
+            name = proc.name()
+            self.cache.put(pid, [proc.create_time(), hwnd, name])
+            return name
+        except PROCESS_ERRORS:
+            return "Unknown"
+        finally:
+            PROCESS_PROBE.observe(time.perf_counter() - start)
@@ -0,0 +1,221 @@
+import sys, time, queue
+from collections import namedtuple, deque
+
+# Events handed to TrackerWorker. ts is when the thing actually happened.
+Foreground = namedtuple("Foreground", "ts title proc")
+Idle = namedtuple("Idle", "ts since")  # since = time of the last input
+Active = namedtuple("Active", "ts")
+Pause = namedtuple("Pause", "ts")
+Resume = namedtuple("Resume", "ts")
+Reset = namedtuple("Reset", "ts")
+
+# while idle there is no event for "input came back", so we check this often
+IDLE_POLL = 1.0
+
+
+class ActivitySource:
+    """
+    Something that produces foreground/idle events for the worker.
+    next_event(timeout) blocks until an event arrives or the timeout runs out,
+    in which case it returns None.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.idle_threshold = 60
+        self.started_at = None
+        self.wakeups = 0
+        self.events = 0
+        self.switches = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def now(self):
+        return time.time()
+
+    def start(self):
+        self.started_at = self.now()
+
+    def stop(self):
+        pass
+
+    @property
+    def finished(self):
+        # live sources never run out of events
+        return False
+
+    def post(self, event):
+        """Injects a control event (pause, reset, ...) from another thread."""
+        raise NotImplementedError
+
+    def wake(self):
+        self.post(None)
+
+    def next_event(self, timeout):
+        raise NotImplementedError
+
+    def _delivered(self, event, seen_at=None):
+        self.events += 1
+        if isinstance(event, Foreground):
+            latency = max(0.0, (seen_at if seen_at is not None else self.now()) - event.ts)
+            self.switches += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        return event
+
+    def stats(self):
+        elapsed = (self.now() - self.started_at) if self.started_at else 0
+        hours = elapsed / 3600 if elapsed > 0 else None
+        return {
+            "backend": self.name,
+            "elapsed": elapsed,
+            "wakeups": self.wakeups,
+            "wakeups_per_hour": self.wakeups / hours if hours else 0.0,
+            "events": self.events,
+            "switches": self.switches,
+            "switch_latency_avg": self.latency_total / self.switches if self.switches else 0.0,
+            "switch_latency_max": self.latency_max,
+        }
+
+
+class QueueSource(ActivitySource):
+    """Base for live sources where some other thread feeds a queue."""
+
+    def __init__(self):
+        super().__init__()
+        self.queue = queue.Queue()
+
+    def post(self, event):
+        self.queue.put(event)
+
+    def _wait(self, timeout):
+        self.wakeups += 1
+        try:
+            return self.queue.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return None
+
+
+class PollingSource(QueueSource):
+    """
+    The old fixed-interval loop, kept so it can be measured against the
+    event-driven backends. probe() returns (title, proc, idle_seconds).
+    """
+
+    name = "polling"
+
+    def __init__(self, probe, interval=1.0):
+        super().__init__()
+        self.probe = probe
+        self.interval = interval
+        self.last = None
+        self.idle = False
+        self.ready = deque()
+
+    def next_event(self, timeout):
+        if self.ready:
+            return self.ready.popleft()
+
+        posted = self._wait(min(timeout, self.interval))
+        if posted is not None:
+            return self._delivered(posted)
+
+        now = self.now()
+        title, proc, idle_time = self.probe()
+        if not self.idle and idle_time > self.idle_threshold:
+            self.idle = True
+            self.ready.append(self._delivered(Idle(now, now - idle_time)))
+        elif self.idle and idle_time < self.idle_threshold:
+            self.idle = False
+            self.ready.append(self._delivered(Active(now)))
+
+        if (title, proc) != self.last:
+            self.last = (title, proc)
+            self.ready.append(self._delivered(Foreground(now, title, proc)))
+
+        return self.ready.popleft() if self.ready else None
+
+
+class ScriptedSource(ActivitySource):
+    """
+    Replays a list of events on a virtual clock, so the whole tracker runs
+    on any OS and a day of activity takes milliseconds.
+
+    With poll_interval set it behaves like the old polling loop instead:
+    events only become visible on the next tick and a foreground change that
+    is superseded before the tick is lost (counted in self.missed).
+    """
+
+    name = "scripted"
+
+    def __init__(self, events, start=None, poll_interval=None):
+        super().__init__()
+        self.script = deque(sorted(events, key=lambda e: e.ts))
+        if start is None:
+            start = self.script[0].ts if self.script else 0.0
+        self.clock = start
+        self.poll_interval = poll_interval
+        self.posted = deque()
+        self.ready = deque()
+        self.missed = 0
+        if poll_interval:
+            self.name = f"scripted-poll-{poll_interval:g}s"
+
+    def now(self):
+        return self.clock
+
+    def post(self, event):
+        if event is not None:
+            self.posted.append(event)
+
+    @property
+    def finished(self):
+        return not (self.script or self.posted or self.ready)
+
+    def next_event(self, timeout):
+        if self.posted:
+            return self._delivered(self.posted.popleft())
+        if self.ready:
+            return self.ready.popleft()
+
+        self.wakeups += 1
+        if self.poll_interval:
+            return self._poll_tick()
+
+        if self.script and self.script[0].ts <= self.clock + timeout:
+            event = self.script.popleft()
+            self.clock = max(self.clock, event.ts)
+            return self._delivered(event)
+
+        self.clock += timeout
+        return None
+
+    def _poll_tick(self):
+        self.clock += self.poll_interval
+        due = []
+        while self.script and self.script[0].ts <= self.clock:
+            due.append(self.script.popleft())
+
+        # a poll only sees the window that is in front right now
+        foregrounds = [e for e in due if isinstance(e, Foreground)]
+        self.missed += max(0, len(foregrounds) - 1)
+        for event in due:
+            if isinstance(event, Foreground) and event is not foregrounds[-1]:
+                continue
+            self._delivered(event, seen_at=self.clock)
+            self.ready.append(event._replace(ts=self.clock))
+
+        return self.ready.popleft() if self.ready else None
+
+    def stats(self):
+        stats = super().stats()
+        stats["missed_switches"] = self.missed
+        return stats
+
+
+def default_source():
+    if sys.platform == "win32":
+        from st_tracker.win32_source import Win32Source
+        return Win32Source()
+    raise RuntimeError("No live activity source for this platform, use ScriptedSource")
@@ -0,0 +1,40 @@
+"""
+Activity traces for ScriptedSource, one JSON object per line:
+
+    {"event": "foreground", "ts": 1709539200.0, "title": "main.py - Code", "proc": "Code.exe"}
+    {"event": "idle", "ts": 1709539800.0, "since": 1709539740.0}
+    {"event": "active", "ts": 1709540100.0}
+    {"event": "pause", "ts": ...}, {"event": "resume", "ts": ...}, {"event": "reset", "ts": ...}
+
+ts is a unix timestamp, so traces replay the same on any machine in the
+same timezone.
+"""
+import json
+from st_tracker.sources import Foreground, Idle, Active, Pause, Resume, Reset
+
+EVENTS = {
+    "foreground": Foreground,
+    "idle": Idle,
+    "active": Active,
+    "pause": Pause,
+    "resume": Resume,
+    "reset": Reset,
+}
+NAMES = {cls: name for name, cls in EVENTS.items()}
+
+
+def to_record(event):
+    return {"event": NAMES[type(event)], **event._asdict()}
+
+def from_record(record):
+    record = dict(record)
+    return EVENTS[record.pop("event")](**record)
+
+def dump_trace(events, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(to_record(event)) + "\n")
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        return [from_record(json.loads(line)) for line in f if line.strip()]
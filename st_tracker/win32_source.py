@@ -0,0 +1,139 @@
+import ctypes, threading, time, win32api, win32gui, win32process
+from ctypes import wintypes
+from st_tracker.sources import QueueSource, Foreground, Idle, Active, IDLE_POLL
+from st_tracker.resolver import ProcessNames, PROBE_SECONDS
+
+WINDOW_PROBE = PROBE_SECONDS.labels("window")
+IDLE_PROBE = PROBE_SECONDS.labels("idle")
+POLL_PROBE = PROBE_SECONDS.labels("poll")
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+WINEVENT_OUTOFCONTEXT = 0x0000
+WM_QUIT = 0x0012
+
+user32 = ctypes.windll.user32
+kernel32 = ctypes.windll.kernel32
+
+WinEventProc = ctypes.WINFUNCTYPE(
+    None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+    wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD,
+)
+user32.SetWinEventHook.restype = wintypes.HANDLE
+user32.SetWinEventHook.argtypes = [
+    wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WinEventProc,
+    wintypes.DWORD, wintypes.DWORD, wintypes.DWORD,
+]
+
+
+class Win32Source(QueueSource):
+    """
+    Foreground changes come from a SetWinEventHook(EVENT_SYSTEM_FOREGROUND)
+    running on its own message-loop thread, so we only wake up when something
+    happens. Idle is checked with GetLastInputInfo right when it could
+    cross the threshold, and once a second while the user is away.
+    """
+
+    name = "win32"
+
+    def __init__(self):
+        super().__init__()
+        self.hook_thread = None
+        self.hook_thread_id = None
+        self.idle = False
+        self.names = ProcessNames(name="pid")
+
+    def start(self):
+        super().start()
+        ready = threading.Event()
+        self.hook_thread = threading.Thread(target=self._hook_loop, args=(ready,), name="win-event-hook", daemon=True)
+        self.hook_thread.start()
+        ready.wait(2)
+        # the hook only reports changes, so seed with whatever is in front now
+        self.post(Foreground(self.now(), *self.describe(win32gui.GetForegroundWindow())))
+
+    def stop(self):
+        if self.hook_thread_id is not None:
+            user32.PostThreadMessageW(self.hook_thread_id, WM_QUIT, 0, 0)
+            self.hook_thread.join(2)
+            self.hook_thread_id = None
+
+    def _hook_loop(self, ready):
+        self.hook_thread_id = kernel32.GetCurrentThreadId()
+        # keep a reference, ctypes callbacks die with their python object
+        self._callback = WinEventProc(self._on_foreground)
+        hook = user32.SetWinEventHook(
+            EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND, 0,
+            self._callback, 0, 0, WINEVENT_OUTOFCONTEXT,
+        )
+        ready.set()
+
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+        user32.UnhookWinEvent(hook)
+
+    def _on_foreground(self, hook, event, hwnd, id_object, id_child, thread, ms_time):
+        # ms_time is GetTickCount() at the moment of the switch
+        age = ((win32api.GetTickCount() - ms_time) & 0xFFFFFFFF) / 1000.0
+        self.post(Foreground(self.now() - age, *self.describe(hwnd)))
+
+    def describe(self, hwnd):
+        start = time.perf_counter()
+        title = win32gui.GetWindowText(hwnd)
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        WINDOW_PROBE.observe(time.perf_counter() - start)
+        return title, self.names.name(pid, hwnd)
+
+    def stats(self):
+        stats = super().stats()
+        stats["pid_cache"] = self.names.cache.stats()
+        return stats
+
+    def get_idle_time(self):
+        start = time.perf_counter()
+        last_input_time = win32api.GetLastInputInfo()
+        current_tick = win32api.GetTickCount()
+        IDLE_PROBE.observe(time.perf_counter() - start)
+        return ((current_tick - last_input_time) & 0xFFFFFFFF) / 1000.0
+
+    def _check_idle(self):
+        idle_time = self.get_idle_time()
+        now = self.now()
+        if not self.idle and idle_time > self.idle_threshold:
+            self.idle = True
+            return Idle(now, now - idle_time)
+        if self.idle and idle_time < self.idle_threshold:
+            self.idle = False
+            return Active(now)
+        return None
+
+    def next_event(self, timeout):
+        change = self._check_idle()
+        if change is not None:
+            return self._delivered(change)
+
+        if self.idle:
+            wait = min(timeout, IDLE_POLL)
+        else:
+            # sleep until the idle threshold could be crossed at the earliest
+            wait = min(timeout, self.idle_threshold - self.get_idle_time() + 0.05)
+
+        event = self._wait(wait)
+        if event is None:
+            change = self._check_idle()
+            return self._delivered(change) if change is not None else None
+        return self._delivered(event)
+
+
+_probe_names = ProcessNames(name="pid")
+
+def win32_probe():
+    start = time.perf_counter()
+    hwnd = win32gui.GetForegroundWindow()
+    title = win32gui.GetWindowText(hwnd)
+    _, pid = win32process.GetWindowThreadProcessId(hwnd)
+    proc = _probe_names.name(pid, hwnd)
+    idle = (win32api.GetTickCount() - win32api.GetLastInputInfo()) / 1000.0
+    POLL_PROBE.observe(time.perf_counter() - start)
+    return title, proc, idle
@@ -1,200 +1,290 @@
-from PySide6.QtCore import QObject, Signal
-import time, psutil, win32gui, win32process, win32api
-from shared.memory import stats_data, stats_lock
-from backend.database import get_today_data, add_today_usage, bulk_save_usage
-from datetime import date
+import threading, time
+from datetime import date, datetime, timedelta
+from shared import memory, metrics
+from backend.database import get_today_data, queue_sessions, queue_apps, clear_day, is_committed
+from st_tracker.accounting import UsageAccountant, BRIEF_SWITCH
+from st_tracker.resolver import LRU
+from st_tracker.sources import default_source, Foreground, Idle, Active, Pause, Resume, Reset
 from shared.status import *
 
-class TrackerWorker(QObject):
-  update = Signal(dict)
-  finished = Signal()
+LOOP_SECONDS = metrics.histogram("wintrack_loop_seconds", "Work done per tracker loop wakeup, without the wait.")
+SYNC_SECONDS = metrics.histogram("wintrack_sync_seconds", "Duration of perform_sync().")
+SYNC_ROWS = metrics.counter("wintrack_sync_rows_total", "Rows handed to the database writer.", ["table"])
+SESSION_ROWS = SYNC_ROWS.labels("sessions")
+USAGE_ROWS = SYNC_ROWS.labels("daily_usage")
+metrics.gauge("wintrack_worker_running", "1 while the tracker loop runs.", fn=lambda: int(worker_status["running"] is True))
 
-  def __init__(self, initial_threshold):
-    super().__init__()
-    self.idle_threshold = initial_threshold
+# switches, idle and midnight flush right away, this only bounds how stale
+# the DB gets while one app stays in front
+MAX_STALENESS = 300
+# how often the crash journal is refreshed while a session is running
+JOURNAL_INTERVAL = 10
+
+class TrackerWorker:
+  """
+  Consumes events from an ActivitySource and keeps today's per-app totals.
+  It only wakes up for an event, a sync or midnight, never on a fixed tick.
+
+  Only what changed since the last flush is written: the sessions closed by
+  a switch, idle, pause or midnight, and a checkpoint of the running one
+  once it is max_staleness old.
+  """
+
+  def __init__(self, initial_threshold, source=None, journal=None):
+    self.source = source or default_source()
+    self.source.idle_threshold = initial_threshold
 
     self.running = True
-    self.reset_flag = False
-    self.paused = False
-    self.was_idle = False
+    # set once the first snapshot is published, the daemon starts the rest after it
+    self.started = threading.Event()
+    # (proc, title) -> app name, see resolve_app()
+    self.app_names = LRU(512, "app_names")
+    # (app, proc, title) resolved since the last sync, the database
+    # classifies apps into categories by them
+    self.new_apps = []
 
-    
-    self.last_sync_time = time.time()
-    self.loop_count = 0
-    self.current_day = date.today()
+    # shared.journal.Journal, or None to run without one
+    self.journal = journal
+    # (ticket, sessions) handed to the writer but not committed yet
+    self.in_flight = []
 
-    self.current_app = None
-    self.session_start = None
-    self.total_info = {}
-    self.pid_cache = {}
+    now = self.source.now()
+    self.last_sync_time = now
+    self.max_staleness = MAX_STALENESS
+    # False gives the old behaviour of only writing on the staleness timer
+    self.flush_on_change = True
+    # set while the writer refuses batches, then only the timer retries
+    self.backlogged = False
 
-    self.total_info = get_today_data()
+    # what went to the writer, see sync_stats()
+    self.started_at = now
+    self.flushes = 0
+    self.session_rows = 0
+    self.usage_rows = 0
+    self.current_day = date.fromtimestamp(now)
+
+    self.accountant = UsageAccountant(get_today_data(self.current_day.isoformat()))
 
     print("[DB LOADED]", self.total_info)
 
-  def get_active_window(self):
-    hwnd = win32gui.GetForegroundWindow()
-    title = win32gui.GetWindowText(hwnd)
-    try:
-      _, pid = win32process.GetWindowThreadProcessId(hwnd)
-      if pid in self.pid_cache:
-         proc_name = self.pid_cache[pid] #calling the cache instead of calling psutil every single time
-      else:
-         proc_name = psutil.Process(pid).name()
-         self.pid_cache[pid] = proc_name
-    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-       proc_name = "Unknown"
-
-    return hwnd, title, proc_name
-  
+  @property
+  def idle_threshold(self):
+    return self.source.idle_threshold
+
+  @idle_threshold.setter
+  def idle_threshold(self, value):
+    self.source.idle_threshold = value
+    self.source.wake()
+
+  @property
+  def total_info(self):
+    return self.accountant.total_info
+
+  @property
+  def current_app(self):
+    return self.accountant.current_app
+
+  @property
+  def paused(self):
+    return self.accountant.paused
+
   def normalize_win32_name(self, proc):
       name = proc.replace(".exe", "")
       return name.capitalize()
-  
+
+  def resolve_app(self, title, proc):
+      # only UWP apps are named after their title, everything else only
+      # depends on the exe, so that is all the key holds for them
+      uwp = proc.lower() == "applicationframehost.exe"
+      key = (proc, title) if uwp else proc
+      app = self.app_names.get(key)
+      if app is None:
+          app = self._resolve_app(title, proc, uwp)
+          self.app_names.put(key, app)
+          self.new_apps.append((app, proc, title if uwp else None))
+      return app
+
+  def _resolve_app(self, title, proc, uwp):
+      if uwp:
+          #reutnring title if the app is an UWP app
+          return title if title.strip() != "" else "Windows System App"
+
+      app = self.normalize_win32_name(proc)
+      if not app or app == "Unknown":
+          app = "System Idle"
+      return app
+
+  # these are called from the GUI thread, so they only post an event
   def pause(self):
-      if not self.paused:
-        self.paused = True
-        self.paused_time = time.time()
+      self.source.post(Pause(self.source.now()))
 
   def resume(self):
-      if self.paused:
-        paused_duration = time.time() - self.paused_time
-        
-        # shifting the session start forward so paused time is not counted
-        if self.session_start is not None:
-            self.session_start += paused_duration
-        
-        self.paused = False
-        self.paused_time = None
+      self.source.post(Resume(self.source.now()))
 
   def reset(self):
-      self.reset_flag = True
+      self.source.post(Reset(self.source.now()))
+
+  def stop(self):
+      self.running = False
+      self.source.wake()
 
   def perform_sync(self, now):
-      """Prepares a batch and sends it to the DB in one shot."""
-      sync_batch = []
-      for app, total in self.total_info.items():
-          val = total
-          # Add live progress for the active app so the DB is 100% current
-          if app == self.current_app and self.session_start:
-              val += (now - self.session_start)
-          sync_batch.append((app, val))
-      
-      if sync_batch:
-          # We are going to write this 'bulk_save_usage' in database.py next
-          bulk_save_usage(sync_batch)
-  
-  def get_idle_time(self):
-     last_input_time = win32api.GetLastInputInfo()
-     current_tick = win32api.GetTickCount()
-     idle_seconds = (current_tick - last_input_time) / 1000.0
-     return idle_seconds
+      """Sends the sessions closed since the last flush to the DB in one shot."""
+      start = time.perf_counter()
+      try:
+          self._sync(now)
+      finally:
+          SYNC_SECONDS.observe(time.perf_counter() - start)
+
+  def _sync(self, now):
+      acc = self.accountant
+      # cut the running session so the DB is current. An idle period we have not
+      # noticed yet can only start within the last idle_threshold seconds,
+      # so stop there instead of logging time we might have to take back
+      acc.checkpoint(now - self.idle_threshold)
+      dirty = len(acc.dirty)
+      sync_batch = acc.take_closed()
+      self.last_sync_time = now
+      if self.new_apps and queue_apps(self.new_apps):
+          self.new_apps = []
+      if not sync_batch:
+          return
+
+      # handed to the db writer thread, so the loop never waits on sqlite
+      ticket = queue_sessions(sync_batch)
+      if not ticket:
+          # writer is backed up, keep them for the next sync
+          acc.give_back(sync_batch)
+          self.backlogged = True
+          return
+
+      self.backlogged = False
+      if self.journal is not None:
+          self.in_flight.append((ticket, sync_batch))
+      self.flushes += 1
+      self.session_rows += len(sync_batch)
+      self.usage_rows += dirty
+      SESSION_ROWS.inc(len(sync_batch))
+      USAGE_ROWS.inc(dirty)
+
+  def should_flush(self, now):
+      # a switch, idle or pause just closed a session, write it while it is fresh
+      if self.flush_on_change and self.accountant.closed and not self.backlogged:
+          return True
+      return now - self.last_sync_time >= self.max_staleness
+
+  def sync_stats(self, now=None):
+      """Rows handed to the writer so far, to compare flush policies."""
+      now = self.source.now() if now is None else now
+      hours = (now - self.started_at) / 3600
+      rows = self.session_rows + self.usage_rows
+      return {
+          "flushes": self.flushes,
+          "session_rows": self.session_rows,
+          "usage_rows": self.usage_rows,
+          "rows_per_hour": rows / hours if hours > 0 else 0.0,
+          "flushes_per_hour": self.flushes / hours if hours > 0 else 0.0,
+      }
+
+  def handle(self, event):
+      acc = self.accountant
+      if isinstance(event, Foreground):
+          if event.proc is None or event.proc == "Unknown":
+              return
+          acc.switch(self.resolve_app(event.title, event.proc), event.ts, event.title)
+      elif isinstance(event, Idle):
+          acc.idle(event.ts, event.since)
+      elif isinstance(event, Active):
+          acc.active(event.ts)
+      elif isinstance(event, Pause):
+          acc.pause(event.ts)
+      elif isinstance(event, Resume):
+          acc.resume(event.ts)
+      elif isinstance(event, Reset):
+          acc.reset(event.ts)
+          # anything still in flight is deleted by clear_day as well
+          self.in_flight = []
+          try:
+              clear_day(self.current_day.isoformat())
+          except Exception as e:
+              print(f"[DB ERROR] Reset failed: {e}")
+
+  def check_day(self, now):
+      day = date.fromtimestamp(now)
+      if day == self.current_day:
+          return
+
+      # split the running session at midnight and close out yesterday
+      midnight = datetime.combine(day, datetime.min.time()).timestamp()
+      self.perform_sync(midnight)
+
+      self.current_day = day
+      self.accountant.new_day(get_today_data(day.isoformat()), midnight)
+
+  def next_timeout(self, now):
+      until_sync = self.max_staleness - (now - self.last_sync_time)
+      tomorrow = datetime.combine(self.current_day + timedelta(days=1), datetime.min.time())
+      until_midnight = tomorrow.timestamp() - now
+      timeout = min(until_sync, until_midnight)
+      acc = self.accountant
+      if self.journal is not None and acc.current_app is not None and acc.session_start is not None and not acc.paused:
+          timeout = min(timeout, JOURNAL_INTERVAL)
+      return max(0.0, timeout)
+
+  def publish(self, now):
+      acc = self.accountant
+      # the API adds the live seconds of the running session itself,
+      # so nothing has to be pushed every second, only real changes
+      memory.publish(acc.total_info, acc.current_app, acc.session_start)
+
+  def record(self, now):
+      """Mirrors everything not committed yet into the crash journal."""
+      if self.journal is None:
+          return
+      self.in_flight = [(ticket, batch) for ticket, batch in self.in_flight if not is_committed(ticket)]
+
+      acc = self.accountant
+      pending = [piece for _, batch in self.in_flight for piece in batch] + acc.closed
+      state = {"seen": now, "pending": pending}
+      # a session that could still be dropped as a brief switch is left out
+      if acc.live_delta(now) > 0 and now - acc.session_origin > BRIEF_SWITCH:
+          state.update(app=acc.current_app, title=acc.current_title, start=acc.session_start)
+      self.journal.write(state)
 
   def run(self):
+    self.source.start()
+    worker_status["running"] = True
+    worker_status["error"] = None
     try:
-      while self.running:
-
-        self.loop_count += 1
-        #clearing the cache
-        if self.loop_count > 1000:
-          self.pid_cache.clear()
-          self.loop_count = 0
-        
-        #on pause, skips everything below
-        if self.paused:
-          time.sleep(1)
-          continue
-
-        now = time.time()
-        if now - self.last_sync_time > 30:
-            # We call a helper method to prepare the data
-            self.perform_sync(now)
-            self.last_sync_time = now
-
-        #reset
-        if self.reset_flag:
-          self.total_info = {}
-          self.current_app = None
-          self.session_start = None
-          self.reset_flag = False
-
-        hwnd, title, proc = self.get_active_window()
-        idle_time = self.get_idle_time()
-
-        if idle_time > self.idle_threshold: 
-          if not self.was_idle:
-              if self.current_app and self.session_start:
-                duration = (now - self.idle_threshold) - self.session_start
-                if duration>0:
-                    self.total_info[self.current_app] = self.total_info.get(self.current_app, 0) + duration
-
-              self.was_idle = True
-
-              time.sleep(1)
-              continue
-          
-        if self.was_idle:
-          self.session_start = now
-          self.was_idle = False
-
-        if proc == "Unknown" or proc is None:
-          time.sleep(0.1)
-          continue
-
-        if proc.lower() == "applicationframehost.exe": 
-          app = title if title.strip() != "" else "Windows System App"
-        else:
-          app = self.normalize_win32_name(proc) #reutnring title if the app is an UWP app
-
-        if not app or app == "Unknown":
-          app = "System Idle"
+      self.publish(self.source.now())
+      self.started.set()
+      while self.running and not self.source.finished:
+        now = self.source.now()
+        event = self.source.next_event(self.next_timeout(now))
+        started = time.perf_counter()
+        now = event.ts if event is not None else self.source.now()
 
+        self.check_day(now)
+        if event is not None:
+          self.handle(event)
+
+        if self.should_flush(now):
+            self.perform_sync(now)
 
-        if date.today() != self.current_day:
-            if self.current_app is not None:
-                now = time.time()
-                duration = now - self.session_start
-                self.total_info[self.current_app] = (
-                    self.total_info.get(self.current_app, 0) + duration
-                )
-                add_today_usage(self.current_app, duration)
-
-            self.total_info = {}
-            self.current_day = date.today()
-            self.total_info = get_today_data()
-            self.session_start = time.time()
-            continue
-
-        #on app switch  
-        if app != self.current_app:
-            if self.current_app is not None:
-              duration = now - self.session_start
-              if duration > 2.0:
-                self.total_info[self.current_app] = (self.total_info.get(self.current_app, 0) + duration)
-              else:
-                print(f"[CLEANUP] Ignored brief switch to: {self.current_app} ({duration:.2f}s)")
-            
-            #new session
-            self.current_app = app
-            self.session_start = now
-
-        #live display      
-        display_info = self.total_info.copy()
-        # 2. Add the live ticking seconds for the active app
-        if self.current_app is not None and self.session_start is not None:
-            live_delta = time.time() - self.session_start
-            display_info[self.current_app] = display_info.get(self.current_app, 0) + live_delta
-
-        # 3. Push this "Live + Total" dictionary to shared memory
-        with stats_lock:
-            stats_data.clear()
-            stats_data.update(display_info)
-
-        time.sleep(1)
+        self.publish(now)
+        self.record(now)
+        LOOP_SECONDS.observe(time.perf_counter() - started)
     except Exception as e:
-       worker_status["running"] = False,
        worker_status["error"] = str(e)
-       
+    finally:
+      # also when the loop failed, so nothing waits on it forever
+      self.started.set()
+      worker_status["running"] = False
+      memory.notify()
+      self.source.stop()
 
-    self.finished.emit()
-        
+    # last flush so nothing since the previous sync is lost on exit
+    now = self.source.now()
+    self.accountant.close_session(now)
+    self.perform_sync(now)
+    self.record(now)